@@ -0,0 +1,90 @@
+"""Maps incoming events to what they do on the computer.
+
+Gestures are bound to hotkeys through a table that can be overridden from
+a JSON file, TRACKPAD_ACTIONS or actions.json next to this module:
+
+    {"nextWindow": ["alt", "tab"], "zoomIn": ["ctrl", "+"], "gestureUp": null}
+
+null turns a gesture off. Every binding is turned into a handler once, so
+dispatching an event is one dict lookup and a call, and each handler keeps
+its own timing and error count.
+"""
+import json
+import logging
+import os
+import time
+from functools import partial
+
+from metrics import LatencyHistogram
+
+DEFAULT_BINDINGS = {
+    'zoomIn': ('ctrl', '+'),
+    'zoomOut': ('ctrl', '-'),
+    'nextWindow': ('alt', 'tab'),
+    'gestureDown': ('win', 'm'),  # Minimizes all windows
+    'gestureUp': ('win', 'shift', 'm'),  # Restores them
+}
+ACTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'actions.json')
+
+
+def load_bindings(path=None):
+    """DEFAULT_BINDINGS with the overrides from `path`, if there is one"""
+    if path is None:
+        path = os.environ.get('TRACKPAD_ACTIONS')
+        if path is None and os.path.exists(ACTIONS_FILE):
+            path = ACTIONS_FILE
+    bindings = dict(DEFAULT_BINDINGS)
+    if path is not None:
+        with open(path, encoding='utf-8') as f:
+            overrides = json.load(f)
+        for name, keys in overrides.items():
+            if name not in DEFAULT_BINDINGS:
+                raise ValueError(f"Unknown action {name!r} in {path}, expected one of {tuple(DEFAULT_BINDINGS)}")
+            bindings[name] = tuple(keys) if keys else None
+    return bindings
+
+
+def traced(event):
+    """Injector trace callback reporting `event` as injected"""
+    return partial(event['session'].stats.on_injected, event)
+
+
+def hotkey(injector, keys):
+    """Handler pressing `keys` together, or doing nothing if `keys` is None"""
+    if not keys:
+        return lambda event: None
+
+    def press(event):
+        injector.submit('hotkey', *keys, trace=traced(event))
+    return press
+
+
+class ActionDispatcher:
+    def __init__(self, handlers):
+        """`handlers` maps event types to callables taking the event"""
+        self.handlers = handlers
+        self.timings = {name: LatencyHistogram() for name in handlers}
+        self.errors = dict.fromkeys(handlers, 0)
+        self.unknown = 0
+
+    def dispatch(self, event):
+        name = event['type']
+        handler = self.handlers.get(name)
+        if handler is None:
+            self.unknown += 1
+            return
+        start = time.perf_counter_ns()
+        try:
+            handler(event)
+        except Exception as e:
+            # Contained here, so one bad event can't stall the pipeline
+            self.errors[name] += 1
+            logging.error(f"Error handling {name} event: {e}")
+        self.timings[name].record(time.perf_counter_ns() - start)
+
+    def summary(self):
+        return {
+            'unknown': self.unknown,
+            'handlers': {name: {'errors': self.errors[name], 'time_ms': self.timings[name].summary()}
+                         for name in self.handlers},
+        }
@@ -0,0 +1,77 @@
+"""Decides which connected phones may drive the shared input pipeline.
+
+Policies:
+    exclusive   the first phone to send input keeps control until it disconnects
+    last-touch  a phone that starts a new touch takes control from the others
+    merge       every phone's input is applied, motion from several phones sums
+"""
+POLICIES = ('exclusive', 'last-touch', 'merge')
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_ns = None
+
+    def take(self, count, now_ns):
+        if self.last_ns is not None:
+            self.tokens = min(self.burst, self.tokens + (now_ns - self.last_ns) * self.rate / 1e9)
+        self.last_ns = now_ns
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+
+class Session:
+    def __init__(self, stats, rate, burst):
+        self.stats = stats
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.last_input_ns = None
+
+
+class SessionArbiter:
+    def __init__(self, policy='last-touch', rate=None, burst=None, handoff=0.25):
+        """`rate` is the per-phone limit in events/sec (None for no limit) and
+        `handoff` how long a phone must pause before a touch counts as new."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown session policy {policy!r}, expected one of {POLICIES}")
+        self.policy = policy
+        self.rate = rate
+        self.burst = burst or rate
+        self.handoff_ns = int(handoff * 1e9)
+        self.sessions = set()
+        self.owner = None
+
+    def open(self, stats):
+        session = Session(stats, self.rate, self.burst)
+        self.sessions.add(session)
+        return session
+
+    def close(self, session):
+        self.sessions.discard(session)
+        if self.owner is session:
+            self.owner = None
+
+    def accept(self, session, count, now_ns):
+        """Whether `count` events that just arrived from `session` may be applied"""
+        if session.bucket is not None and not session.bucket.take(count, now_ns):
+            session.stats.rate_limited += count
+            return False
+
+        fresh_touch = (session.last_input_ns is None or
+                       now_ns - session.last_input_ns >= self.handoff_ns)
+        session.last_input_ns = now_ns
+
+        if self.policy == 'merge':
+            return True
+        if self.owner is None or self.owner is session:
+            self.owner = session
+            return True
+        if self.policy == 'last-touch' and fresh_touch:
+            self.owner = session
+            return True
+        session.stats.rejected += count
+        return False
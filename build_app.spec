@@ -6,8 +6,8 @@ a = Analysis(
     ['trackpad_gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('icon.png', '.')],
-    hiddenimports=['aiohttp', 'pyautogui', 'PyQt6.QtSvg', 'PyQt6.QtSvgWidgets'],
+    datas=[('icon.png', '.'), ('static', 'static')],
+    hiddenimports=['aiohttp', 'PyQt6.QtSvg', 'PyQt6.QtSvgWidgets'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
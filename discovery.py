@@ -0,0 +1,205 @@
+"""Finds the addresses a phone can reach this computer on, and announces them.
+
+Every IPv4 interface is listed (with psutil if it's installed, otherwise
+from the OS directly) and ranked: the interface carrying the default
+route comes first, while loopback, link-local, Docker/VM bridges and VPN
+tunnels go last or are left out. The list is cached, and the Advertiser
+rescans it every few seconds so a change of Wi-Fi network is noticed.
+
+With the zeroconf package installed the server is also announced over
+mDNS as an _http._tcp service, so it shows up in network browsers and
+as <hostname>.local. QR codes are cached per URL.
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import sys
+import time
+from functools import lru_cache
+from io import BytesIO
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SERVICE_TYPE = '_http._tcp.local.'
+ADDRESS_TTL = 30.0  # Seconds a scan is reused for
+WATCH_INTERVAL = 5.0  # Seconds between rescans while the server runs
+# Interfaces a phone on the same Wi-Fi can't normally reach
+VIRTUAL_INTERFACES = ('docker', 'br-', 'veth', 'virbr', 'vmnet', 'vboxnet', 'vethernet',
+                      'tun', 'tap', 'utun', 'wg', 'tailscale', 'zt', 'ham')
+
+SIOCGIFFLAGS = 0x8913  # Linux ioctls, for when psutil isn't there
+SIOCGIFADDR = 0x8915
+IFF_UP = 0x1
+
+_scanned = None  # (time.monotonic() of the scan, addresses)
+
+
+def _default_route_ip():
+    # Connecting a UDP socket sends nothing, it only picks the outgoing interface
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.connect(('10.255.255.255', 1))
+        return s.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        s.close()
+
+
+def _interface_addresses():
+    """[(ip, interface name or None)] for the IPv4 addresses of interfaces that are up"""
+    if psutil is not None:
+        stats = psutil.net_if_stats()
+        return [(addr.address, name) for name, addrs in psutil.net_if_addrs().items()
+                if name in stats and stats[name].isup
+                for addr in addrs if addr.family == socket.AF_INET]
+    if sys.platform.startswith('linux'):
+        import fcntl
+        import struct
+        found = []
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _, name in socket.if_nameindex():
+                request = struct.pack('256s', name.encode()[:15])
+                try:
+                    flags, = struct.unpack('H', fcntl.ioctl(s.fileno(), SIOCGIFFLAGS, request)[16:18])
+                    if flags & IFF_UP:
+                        found.append((socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, request)[20:24]), name))
+                except OSError:
+                    pass  # No IPv4 address
+        return found
+    # Lists every adapter on Windows, often only the main one elsewhere
+    try:
+        return [(info[4][0], None) for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)]
+    except OSError:
+        return []
+
+
+def scan():
+    """Usable IPv4 addresses of this computer, best first. Never empty."""
+    default_ip = _default_route_ip()
+    interfaces = dict(_interface_addresses())
+    if default_ip is not None:
+        interfaces.setdefault(default_ip, None)
+    ranked = []
+    for ip, name in interfaces.items():
+        address = ipaddress.ip_address(ip)
+        if address.is_loopback or address.is_link_local or address.is_unspecified:
+            continue
+        virtual = name is not None and name.lower().startswith(VIRTUAL_INTERFACES)
+        ranked.append(((virtual, ip != default_ip, not address.is_private), ip))
+    return tuple(ip for _, ip in sorted(ranked)) or ('127.0.0.1',)
+
+
+def local_addresses(max_age=ADDRESS_TTL):
+    """scan(), reusing the last result if it's at most `max_age` seconds old"""
+    global _scanned
+    now = time.monotonic()
+    if _scanned is None or now - _scanned[0] > max_age:
+        _scanned = (now, scan())
+    return _scanned[1]
+
+
+def urls(port, addresses=None):
+    return [f"http://{ip}:{port}" for ip in addresses or local_addresses()]
+
+
+@lru_cache(maxsize=16)
+def qr_png(text):
+    """PNG of a QR code for `text`. Needs the qrcode package (ImportError otherwise)."""
+    import qrcode  # Pulls in PIL, so only once a QR code is wanted
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(text)
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class Advertiser:
+    """Announces the server over mDNS and follows network changes.
+
+    `on_change(addresses)` is called from the event loop whenever a rescan
+    finds different addresses. Without zeroconf only the rescans happen.
+    """
+
+    def __init__(self, name=None):
+        self.name = name or f"Mobile Trackpad on {socket.gethostname().split('.')[0]}"
+        self.port = None
+        self.addresses = ()
+        self.on_change = None
+        self.zeroconf = None
+        self.info = None
+        self.task = None
+
+    async def start(self, port, on_change=None):
+        self.port = port
+        self.on_change = on_change
+        loop = asyncio.get_running_loop()
+        self.addresses = await loop.run_in_executor(None, local_addresses)
+        try:
+            from zeroconf.asyncio import AsyncZeroconf
+        except ImportError:
+            logging.info("zeroconf isn't installed, the server won't be announced over mDNS")
+        else:
+            try:
+                self.zeroconf = AsyncZeroconf()
+                self.info = self._service_info()
+                await self.zeroconf.async_register_service(self.info, allow_name_change=True)
+            except Exception as e:
+                logging.warning(f"Couldn't announce the server over mDNS: {e}")
+                await self._close_zeroconf()
+        self.task = asyncio.create_task(self._watch())
+
+    def _service_info(self, name=None):
+        from zeroconf.asyncio import AsyncServiceInfo
+        host = socket.gethostname().split('.')[0]
+        return AsyncServiceInfo(SERVICE_TYPE, name or f"{self.name}.{SERVICE_TYPE}", port=self.port,
+                                addresses=[socket.inet_aton(ip) for ip in self.addresses],
+                                properties={'path': '/'}, server=f"{host}.local.")
+
+    async def update(self, port=None):
+        """Announce a new port, or the current addresses again"""
+        if port is not None:
+            self.port = port
+        if self.zeroconf is None:
+            return
+        # Keep the name, registering may have changed it to avoid a clash
+        self.info = self._service_info(self.info.name)
+        try:
+            await self.zeroconf.async_update_service(self.info)
+        except Exception as e:
+            logging.warning(f"Couldn't update the mDNS announcement: {e}")
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            # Resolving can block, keep it off the loop
+            addresses = await loop.run_in_executor(None, local_addresses, 0)
+            if addresses == self.addresses:
+                continue
+            logging.info(f"Network changed, now reachable at {', '.join(addresses)}")
+            self.addresses = addresses
+            await self.update()
+            if self.on_change is not None:
+                self.on_change(addresses)
+
+    async def _close_zeroconf(self):
+        zeroconf, self.zeroconf = self.zeroconf, None
+        if zeroconf is None:
+            return
+        try:
+            await zeroconf.async_unregister_all_services()
+            await zeroconf.async_close()
+        except Exception as e:
+            logging.warning(f"Error withdrawing the mDNS announcement: {e}")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self._close_zeroconf()
@@ -0,0 +1,65 @@
+from collections import deque
+
+# Event types whose x/y deltas can be summed without changing the outcome
+COALESCE_TYPES = ('move', 'scroll')
+# Event types where only the newest x/y counts
+LATEST_TYPES = ('moveAbs',)
+
+
+class CoalescingQueue:
+    """FIFO of input events that never drops anything.
+
+    A move or scroll pushed right behind another event of the same type is
+    added into it, so a backlog of motion collapses into one entry while
+    clicks and gestures keep their place in the order. A tablet position
+    pushed behind another one replaces it.
+    """
+
+    def __init__(self, types=COALESCE_TYPES, latest=LATEST_TYPES):
+        self.types = types  # Event types that may be merged
+        self.latest = latest  # Event types that may be replaced
+        self._events = deque()
+        self.pushed = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._events)
+
+    def __bool__(self):
+        return bool(self._events)
+
+    def push(self, event):
+        self.pushed += 1
+        kind = event['type']
+        if kind in self.types or kind in self.latest:
+            if self._events:
+                last = self._events[-1]
+                if last['type'] == kind:
+                    # The merged entry keeps the oldest event's timestamps
+                    if kind in self.types:
+                        last['x'] += event['x']
+                        last['y'] += event['y']
+                    else:
+                        last['x'] = event['x']
+                        last['y'] = event['y']
+                    self.coalesced += 1
+                    return
+            # Copy, since the entry gets modified when later deltas merge in
+            event = dict(event)
+        self._events.append(event)
+        if len(self._events) > self.max_depth:
+            self.max_depth = len(self._events)
+
+    def extend(self, events):
+        for event in events:
+            self.push(event)
+
+    def popleft(self):
+        return self._events.popleft()
+
+    def drain(self):
+        """Remove and return every pending event, oldest first"""
+        events = list(self._events)
+        self._events.clear()
+        return events
@@ -0,0 +1,611 @@
+import ctypes
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from screen_map import ScreenMap
+
+# Scroll amounts are expressed in Windows wheel units: 120 per detent
+WHEEL_DELTA = 120
+ABS_MAX = 65535  # Range of the uinput tablet device's axes
+
+
+class InputBackend:
+    """Injects pointer and keyboard input into the host OS.
+
+    Backends are only ever called from the injector thread, so they don't
+    need to be thread safe.
+    """
+    name = 'base'
+    screen_map = None  # Created on the first move_to()
+
+    def move_rel(self, dx, dy):
+        raise NotImplementedError
+
+    def move_abs(self, x, y):
+        """Put the pointer at x, y, each 0-1 across the whole virtual desktop"""
+        raise NotImplementedError
+
+    def screens(self):
+        """The display layout as (desktop, monitors), each a (left, top, width, height)
+        rect in the desktop's units, primary monitor first. Comparable with ==."""
+        raise NotImplementedError
+
+    def move_to(self, u, v):
+        """Put the pointer at u, v of the phone's trackpad surface, see screen_map.py"""
+        if self.screen_map is None:
+            self.screen_map = ScreenMap(self)
+        self.move_abs(*self.screen_map.to_desktop(u, v))
+
+    def click(self, button='left'):
+        raise NotImplementedError
+
+    def scroll(self, dx, dy):
+        """Scroll by dx/dy wheel units (see WHEEL_DELTA)"""
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        """Press keys in order, then release them in reverse order"""
+        raise NotImplementedError
+
+    def type_text(self, text):
+        """Type `text` as fast as the OS takes it, in as few calls as possible.
+        Returns how many characters could not be typed."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RecordingBackend(InputBackend):
+    """Keeps every injected call in memory instead of touching the OS"""
+    name = 'recording'
+
+    def __init__(self):
+        self.events = []
+        self.x = 0
+        self.y = 0
+
+    def move_rel(self, dx, dy):
+        self.x += dx
+        self.y += dy
+        self.events.append(('move_rel', dx, dy))
+
+    def move_abs(self, x, y):
+        self.events.append(('move_abs', x, y))
+
+    def screens(self):
+        return (0, 0, 1920, 1080), [(0, 0, 1920, 1080)]
+
+    def click(self, button='left'):
+        self.events.append(('click', button))
+
+    def scroll(self, dx, dy):
+        self.events.append(('scroll', dx, dy))
+
+    def hotkey(self, *keys):
+        self.events.append(('hotkey',) + keys)
+
+    def type_text(self, text):
+        self.events.append(('type_text', text))
+        return 0
+
+
+# Win32 SendInput structures
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [('dx', ctypes.c_long),
+                ('dy', ctypes.c_long),
+                ('mouseData', ctypes.c_ulong),
+                ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong),
+                ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [('wVk', ctypes.c_ushort),
+                ('wScan', ctypes.c_ushort),
+                ('dwFlags', ctypes.c_ulong),
+                ('time', ctypes.c_ulong),
+                ('dwExtraInfo', ctypes.c_size_t)]
+
+
+class _HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [('uMsg', ctypes.c_ulong),
+                ('wParamL', ctypes.c_ushort),
+                ('wParamH', ctypes.c_ushort)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [('mi', _MOUSEINPUT),
+                ('ki', _KEYBDINPUT),
+                ('hi', _HARDWAREINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_ulong),
+                ('u', _INPUTUNION)]
+
+
+class _POINT(ctypes.Structure):
+    _fields_ = [('x', ctypes.c_long), ('y', ctypes.c_long)]
+
+
+class _RECT(ctypes.Structure):
+    _fields_ = [('left', ctypes.c_long), ('top', ctypes.c_long),
+                ('right', ctypes.c_long), ('bottom', ctypes.c_long)]
+
+
+class _MONITORINFO(ctypes.Structure):
+    _fields_ = [('cbSize', ctypes.c_ulong),
+                ('rcMonitor', _RECT),
+                ('rcWork', _RECT),
+                ('dwFlags', ctypes.c_ulong)]
+
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_WHEEL = 0x0800
+MOUSEEVENTF_HWHEEL = 0x1000
+MOUSEEVENTF_VIRTUALDESK = 0x4000
+MOUSEEVENTF_ABSOLUTE = 0x8000
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+TEXT_BATCH = 512  # Characters per SendInput call
+
+SM_XVIRTUALSCREEN = 76
+SM_YVIRTUALSCREEN = 77
+SM_CXVIRTUALSCREEN = 78
+SM_CYVIRTUALSCREEN = 79
+MONITORINFOF_PRIMARY = 0x1
+
+_WIN_BUTTONS = {
+    'left': (0x0002, 0x0004),
+    'right': (0x0008, 0x0010),
+    'middle': (0x0020, 0x0040),
+}
+
+# (character, with shift, evdev key) for the US layout's punctuation keys
+_US_KEYS = (
+    ('-', '_', 'KEY_MINUS'), ('=', '+', 'KEY_EQUAL'), ('[', '{', 'KEY_LEFTBRACE'),
+    (']', '}', 'KEY_RIGHTBRACE'), ('\\', '|', 'KEY_BACKSLASH'), (';', ':', 'KEY_SEMICOLON'),
+    ("'", '"', 'KEY_APOSTROPHE'), ('`', '~', 'KEY_GRAVE'), (',', '<', 'KEY_COMMA'),
+    ('.', '>', 'KEY_DOT'), ('/', '?', 'KEY_SLASH'), ('1', '!', 'KEY_1'), ('2', '@', 'KEY_2'),
+    ('3', '#', 'KEY_3'), ('4', '$', 'KEY_4'), ('5', '%', 'KEY_5'), ('6', '^', 'KEY_6'),
+    ('7', '&', 'KEY_7'), ('8', '*', 'KEY_8'), ('9', '(', 'KEY_9'), ('0', ')', 'KEY_0'),
+)
+
+_WIN_KEYS = {
+    'ctrl': 0x11, 'alt': 0x12, 'shift': 0x10, 'win': 0x5B,
+    'tab': 0x09, 'enter': 0x0D, 'esc': 0x1B, 'backspace': 0x08,
+    'space': 0x20, 'delete': 0x2E, 'home': 0x24, 'end': 0x23,
+    'left': 0x25, 'up': 0x26, 'right': 0x27, 'down': 0x28,
+}
+
+
+def normalize_pixel(pixel, size):
+    """Absolute SendInput coordinate (0-65535) that lands exactly on `pixel`.
+
+    Windows maps a coordinate n back to pixel n * size // 65536, so round
+    up rather than down, or a one pixel move can land on the pixel it
+    started from.
+    """
+    pixel = min(max(pixel, 0), size - 1)
+    return (pixel * 65536 + size - 1) // size
+
+
+class WindowsBackend(InputBackend):
+    name = 'windows'
+
+    def __init__(self):
+        self.user32 = ctypes.windll.user32
+        self.user32.SendInput.argtypes = (ctypes.c_uint, ctypes.POINTER(_INPUT), ctypes.c_int)
+
+    def _send(self, *inputs):
+        array = (_INPUT * len(inputs))(*inputs)
+        self.user32.SendInput(len(inputs), array, ctypes.sizeof(_INPUT))
+
+    def _mouse(self, flags, dx=0, dy=0, data=0):
+        return _INPUT(INPUT_MOUSE, _INPUTUNION(mi=_MOUSEINPUT(dx, dy, data & 0xFFFFFFFF, flags, 0, 0)))
+
+    def _key(self, vk, flags=0, scan=0):
+        return _INPUT(INPUT_KEYBOARD, _INPUTUNION(ki=_KEYBDINPUT(vk, scan, flags, 0, 0)))
+
+    def _vk(self, key):
+        if key in _WIN_KEYS:
+            return _WIN_KEYS[key]
+        # Single characters map through the active keyboard layout
+        return self.user32.VkKeyScanW(ord(key)) & 0xFF
+
+    def move_rel(self, dx, dy):
+        # A relative MOUSEEVENTF_MOVE would go through the OS pointer
+        # ballistics, so move to the absolute target instead
+        point = _POINT()
+        self.user32.GetCursorPos(ctypes.byref(point))
+        left = self.user32.GetSystemMetrics(SM_XVIRTUALSCREEN)
+        top = self.user32.GetSystemMetrics(SM_YVIRTUALSCREEN)
+        width = max(self.user32.GetSystemMetrics(SM_CXVIRTUALSCREEN), 1)
+        height = max(self.user32.GetSystemMetrics(SM_CYVIRTUALSCREEN), 1)
+        x = normalize_pixel(point.x + dx - left, width)
+        y = normalize_pixel(point.y + dy - top, height)
+        self._send(self._mouse(MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE | MOUSEEVENTF_VIRTUALDESK, x, y))
+
+    def move_abs(self, x, y):
+        # Absolute virtual-desktop coordinates are 0-65535 whatever the layout
+        self._send(self._mouse(MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE | MOUSEEVENTF_VIRTUALDESK,
+                               round(x * 65535), round(y * 65535)))
+
+    def screens(self):
+        monitors = []
+
+        def found(monitor, dc, rect, data):
+            info = _MONITORINFO()
+            info.cbSize = ctypes.sizeof(_MONITORINFO)
+            self.user32.GetMonitorInfoW(monitor, ctypes.byref(info))
+            r = info.rcMonitor
+            monitors.append((not info.dwFlags & MONITORINFOF_PRIMARY,
+                             (r.left, r.top, r.right - r.left, r.bottom - r.top)))
+            return True
+
+        callback = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p,
+                                      ctypes.POINTER(_RECT), ctypes.c_ssize_t)(found)
+        self.user32.EnumDisplayMonitors(None, None, callback, 0)
+        metrics = self.user32.GetSystemMetrics
+        desktop = (metrics(SM_XVIRTUALSCREEN), metrics(SM_YVIRTUALSCREEN),
+                   metrics(SM_CXVIRTUALSCREEN), metrics(SM_CYVIRTUALSCREEN))
+        return desktop, [rect for _, rect in sorted(monitors, key=lambda m: m[0])]
+
+    def click(self, button='left'):
+        down, up = _WIN_BUTTONS[button]
+        self._send(self._mouse(down), self._mouse(up))
+
+    def scroll(self, dx, dy):
+        inputs = []
+        if dy:
+            inputs.append(self._mouse(MOUSEEVENTF_WHEEL, data=dy))
+        if dx:
+            inputs.append(self._mouse(MOUSEEVENTF_HWHEEL, data=dx))
+        if inputs:
+            self._send(*inputs)
+
+    def hotkey(self, *keys):
+        vks = [self._vk(key) for key in keys]
+        self._send(*([self._key(vk) for vk in vks] +
+                     [self._key(vk, KEYEVENTF_KEYUP) for vk in reversed(vks)]))
+
+    def type_text(self, text):
+        # KEYEVENTF_UNICODE types any character whatever the keyboard layout,
+        # one UTF-16 code unit per key event. Line breaks and tabs are sent as
+        # real keys, since many programs ignore them as characters.
+        text = text.replace('\r\n', '\n')
+        inputs = []
+        for char in text:
+            if char in '\n\r\t':
+                vk = _WIN_KEYS['enter' if char != '\t' else 'tab']
+                inputs += (self._key(vk), self._key(vk, KEYEVENTF_KEYUP))
+                continue
+            units = char.encode('utf-16-le')
+            for i in range(0, len(units), 2):
+                unit = units[i] | units[i + 1] << 8
+                inputs += (self._key(0, KEYEVENTF_UNICODE, unit),
+                           self._key(0, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP, unit))
+        for start in range(0, len(inputs), TEXT_BATCH * 2):
+            self._send(*inputs[start:start + TEXT_BATCH * 2])
+        return 0
+
+
+class UinputBackend(InputBackend):
+    """Linux kernel uinput device, works under X11, Wayland and the console"""
+    name = 'uinput'
+
+    def __init__(self):
+        from evdev import UInput, ecodes
+        self.ecodes = ecodes
+        self.keys = {
+            'ctrl': ecodes.KEY_LEFTCTRL, 'alt': ecodes.KEY_LEFTALT,
+            'shift': ecodes.KEY_LEFTSHIFT, 'win': ecodes.KEY_LEFTMETA,
+            'tab': ecodes.KEY_TAB, 'enter': ecodes.KEY_ENTER, 'esc': ecodes.KEY_ESC,
+            'backspace': ecodes.KEY_BACKSPACE, 'space': ecodes.KEY_SPACE,
+            'delete': ecodes.KEY_DELETE, 'home': ecodes.KEY_HOME, 'end': ecodes.KEY_END,
+            'left': ecodes.KEY_LEFT, 'up': ecodes.KEY_UP,
+            'right': ecodes.KEY_RIGHT, 'down': ecodes.KEY_DOWN,
+            '+': ecodes.KEY_EQUAL, '=': ecodes.KEY_EQUAL, '-': ecodes.KEY_MINUS,
+        }
+        for char in 'abcdefghijklmnopqrstuvwxyz0123456789':
+            self.keys[char] = getattr(ecodes, 'KEY_' + char.upper())
+        # Characters typed by type_text, as (key, with shift) on a US layout.
+        # uinput only has key codes, so the desktop's layout decides what comes out.
+        self.chars = {char: (self.keys[char], False) for char in 'abcdefghijklmnopqrstuvwxyz0123456789'}
+        self.chars.update({char.upper(): (self.keys[char], True) for char in 'abcdefghijklmnopqrstuvwxyz'})
+        for plain, shifted, name in _US_KEYS:
+            self.chars[plain] = (getattr(ecodes, name), False)
+            self.chars[shifted] = (getattr(ecodes, name), True)
+        self.chars.update({' ': (ecodes.KEY_SPACE, False), '\n': (ecodes.KEY_ENTER, False),
+                           '\t': (ecodes.KEY_TAB, False)})
+        self.buttons = {'left': ecodes.BTN_LEFT, 'right': ecodes.BTN_RIGHT,
+                        'middle': ecodes.BTN_MIDDLE}
+        self.device = UInput({
+            ecodes.EV_REL: [ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL, ecodes.REL_HWHEEL,
+                            ecodes.REL_WHEEL_HI_RES, ecodes.REL_HWHEEL_HI_RES],
+            ecodes.EV_KEY: list(self.buttons.values()) +
+            list(set(self.keys.values()) | {code for code, _ in self.chars.values()}),
+        }, name='mobile-trackpad')
+        # Low resolution wheel events are only sent once a full detent has built up
+        self.wheel_x = 0
+        self.wheel_y = 0
+        self.tablet = None  # Absolute device, created on the first move_abs()
+
+    def move_rel(self, dx, dy):
+        e = self.ecodes
+        if dx:
+            self.device.write(e.EV_REL, e.REL_X, dx)
+        if dy:
+            self.device.write(e.EV_REL, e.REL_Y, dy)
+        self.device.syn()
+
+    def move_abs(self, x, y):
+        e = self.ecodes
+        if self.tablet is None:
+            # libinput gets confused by relative and absolute axes on one device
+            from evdev import AbsInfo, UInput
+            axis = AbsInfo(value=0, min=0, max=ABS_MAX, fuzz=0, flat=0, resolution=0)
+            self.tablet = UInput({
+                e.EV_ABS: [(e.ABS_X, axis), (e.ABS_Y, axis)],
+                e.EV_KEY: list(self.buttons.values()),
+            }, name='mobile-trackpad-tablet')
+        self.tablet.write(e.EV_ABS, e.ABS_X, round(x * ABS_MAX))
+        self.tablet.write(e.EV_ABS, e.ABS_Y, round(y * ABS_MAX))
+        self.tablet.syn()
+
+    def screens(self):
+        # The compositor spreads an absolute device over the whole desktop
+        # and doesn't tell us the layout, so there are no monitors to pick
+        return (0, 0, ABS_MAX + 1, ABS_MAX + 1), []
+
+    def click(self, button='left'):
+        e = self.ecodes
+        code = self.buttons[button]
+        self.device.write(e.EV_KEY, code, 1)
+        self.device.syn()
+        self.device.write(e.EV_KEY, code, 0)
+        self.device.syn()
+
+    def scroll(self, dx, dy):
+        e = self.ecodes
+        if dy:
+            self.wheel_y += dy
+            self.device.write(e.EV_REL, e.REL_WHEEL_HI_RES, dy)
+            notches = int(self.wheel_y / WHEEL_DELTA)
+            if notches:
+                self.device.write(e.EV_REL, e.REL_WHEEL, notches)
+                self.wheel_y -= notches * WHEEL_DELTA
+        if dx:
+            # Windows HWHEEL is positive to the right, same as evdev
+            self.wheel_x += dx
+            self.device.write(e.EV_REL, e.REL_HWHEEL_HI_RES, dx)
+            notches = int(self.wheel_x / WHEEL_DELTA)
+            if notches:
+                self.device.write(e.EV_REL, e.REL_HWHEEL, notches)
+                self.wheel_x -= notches * WHEEL_DELTA
+        self.device.syn()
+
+    def hotkey(self, *keys):
+        e = self.ecodes
+        codes = [self.keys[key] for key in keys]
+        for code in codes:
+            self.device.write(e.EV_KEY, code, 1)
+        for code in reversed(codes):
+            self.device.write(e.EV_KEY, code, 0)
+        self.device.syn()
+
+    def type_text(self, text):
+        e = self.ecodes
+        write = self.device.write
+        shift = self.keys['shift']
+        missing = 0
+        for char in text.replace('\r\n', '\n'):
+            key = self.chars.get(char)
+            if key is None:
+                missing += 1
+                continue
+            code, shifted = key
+            # A press and its release in one report would cancel out
+            if shifted:
+                write(e.EV_KEY, shift, 1)
+            write(e.EV_KEY, code, 1)
+            self.device.syn()
+            write(e.EV_KEY, code, 0)
+            if shifted:
+                write(e.EV_KEY, shift, 0)
+            self.device.syn()
+        if missing:
+            logging.warning(f"Skipped {missing} characters that have no key on a US layout")
+        return missing
+
+    def close(self):
+        self.device.close()
+        if self.tablet is not None:
+            self.tablet.close()
+
+
+class XTestBackend(InputBackend):
+    """X11 XTEST extension, for desktops where /dev/uinput isn't writable"""
+    name = 'xtest'
+
+    _KEYSYMS = {
+        'ctrl': 'Control_L', 'alt': 'Alt_L', 'shift': 'Shift_L', 'win': 'Super_L',
+        'tab': 'Tab', 'enter': 'Return', 'esc': 'Escape', 'backspace': 'BackSpace',
+        'space': 'space', 'delete': 'Delete', 'home': 'Home', 'end': 'End',
+        'left': 'Left', 'up': 'Up', 'right': 'Right', 'down': 'Down',
+        '+': 'plus', '-': 'minus', '=': 'equal',
+    }
+
+    def __init__(self):
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+        self.display = display.Display()
+        self.wheel_x = 0
+        self.wheel_y = 0
+        screen = self.display.screen()
+        self.root_size = (screen.width_in_pixels, screen.height_in_pixels)
+
+    def _button(self, button, count=1):
+        for _ in range(count):
+            self.xtest.fake_input(self.display, self.X.ButtonPress, button)
+            self.xtest.fake_input(self.display, self.X.ButtonRelease, button)
+
+    def move_rel(self, dx, dy):
+        self.xtest.fake_input(self.display, self.X.MotionNotify, detail=True, x=dx, y=dy)
+        self.display.sync()
+
+    def move_abs(self, x, y):
+        width, height = self.root_size
+        self.xtest.fake_input(self.display, self.X.MotionNotify,
+                              x=round(x * (width - 1)), y=round(y * (height - 1)))
+        self.display.sync()
+
+    def screens(self):
+        screen = self.display.screen()
+        self.root_size = (screen.width_in_pixels, screen.height_in_pixels)
+        try:
+            found = screen.root.xrandr_get_monitors().monitors
+        except Exception:
+            found = []  # No RandR 1.5, so only the whole screen
+        monitors = [(m.x, m.y, m.width_in_pixels, m.height_in_pixels)
+                    for m in sorted(found, key=lambda m: not m.primary)]
+        return (0, 0) + self.root_size, monitors
+
+    def click(self, button='left'):
+        self._button({'left': 1, 'middle': 2, 'right': 3}[button])
+        self.display.sync()
+
+    def scroll(self, dx, dy):
+        # X11 only knows whole wheel clicks (buttons 4-7)
+        self.wheel_y += dy
+        self.wheel_x += dx
+        notches_y = int(self.wheel_y / WHEEL_DELTA)
+        notches_x = int(self.wheel_x / WHEEL_DELTA)
+        self.wheel_y -= notches_y * WHEEL_DELTA
+        self.wheel_x -= notches_x * WHEEL_DELTA
+        if notches_y:
+            self._button(4 if notches_y > 0 else 5, abs(notches_y))
+        if notches_x:
+            self._button(7 if notches_x > 0 else 6, abs(notches_x))
+        self.display.sync()
+
+    def hotkey(self, *keys):
+        codes = [self.display.keysym_to_keycode(self.XK.string_to_keysym(self._KEYSYMS.get(key, key)))
+                 for key in keys]
+        for code in codes:
+            self.xtest.fake_input(self.display, self.X.KeyPress, code)
+        for code in reversed(codes):
+            self.xtest.fake_input(self.display, self.X.KeyRelease, code)
+        self.display.sync()
+
+    def type_text(self, text):
+        # Characters go through the current keymap: a keysym that needs shift
+        # sits in column 1 of its keycode. Everything is flushed in one sync.
+        X = self.X
+        fake = self.xtest.fake_input
+        shift = self.display.keysym_to_keycode(self.XK.string_to_keysym('Shift_L'))
+        missing = 0
+        for char in text.replace('\r\n', '\n'):
+            if char in '\n\t':
+                keysym = self.XK.string_to_keysym('Return' if char == '\n' else 'Tab')
+            else:
+                code_point = ord(char)
+                # Latin-1 keysyms equal their code point, the rest are offset
+                keysym = code_point if 0x20 <= code_point <= 0xFF else 0x01000000 | code_point
+            code = self.display.keysym_to_keycode(keysym)
+            if not code:
+                missing += 1
+                continue
+            shifted = self.display.keycode_to_keysym(code, 0) != keysym
+            if shifted:
+                fake(self.display, X.KeyPress, shift)
+            fake(self.display, X.KeyPress, code)
+            fake(self.display, X.KeyRelease, code)
+            if shifted:
+                fake(self.display, X.KeyRelease, shift)
+        self.display.sync()
+        if missing:
+            logging.warning(f"Skipped {missing} characters that aren't in the keyboard map")
+        return missing
+
+    def close(self):
+        self.display.close()
+
+
+BACKENDS = {
+    'windows': WindowsBackend,
+    'uinput': UinputBackend,
+    'xtest': XTestBackend,
+    'recording': RecordingBackend,
+}
+
+
+def get_backend(name=None):
+    """Create the named backend, or the best one for this platform.
+
+    The TRACKPAD_BACKEND environment variable overrides the default, e.g.
+    TRACKPAD_BACKEND=recording runs the server on a headless machine.
+    """
+    name = name or os.environ.get('TRACKPAD_BACKEND')
+    if name:
+        return BACKENDS[name]()
+
+    if sys.platform == 'win32':
+        return WindowsBackend()
+    if sys.platform.startswith('linux'):
+        for backend in (UinputBackend, XTestBackend):
+            try:
+                return backend()
+            except Exception as e:
+                logging.info(f"{backend.name} backend unavailable: {e}")
+    raise RuntimeError(f"No input backend available on {sys.platform}")
+
+
+class Injector(threading.Thread):
+    """Runs every backend call on one dedicated thread.
+
+    The asyncio loop only puts (method, args) pairs on a queue, so a slow
+    OS call never holds up reading from the WebSocket.
+    """
+
+    def __init__(self, backend):
+        super().__init__(name='input-injector', daemon=True)
+        self.backend = backend
+        self._queue = queue.SimpleQueue()
+
+    def submit(self, op, *args, trace=None):
+        """Queue backend.op(*args); trace(done_ns) is called once it has run"""
+        self._queue.put((op, args, trace))
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def run(self):
+        backend = self.backend
+        get = self._queue.get
+        while True:
+            op, args, trace = get()
+            if op is None:
+                break
+            try:
+                getattr(backend, op)(*args)
+                if trace is not None:
+                    trace(time.perf_counter_ns())
+            except Exception as e:
+                logging.error(f"Error injecting {op}: {e}")
+        backend.close()
+
+    def stop(self, timeout=None):
+        self._queue.put((None, (), None))
+        if self.is_alive():
+            self.join(timeout)
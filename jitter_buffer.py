@@ -0,0 +1,151 @@
+"""Re-times bursty move samples onto a steady clock.
+
+Phones stamp every move with their own clock (see protocol.STAMP). The
+spread between send and arrival times gives the network jitter, and each
+sample is held until its send time plus the fastest recent transit plus a
+playout delay of a few times that jitter. On a clean link the delay stays
+near zero, and when Wi-Fi starts to bunch packets up it grows just enough
+to spread them out again.
+
+If the next sample is later than even that allows, motion carries on along
+the recent velocity for a short horizon. Whatever was predicted is taken
+back out of the real samples when they arrive, or given back when the
+stroke turns out to have ended, so the total movement is unchanged.
+"""
+import math
+from collections import deque
+
+JITTER_GAIN = 1 / 16  # Smoothing of the jitter estimate, as in RTP (RFC 3550)
+DELAY_FACTOR = 2.5  # Playout delay in multiples of the measured jitter
+MAX_DELAY_MS = 40.0
+TRANSIT_WINDOW_MS = 2000.0  # The fastest transit is tracked over windows this long
+VELOCITY_SMOOTHING = 0.5
+NEW_STROKE_MS = 100.0  # Samples sent further apart than this start a new stroke
+PREDICT_HORIZON_MS = 24.0  # Longest gap filled by extrapolation
+PREDICT_TICK = 0.008  # Seconds between predicted steps when output isn't paced
+
+
+def _settle(value, owed):
+    """Take predicted motion `owed` back out of a real delta, return (delta, still owed)"""
+    if not owed:
+        return value, 0.0
+    if (value > 0) != (owed > 0) or abs(value) >= abs(owed):
+        return value - owed, 0.0
+    return 0.0, owed - value
+
+
+class JitterBuffer:
+    """Playout buffer for one phone's moves"""
+
+    def __init__(self, tick=None):
+        self.tick = tick or PREDICT_TICK
+        self.samples = deque()  # (playout ns, move event), in playout order
+        self.jitter_ms = 0.0
+        self.delay_ms = 0.0
+        self.interval_ms = None  # Typical spacing between samples
+        self.velocity_x = 0.0  # px/ms
+        self.velocity_y = 0.0
+        self.owed_x = 0.0  # Predicted motion no real sample has covered yet
+        self.owed_y = 0.0
+        self.predicted = 0  # Predicted steps emitted
+        self.last_playout_ns = None
+        self.covered_ns = None  # Motion has been emitted up to this time
+        self._last = None  # (sent ms, arrival ms) of the previous sample
+        self._transit_min = math.inf
+        self._transit_prev_min = math.inf
+        self._window_start_ms = None
+
+    def __bool__(self):
+        return bool(self.samples)
+
+    def push(self, event, now_ns):
+        arrival_ms = event.get('rx', now_ns) / 1e6
+        sent_ms = event.get('t', arrival_ms)  # Unstamped samples play out on arrival
+
+        # The fastest transit seen over the last one or two windows marks
+        # an on-time sample; clock offset between the devices cancels out
+        transit = arrival_ms - sent_ms
+        if self._window_start_ms is None or arrival_ms - self._window_start_ms > TRANSIT_WINDOW_MS:
+            self._transit_prev_min = self._transit_min
+            self._transit_min = math.inf
+            self._window_start_ms = arrival_ms
+        self._transit_min = min(self._transit_min, transit)
+        base = min(self._transit_min, self._transit_prev_min)
+
+        if self._last is not None:
+            sent_gap = sent_ms - self._last[0]
+            if 0 < sent_gap < NEW_STROKE_MS:
+                self.jitter_ms += (abs(arrival_ms - self._last[1] - sent_gap) - self.jitter_ms) * JITTER_GAIN
+                self.interval_ms = sent_gap if self.interval_ms is None else (self.interval_ms + sent_gap) / 2
+                self.velocity_x += (event['x'] / sent_gap - self.velocity_x) * VELOCITY_SMOOTHING
+                self.velocity_y += (event['y'] / sent_gap - self.velocity_y) * VELOCITY_SMOOTHING
+            elif sent_gap >= NEW_STROKE_MS:
+                self.velocity_x = self.velocity_y = 0.0
+        self._last = (sent_ms, arrival_ms)
+        self.delay_ms = min(self.jitter_ms * DELAY_FACTOR, MAX_DELAY_MS)
+
+        event['x'], self.owed_x = _settle(event['x'], self.owed_x)
+        event['y'], self.owed_y = _settle(event['y'], self.owed_y)
+
+        playout_ns = int((sent_ms + base + self.delay_ms) * 1e6)
+        if self.samples and playout_ns < self.samples[-1][0]:
+            playout_ns = self.samples[-1][0]  # Never overtake a queued sample
+        self.samples.append((playout_ns, event))
+
+    def release(self, now_ns):
+        """Motion due by `now_ns` as (dx, dy, first event released or None)"""
+        dx = dy = 0.0
+        first = None
+        samples = self.samples
+        while samples and samples[0][0] <= now_ns:
+            playout_ns, event = samples.popleft()
+            dx += event['x']
+            dy += event['y']
+            if first is None:
+                first = event
+            self.last_playout_ns = self.covered_ns = playout_ns
+        if first is not None or samples or self.last_playout_ns is None:
+            return dx, dy, first
+
+        # The next sample is late: keep going the way the finger was going
+        horizon_ns = self.last_playout_ns + int(min(PREDICT_HORIZON_MS, 2 * (self.interval_ms or 0)) * 1e6)
+        expected_ns = self.last_playout_ns + int((self.interval_ms or 0) * 1e6) + int(self.tick * 1e9)
+        if now_ns >= expected_ns and now_ns < horizon_ns and (self.velocity_x or self.velocity_y):
+            elapsed_ms = (now_ns - self.covered_ns) / 1e6
+            dx = self.velocity_x * elapsed_ms
+            dy = self.velocity_y * elapsed_ms
+            self.owed_x += dx
+            self.owed_y += dy
+            self.covered_ns = now_ns
+            self.predicted += 1
+        elif now_ns >= horizon_ns and (self.owed_x or self.owed_y):
+            # The stroke ended, give back what was predicted past it
+            dx, dy = -self.owed_x, -self.owed_y
+            self.owed_x = self.owed_y = 0.0
+            self.velocity_x = self.velocity_y = 0.0
+        return dx, dy, None
+
+    def flush(self):
+        """Release everything now, e.g. ahead of a click, and end the stroke"""
+        dx, dy = -self.owed_x, -self.owed_y
+        first = None
+        while self.samples:
+            self.last_playout_ns, event = self.samples.popleft()
+            dx += event['x']
+            dy += event['y']
+            if first is None:
+                first = event
+        self.owed_x = self.owed_y = 0.0
+        self.velocity_x = self.velocity_y = 0.0
+        return dx, dy, first
+
+    def time_until_due(self, now_ns):
+        """Seconds until release() has something to do, None if nothing is pending"""
+        if self.samples:
+            return max(0.0, (self.samples[0][0] - now_ns) / 1e9)
+        if self.owed_x or self.owed_y or self.velocity_x or self.velocity_y:
+            if self.last_playout_ns is not None and now_ns < self.last_playout_ns + PREDICT_HORIZON_MS * 1e6 + self.tick * 1e9:
+                return self.tick
+            if self.owed_x or self.owed_y:
+                return 0.0
+        return None
@@ -0,0 +1,305 @@
+"""Latency tracing for the /metrics endpoint.
+
+Every event is stamped with time.perf_counter_ns() when it is received,
+when the dispatch loop dequeues it and when the injector thread has
+handed it to the OS. Clients also stamp events with performance.now() and
+a sequence number; a periodic ping/pong estimates the offset between the
+two clocks so the network leg can be measured too.
+
+StatsRing holds a short history of whole-server samples for the GUI's
+live panel; the server loop writes it and the GUI reads it without locks.
+"""
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+# Histogram bucket upper bounds in ns: 1 us to ~33 s, four buckets per octave
+BUCKET_BOUNDS = [int(1000 * 2 ** (i / 4)) for i in range(101)]
+STATS_HISTORY = 240  # Samples kept by a StatsRing
+
+
+def _percentile_index(counts, total, p):
+    rank = p / 100 * total
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank and count:
+            return index
+    return len(counts) - 1
+
+
+def bucket_percentile(counts, p):
+    """Upper bound in ns of the bucket holding the p-th percentile of histogram
+    `counts`, None if they're all zero. The overflow bucket reports the last bound."""
+    total = sum(counts)
+    if not total:
+        return None
+    return BUCKET_BOUNDS[min(_percentile_index(counts, total, p), len(BUCKET_BOUNDS) - 1)]
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        if ns < 0:
+            ns = 0
+        self.counts[bisect_left(BUCKET_BOUNDS, ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in ns"""
+        if not self.count:
+            return None
+        index = _percentile_index(self.counts, self.count, p)
+        return min(BUCKET_BOUNDS[index], self.max) if index < len(BUCKET_BOUNDS) else self.max
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        """Counts and percentiles in milliseconds"""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count / 1e6, 3),
+            'p50': round(self.percentile(50) / 1e6, 3),
+            'p95': round(self.percentile(95) / 1e6, 3),
+            'p99': round(self.percentile(99) / 1e6, 3),
+            'max': round(self.max / 1e6, 3),
+        }
+
+
+class RateMeter:
+    """Events per second over a sliding window of whole seconds"""
+
+    def __init__(self, window=5):
+        self.window = window
+        self.buckets = deque()  # [second, count]
+
+    def mark(self, count=1):
+        second = time.perf_counter_ns() // 1_000_000_000
+        if self.buckets and self.buckets[-1][0] == second:
+            self.buckets[-1][1] += count
+        else:
+            self.buckets.append([second, count])
+            while self.buckets[0][0] <= second - self.window:
+                self.buckets.popleft()
+
+    def rate(self):
+        second = time.perf_counter_ns() // 1_000_000_000
+        return sum(count for start, count in self.buckets if start > second - self.window) / self.window
+
+
+class ConnectionStats:
+    def __init__(self, peer):
+        self.peer = peer
+        self.protocol = None
+        self.connected_at = time.perf_counter_ns()
+        self.received = 0
+        self.injected = 0
+        self.dropped = 0  # Sequence numbers the client never sent
+        self.malformed = 0
+        self.rejected = 0  # Refused by the session policy, or typing while it's off
+        self.rate_limited = 0
+        self.udp_received = 0  # Datagrams applied
+        self.udp_late = 0  # Late or duplicate datagrams dropped
+        self.udp_lost = 0  # Datagram sequence numbers skipped, including ones that came late
+        self.duplicates = 0  # Resent after a reconnect but already applied
+        self.resumed = False  # Picked up a dropped connection's session, see session_resume.py
+        self.last_seq = None
+        self.rate = RateMeter()
+
+        self.rtt_ms = None
+        self.clock_offset_ms = None  # client clock minus server clock
+        self._best_rtt_ms = None
+        self.jitter_ms = None  # Arrival jitter and playout delay, with the jitter buffer on
+        self.playout_delay_ms = None
+
+        self.network = LatencyHistogram()  # client send -> server receive
+        self.queue = LatencyHistogram()  # receive -> dequeue
+        self.inject = LatencyHistogram()  # dequeue -> injected, including output pacing
+        self.server = LatencyHistogram()  # receive -> injected
+        self.end_to_end = LatencyHistogram()  # client send -> injected
+
+    def carry_over(self, previous, last_seq):
+        """Continue from the stats of the connection this one resumes"""
+        self.resumed = True
+        self.last_seq = last_seq
+        self.rtt_ms = previous.rtt_ms
+        self.clock_offset_ms = previous.clock_offset_ms
+        self._best_rtt_ms = previous._best_rtt_ms
+
+    def on_received(self, event, now_ns):
+        """Stamp an incoming event and account for sequence gaps"""
+        event['rx'] = now_ns
+        self.received += 1
+        self.rate.mark()
+        seq = event.get('seq')
+        if seq is not None:
+            if self.last_seq is not None and seq > self.last_seq + 1:
+                self.dropped += seq - self.last_seq - 1
+            self.last_seq = seq
+        if self.clock_offset_ms is not None and 't' in event:
+            self.network.record(now_ns - self._to_server_ns(event['t']))
+
+    def on_dequeued(self, event, now_ns):
+        event['dq'] = now_ns
+        rx = event.get('rx')
+        if rx is not None:
+            self.queue.record(now_ns - rx)
+
+    def on_injected(self, event, done_ns):
+        """Called from the injector thread once the OS call has returned"""
+        self.injected += 1
+        dq = event.get('dq')
+        rx = event.get('rx')
+        if dq is not None:
+            self.inject.record(done_ns - dq)
+        if rx is not None:
+            self.server.record(done_ns - rx)
+        if self.clock_offset_ms is not None and 't' in event:
+            self.end_to_end.record(done_ns - self._to_server_ns(event['t']))
+
+    def on_pong(self, server_ms, client_ms):
+        """Update RTT and clock offset from a ping echoed by the client"""
+        now_ms = time.perf_counter_ns() / 1e6
+        rtt = now_ms - server_ms
+        self.rtt_ms = rtt
+        # Keep the offset from the lowest-RTT sample, since it bounds the
+        # error tightest, but relax that bound so clock drift is followed
+        if self._best_rtt_ms is not None:
+            self._best_rtt_ms *= 1.1
+        if self._best_rtt_ms is None or rtt <= self._best_rtt_ms:
+            self._best_rtt_ms = rtt
+            self.clock_offset_ms = client_ms - (server_ms + rtt / 2)
+
+    def _to_server_ns(self, client_ms):
+        return int((client_ms - self.clock_offset_ms) * 1e6)
+
+    def summary(self):
+        return {
+            'peer': self.peer,
+            'protocol': self.protocol,
+            'connected_s': round((time.perf_counter_ns() - self.connected_at) / 1e9, 1),
+            'events_per_sec': round(self.rate.rate(), 1),
+            'received': self.received,
+            'injected': self.injected,
+            'dropped': self.dropped,
+            'malformed': self.malformed,
+            'rejected': self.rejected,
+            'rate_limited': self.rate_limited,
+            'resumed': self.resumed,
+            'duplicates': self.duplicates,
+            'udp': {'received': self.udp_received, 'late': self.udp_late, 'lost': self.udp_lost},
+            'rtt_ms': None if self.rtt_ms is None else round(self.rtt_ms, 3),
+            'clock_offset_ms': None if self.clock_offset_ms is None else round(self.clock_offset_ms, 3),
+            'jitter_ms': None if self.jitter_ms is None else round(self.jitter_ms, 3),
+            'playout_delay_ms': None if self.playout_delay_ms is None else round(self.playout_delay_ms, 3),
+            'latency_ms': {
+                'network': self.network.summary(),
+                'queue': self.queue.summary(),
+                'inject': self.inject.summary(),
+                'server': self.server.summary(),
+                'end_to_end': self.end_to_end.summary(),
+            },
+        }
+
+
+def _dropped(stats):
+    """Events of `stats`' connection that never reached the computer"""
+    return stats.dropped + stats.malformed + stats.rejected + stats.rate_limited + stats.udp_lost
+
+
+class ServerMetrics:
+    def __init__(self):
+        self.started_at = time.perf_counter_ns()
+        self.connections = set()
+        self.connections_total = 0
+        # Counts of connections that have closed, so totals() never goes down
+        self.closed_received = 0
+        self.closed_injected = 0
+        self.closed_dropped = 0
+        self.closed_latency = LatencyHistogram()
+
+    def open(self, stats):
+        self.connections.add(stats)
+        self.connections_total += 1
+
+    def close(self, stats):
+        if stats in self.connections:
+            self.connections.discard(stats)
+            self.closed_received += stats.received
+            self.closed_injected += stats.injected
+            self.closed_dropped += _dropped(stats)
+            self.closed_latency.merge(stats.server)
+
+    def totals(self):
+        """(received, injected, dropped, receive -> injected histogram counts)
+        over every connection so far"""
+        received, injected, dropped = self.closed_received, self.closed_injected, self.closed_dropped
+        counts = list(self.closed_latency.counts)
+        for stats in list(self.connections):
+            received += stats.received
+            injected += stats.injected
+            dropped += _dropped(stats)
+            for index, count in enumerate(stats.server.counts):
+                counts[index] += count
+        return received, injected, dropped, counts
+
+    def summary(self):
+        return {
+            'uptime_s': round((time.perf_counter_ns() - self.started_at) / 1e9, 1),
+            'cpu_s': round(time.process_time(), 3),
+            'connections_total': self.connections_total,
+            'connections': [stats.summary() for stats in list(self.connections)],
+        }
+
+
+class StatsRing:
+    """The last `size` server-wide samples, in one preallocated array.
+
+    There is one writer, the server's sampling task, and any number of
+    readers on other threads. Nothing takes a lock: a reader copies the
+    newest slot and then checks that the writer hasn't come round to it
+    again in the meantime, which with STATS_HISTORY slots it never does.
+    Values that aren't known yet are NaN.
+    """
+    FIELDS = ('time', 'events_per_sec', 'injected_per_sec', 'p50_ms', 'p95_ms', 'p99_ms',
+              'queue_depth', 'injector_pending', 'clients', 'dropped', 'coalesced')
+
+    def __init__(self, size=STATS_HISTORY):
+        self.size = size
+        self.width = len(self.FIELDS)
+        self.slots = array('d', [math.nan]) * (size * self.width)
+        self.written = 0  # Samples written so far, bumped once a slot is complete
+
+    def write(self, values):
+        base = self.written % self.size * self.width
+        for offset, value in enumerate(values):
+            self.slots[base + offset] = math.nan if value is None else value
+        self.written += 1
+
+    def latest(self):
+        """The newest sample as a dict, None before the first one"""
+        while True:
+            written = self.written
+            if not written:
+                return None
+            base = (written - 1) % self.size * self.width
+            values = self.slots[base:base + self.width]
+            if self.written - written < self.size - 1:
+                return dict(zip(self.FIELDS, values))
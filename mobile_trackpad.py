@@ -1,66 +1,132 @@
 import asyncio
-import pyautogui
-import socket
-import json
 import sys
-from aiohttp import web
+from aiohttp import web, WSCloseCode
 import logging
-from ctypes import windll
-from collections import deque
+from functools import partial
+import json
+import math
+import os
+import platform
 import time
+from input_backends import Injector, get_backend
+import protocol
+from event_queue import CoalescingQueue
+from jitter_buffer import JitterBuffer
+from scroll_engine import ScrollEngine
+from collections import deque
+from metrics import ConnectionStats, ServerMetrics, StatsRing, bucket_percentile
+from arbiter import POLICIES, SessionArbiter
+import actions
+from actions import ActionDispatcher
+import discovery
+import preview
+import session_resume
+import session_trace
+import trackpad_config
+from udp_input import UdpInput
+import web_assets
 
 # Disable unnecessary logging
 logging.getLogger('websockets').setLevel(logging.ERROR)
 logging.getLogger('aiohttp.access').setLevel(logging.ERROR)
 
-# Configure pyautogui
-pyautogui.FAILSAFE = False
-pyautogui.MINIMUM_DURATION = 0
-pyautogui.MINIMUM_SLEEP = 0
-pyautogui.PAUSE = 0
-
 # Movement smoothing settings
-MOVEMENT_BUFFER_SIZE = 3  # Number of movements to average
-MOVEMENT_THRESHOLD = 0.1  # Minimum movement to register
-MAX_QUEUE_SIZE = 10  # Maximum number of events to queue
+MOVEMENT_THRESHOLD = 0.1  # Below this a tick's movement is only carried over
+# Output pacing: pointer moves are injected at most once per interval
+# (1/60 matches a 60 Hz display), set to 0 to inject as soon as events arrive.
+# Clicks and gestures are never delayed.
+OUTPUT_INTERVAL = 1 / 60
+
+# Pointer acceleration curve as (speed, gain) points, speed in pixels/ms of
+# sensitivity-scaled movement. It's interpolated into a lookup table once.
+ACCEL_CURVE = ((0.0, 1.0), (0.5, 1.0), (2.0, 1.3), (6.0, 1.8))
+ACCEL_LUT_STEP = 0.05  # Speed covered by each table entry
+ACCEL_LUT_SIZE = 256
+# Speed is measured over the time since the last injection, clamped so
+# the first move after a pause isn't mistaken for a very slow one
+SPEED_WINDOW_MS = (1.0, 20.0)
+
+# Hold moves briefly and re-time them onto a steady clock, see jitter_buffer.py.
+# Smooths out Wi-Fi bursts at the cost of up to a few tens of milliseconds.
+JITTER_BUFFER = False
+
+# Make the OS calls from a worker process fed through shared memory, so
+# nothing else in this process can delay them, see process_injector.py
+INJECTOR_PROCESS = False
+
+# Scrolling, see scroll_engine.py
+SCROLL_UNITS = 60  # Wheel units per unit of scroll from the phone (120 is one notch)
+SCROLL_INERTIA = True  # Keep scrolling with decaying speed after a fast swipe
+
+PORT = 5000
+UDP_PORT = 5001  # Optional motion channel for native clients, see udp_input.py
+BIND_ATTEMPTS = 40  # A restarted server retries the port this many times...
+BIND_RETRY_DELAY = 0.05  # ...this many seconds apart
+
+# Pings to each client are paced from its RTT, see session_resume.py
+TYPING_TYPES = ('text', 'keys')  # Refused unless the typing setting is on
+HEARTBEAT_TIMEOUT = 4000  # Close code for a phone that stopped answering
+SESSION_RESUMED = 4001  # Close code for a socket whose session a new one took over
+STATS_INTERVAL = 0.25  # Seconds between samples for the GUI's live panel
+STATS_WINDOW = 1.0  # Seconds of events the sampled rates and percentiles cover
+
+# Sharing control between several phones, see arbiter.py
+SESSION_POLICY = 'last-touch'  # 'exclusive', 'last-touch' or 'merge'
+HANDOFF_IDLE = 0.25  # Seconds a phone must pause before its next touch takes over
+CLIENT_RATE_LIMIT = 1000  # Events/sec per phone, None for no limit
+CLIENT_RATE_BURST = 250
+
+def build_accel_lut(curve=ACCEL_CURVE, step=ACCEL_LUT_STEP, size=ACCEL_LUT_SIZE):
+    """Precompute the gain for speeds 0, step, 2*step, ... by linear interpolation"""
+    lut = []
+    for i in range(size):
+        speed = i * step
+        gain = curve[-1][1]
+        for (s0, g0), (s1, g1) in zip(curve, curve[1:]):
+            if speed <= s1:
+                gain = g0 + (g1 - g0) * (speed - s0) / (s1 - s0) if s1 > s0 else g1
+                break
+        lut.append(gain)
+    return tuple(lut)
 
-MOUSE_SENSITIVITY = 3.5
-SCROLL_SENSITIVITY = 10
+def page_config():
+    """Settings the phone page reads from TRACKPAD_CONFIG"""
+    return trackpad_config.get_config().to_client()
 
 def update_sensitivities(mouse_sens, scroll_sens):
-    """Update the sensitivity values and regenerate the HTML with new values"""
-    global MOUSE_SENSITIVITY, SCROLL_SENSITIVITY
-    MOUSE_SENSITIVITY = mouse_sens
-    SCROLL_SENSITIVITY = scroll_sens
-    return MOBILE_HTML.replace(
-        '${MOUSE_SENSITIVITY}', str(MOUSE_SENSITIVITY)
-    ).replace(
-        '${SCROLL_SENSITIVITY}', str(SCROLL_SENSITIVITY)
-    )
+    """Publish new sensitivity values; connected phones get them without reloading.
+    Safe to call from any thread."""
+    return trackpad_config.set_config(mouse_sensitivity=mouse_sens, scroll_sensitivity=scroll_sens)
 
 class MovementBuffer:
-    def __init__(self, size=MOVEMENT_BUFFER_SIZE):
-        self.buffer_x = deque(maxlen=size)
-        self.buffer_y = deque(maxlen=size)
-        self.last_process_time = time.time()
+    """Accumulates move deltas and turns them into one integer move per output tick.
+
+    The fractional part of every injected move is carried over to the next
+    one, so slow movements add up instead of being truncated away.
+    """
+    def __init__(self, interval=None, curve=None):
+        # Defaults are read at construction so tools can adjust the module settings
+        self.interval_ns = int((OUTPUT_INTERVAL if interval is None else interval) * 1e9)
+        self.accel_lut = build_accel_lut(curve or ACCEL_CURVE)
+        self.last_process_time = time.perf_counter_ns()
         self.accumulated_x = 0
         self.accumulated_y = 0
+        self.remainder_x = 0.0
+        self.remainder_y = 0.0
 
     def add_movement(self, x, y):
-        self.buffer_x.append(x)
-        self.buffer_y.append(y)
         self.accumulated_x += x
         self.accumulated_y += y
 
-    def get_smooth_movement(self):
-        if not self.buffer_x or not self.buffer_y:
+    def get_smooth_movement(self, force=False):
+        if not self.accumulated_x and not self.accumulated_y:
             return 0, 0
 
-        current_time = time.time()
+        current_time = time.perf_counter_ns()
         time_delta = current_time - self.last_process_time
 
         # Process accumulated movements if enough time has passed
-        if time_delta >= 0.016:  # ~60fps
+        if time_delta >= self.interval_ns or force:
             x = self.accumulated_x
             y = self.accumulated_y
             
@@ -68,547 +134,685 @@ class MovementBuffer:
             self.accumulated_x = 0
             self.accumulated_y = 0
             self.last_process_time = current_time
-            
-            # Apply threshold to reduce jitter
-            if abs(x) < MOVEMENT_THRESHOLD:
-                x = 0
-            if abs(y) < MOVEMENT_THRESHOLD:
-                y = 0
-                
-            return x, y
+
+            # A forced flush comes early, don't read that as a burst of speed
+            elapsed_ms = max(time_delta, self.interval_ns) / 1e6 if force else time_delta / 1e6
+            elapsed_ms = min(max(elapsed_ms, SPEED_WINDOW_MS[0]), SPEED_WINDOW_MS[1])
+            index = int(math.hypot(x, y) / elapsed_ms / ACCEL_LUT_STEP)
+            gain = self.accel_lut[min(index, len(self.accel_lut) - 1)]
+
+            # The threshold applies to the total with the carried remainder, and
+            # whatever is under it stays in the remainder, so a slow, precise
+            # movement adds up instead of being thrown away tick by tick
+            x = x * gain + self.remainder_x
+            y = y * gain + self.remainder_y
+            int_x = int(x) if abs(x) >= MOVEMENT_THRESHOLD else 0
+            int_y = int(y) if abs(y) >= MOVEMENT_THRESHOLD else 0
+            self.remainder_x = x - int_x
+            self.remainder_y = y - int_y
+            return int_x, int_y
             
         return 0, 0
 
-def get_local_ip():
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        s.connect(('10.255.255.255', 1))
-        IP = s.getsockname()[0]
-    except Exception:
-        IP = '127.0.0.1'
-    finally:
-        s.close()
-    return IP
-
-MOBILE_HTML = '''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Trackpad</title>
-    <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
-    <style>
-        :root {
-            --primary-bg: #1a1a1a;
-            --secondary-bg:rgb(151, 234, 255);
-            --accent-color: #4a90e2;
-            --text-color: #ffffff;
-        }
-        body {
-            margin: 0;
-            padding: 0;
-            overflow: hidden;
-            background: var(--primary-bg);
-            touch-action: none;
-            font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-            user-select: none;
-            -webkit-user-select: none;
-            position: fixed;
-            width: 100%;
-            height: 100%;
-            color: var(--text-color);
-        }
-        #container {
-            position: fixed;
-            width: 100%;
-            height: 100%;
-            display: flex;
-            flex-direction: column;
-        }
-        #header {
-            padding: 10px;
-            background: linear-gradient(145deg,rgb(40, 36, 42) 0%,rgb(47, 49, 46) 100%);
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            z-index: 1000;
-        }
-        #fullscreen-btn {
-            background: var(--accent-color);
-            border: none;
-            color: white;
-            padding: 8px 16px;
-            border-radius: 4px;
-            cursor: pointer;
-        }
-        #main-area {
-            flex: 1;
-            display: flex;
-            position: relative;
-        }
-        #trackpad {
-            flex: 1;
-            background: linear-gradient(145deg, #1f1f1f 0%, #2d2d2d 100%);
-            touch-action: none;
-            position: relative;
-        }
-        #scrollbar {
-            width: 40px;
-            background: rgb(255, 255, 255);
-            touch-action: none;
-            position: relative;
-        }
-        #zoombar {
-            height: 60px;
-            background: var(--secondary-bg);
-            touch-action: none;
-            position: relative;
-        }
-        .bar-indicator {
-            position: absolute;
-            background: rgb(255, 0, 0);
-            border-radius: 4px;
-            transition: opacity 0.2s;
-        }
-        #scroll-indicator {
-            width: 40px;
-            height: 100px;
-            right: 0;
-            opacity: 0;
-        }
-        #zoom-indicator {
-            width: 100px;
-            height: 60px;
-            bottom: 0;
-            opacity: 0;
-        }
-        .touch-feedback {
-            position: absolute;
-            width: 20px;
-            height: 20px;
-            background: rgba(74, 144, 226, 0.3);
-            border-radius: 50%;
-            pointer-events: none;
-            transform: translate(-50%, -50%);
-            transition: opacity 0.3s;
-        }
-    </style>
-</head>
-<body>
-    <div id="container">
-        <div id="header">
-            <span>Mobile Trackpad</span>
-            <button id="fullscreen-btn">Fullscreen</button>
-        </div>
-        <div id="main-area">
-            <div id="trackpad"></div>
-            <div id="scrollbar">
-                <div id="scroll-indicator" class="bar-indicator"></div>
-            </div>
-        </div>
-        <div id="zoombar">
-            <div id="zoom-indicator" class="bar-indicator"></div>
-        </div>
-    </div>
-
-    <script>
-        let ws;
-        let lastTouches = {};
-        let touchStartTime = 0;
-        let initialTouchPos = null;
-        let isTapping = false;
-        let threeFingerStartX = null;
-        let lastEventTime = 0;
-        let eventQueue = [];
-        let animationFrameId = null;
-        let zoomStartX = null;
-        let lastZoomEvent = 0;
-        let zoomThreshold = 100; // Minimum pixels to trigger zoom
-        let twoFingerStartY = null;
-        let lastTwoFingerY = null;
-        let lastTwoFingerX = null;
-        let threeFingerStartY = null;
-        
-        const twoFingerScrollSensitivity = 0.1;
-        const mouseSensitivity = ${MOUSE_SENSITIVITY};
-        const scrollSensitivity = ${SCROLL_SENSITIVITY};
-        const SEND_INTERVAL = 10; // ~100fps
-        let lastSendTime = 0;
-        
-        // Gesture settings
-        const TAP_THRESHOLD = 150;
-        const MOVE_THRESHOLD = 1;
-        const THREE_FINGER_SWIPE_THRESHOLD = 50;
-        const THREE_FINGER_VERTICAL_THRESHOLD = 50; // Minimum pixels for vertical three-finger gesture
-        const ZOOM_COOLDOWN = 300; // Minimum ms between zoom events
-
-        // Fullscreen handling
-        const fullscreenBtn = document.getElementById('fullscreen-btn');
-        fullscreenBtn.addEventListener('click', () => {
-            if (!document.fullscreenElement) {
-                document.documentElement.requestFullscreen();
-                fullscreenBtn.textContent = 'Exit Fullscreen';
-            } else {
-                document.exitFullscreen();
-                fullscreenBtn.textContent = 'Fullscreen';
-            }
-        });
-
-        document.addEventListener('fullscreenchange', () => {
-            fullscreenBtn.textContent = document.fullscreenElement ? 'Exit Fullscreen' : 'Fullscreen';
-        });
-
-        function connectWebSocket() {
-            const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            ws = new WebSocket(`${protocol}//${window.location.host}/ws`);
-            ws.onclose = () => setTimeout(connectWebSocket, 1000);
-            if (ws.bufferedAmount === undefined) {
-                ws.bufferedAmount = 0;
-            }
-        }
-
-        connectWebSocket();
-
-        function processEventQueue() {
-            const now = performance.now();
-            if (eventQueue.length > 0 && now - lastEventTime >= 1) {
-                const event = eventQueue.pop();
-                eventQueue = [];
-                if (ws?.readyState === WebSocket.OPEN && ws.bufferedAmount === 0) {
-                    ws.send(JSON.stringify(event));
-                    lastEventTime = now;
-                }
-            }
-            animationFrameId = requestAnimationFrame(processEventQueue);
-        }
-
-        function queueEvent(event) {
-            const now = performance.now();
-            if (now - lastSendTime >= SEND_INTERVAL) {
-                if (ws?.readyState === WebSocket.OPEN && ws.bufferedAmount === 0) {
-                    ws.send(JSON.stringify(event));
-                    lastSendTime = now;
-                }
-            }
-        }
-
-        function createTouchFeedback(x, y) {
-            const feedback = document.createElement('div');
-            feedback.className = 'touch-feedback';
-            feedback.style.left = x + 'px';
-            feedback.style.top = y + 'px';
-            document.body.appendChild(feedback);
-            setTimeout(() => feedback.remove(), 100);
-        }
-
-        function handleTrackpadTouch(e) {
-            const touches = Array.from(e.touches);
-            const numTouches = touches.length;
-
-            if (numTouches === 1) {
-                const touch = touches[0];
-                const touchId = touch.identifier;
-                const prevTouch = lastTouches[touchId];
-                
-                if (prevTouch) {
-                    const deltaX = (touch.clientX - prevTouch.clientX) * mouseSensitivity;
-                    const deltaY = (touch.clientY - prevTouch.clientY) * mouseSensitivity;
-                    
-                    if (Math.abs(deltaX) > 0 || Math.abs(deltaY) > 0) {
-                        isTapping = false;
-                        queueEvent({type: 'move', x: deltaX, y: deltaY});
-                    }
-                }
-                lastTouches[touchId] = { clientX: touch.clientX, clientY: touch.clientY };
-                createTouchFeedback(touch.clientX, touch.clientY);
-            }
-            else if (numTouches === 2) {
-                // Handle two-finger scrolling
-                const touch1 = touches[0];
-                const touch2 = touches[1];
-                const currentY = (touch1.clientY + touch2.clientY) / 2;
-                const currentX = (touch1.clientX + touch2.clientX) / 2;
-                
-                if (lastTwoFingerY !== null && lastTwoFingerX !== null) {
-                    const deltaY = -1 * (currentY - lastTwoFingerY) * twoFingerScrollSensitivity;
-                    const deltaX = (currentX - lastTwoFingerX) * twoFingerScrollSensitivity;
-                    queueEvent({type: 'scroll', x: deltaX, y: deltaY});
-                }
-                
-                lastTwoFingerY = currentY;
-                lastTwoFingerX = currentX;
-                
-                // Create touch feedback for both fingers
-                createTouchFeedback(touch1.clientX, touch1.clientY);
-                createTouchFeedback(touch2.clientX, touch2.clientY);
-            }
-            else if (numTouches === 3) {
-                const touches = Array.from(e.touches);
-                if (!threeFingerStartX) {
-                    threeFingerStartX = (touches[0].clientX + touches[1].clientX + touches[2].clientX) / 3;
-                    threeFingerStartY = (touches[0].clientY + touches[1].clientY + touches[2].clientY) / 3;
-                } else {
-                    const currentX = (touches[0].clientX + touches[1].clientX + touches[2].clientX) / 3;
-                    const currentY = (touches[0].clientY + touches[1].clientY + touches[2].clientY) / 3;
-                    
-                    // Calculate horizontal and vertical movement
-                    const swipeDistanceX = currentX - threeFingerStartX;
-                    const swipeDistanceY = currentY - threeFingerStartY;
-                    
-                    // Check which direction had more movement
-                    if (Math.abs(swipeDistanceX) > Math.abs(swipeDistanceY)) {
-                        // Horizontal swipe
-                        if (Math.abs(swipeDistanceX) > THREE_FINGER_SWIPE_THRESHOLD) {
-                            queueEvent({type: 'nextWindow'});
-                            threeFingerStartX = currentX;
-                            threeFingerStartY = currentY;
-                        }
-                    } else {
-                        // Vertical swipe
-                        if (Math.abs(swipeDistanceY) > THREE_FINGER_VERTICAL_THRESHOLD) {
-                            queueEvent({
-                                type: 'verticalGesture',
-                                direction: swipeDistanceY > 0 ? 'down' : 'up'
-                            });
-                            threeFingerStartX = currentX;
-                            threeFingerStartY = currentY;
-                        }
-                    }
-                }
-            }
-        }
+    def time_until_due(self):
+        """Seconds until pending movement may be emitted, None if nothing is pending"""
+        if not self.accumulated_x and not self.accumulated_y:
+            return None
+        return max(0.0, (self.last_process_time + self.interval_ns - time.perf_counter_ns()) / 1e9)
 
-        function handleScrollbarTouch(e) {
-            const touch = e.touches[0];
-            const touchId = touch.identifier;
-            const prevTouch = lastTouches[touchId];
-            
-            if (prevTouch) {
-                const deltaY = 10 * (touch.clientY - prevTouch.clientY) * scrollSensitivity;
-                queueEvent({type: 'scroll', x: 0, y: deltaY});
-            }
-            lastTouches[touchId] = { clientX: touch.clientX, clientY: touch.clientY };
-            
-            const indicator = document.getElementById('scroll-indicator');
-            indicator.style.top = `${touch.clientY - indicator.offsetHeight/2}px`;
-            indicator.style.opacity = '1';
+def get_local_ip():
+    """The address phones most likely reach us on, see discovery.py for the others"""
+    return discovery.local_addresses()[0]
+
+class InputPipeline:
+    """The one dispatch loop shared by every connected phone.
+
+    Connections hand their decoded events to submit(); the arbiter decides
+    whose input counts, and accepted events go through a single coalescing
+    queue and MovementBuffer to the injector. With `jitter`, each phone's
+    moves pass through its own JitterBuffer before the MovementBuffer.
+    `bindings` maps gestures to hotkeys, see actions.py.
+    """
+    def __init__(self, injector, arbiter, jitter=False, bindings=None):
+        self.injector = injector
+        self.arbiter = arbiter
+        # Merges motion, never drops clicks or gestures. The jitter buffer
+        # needs every move's own timestamp, so then only scrolls merge.
+        self.event_queue = CoalescingQueue(types=('scroll',)) if jitter else CoalescingQueue()
+        self.movement_buffer = MovementBuffer()
+        self.scroll_engine = ScrollEngine(inertia=SCROLL_INERTIA)
+        self.jitter = jitter
+        self.jitter_buffers = {}  # Session -> JitterBuffer
+        self.actions = ActionDispatcher(self.build_handlers(bindings or actions.DEFAULT_BINDINGS))
+        self.wakeup = asyncio.Event()  # Set whenever new events are queued
+        self.first_move = None  # Oldest move folded into movement_buffer, for tracing
+        self.absolute = None  # Newest tablet-mode (x, y, event) not injected yet
+        self.last_absolute_ns = 0
+        self.task = None
+
+    def open_session(self, stats):
+        return self.arbiter.open(stats)
+
+    def close_session(self, session):
+        self.arbiter.close(session)
+        buffer = self.jitter_buffers.pop(session, None)
+        if buffer is not None:
+            self.add_motion(*buffer.flush())
+            self.wakeup.set()
+
+    def add_motion(self, x, y, event=None):
+        self.movement_buffer.add_movement(x, y)
+        if self.first_move is None and event is not None:
+            self.first_move = event
+
+    def emit_motion(self, x, y):
+        """Inject a paced move, traced against the oldest move it contains"""
+        first_move = self.first_move
+        self.first_move = None
+        if x != 0 or y != 0:
+            trace = None
+            if first_move is not None:
+                trace = actions.traced(first_move)
+            self.injector.submit('move_rel', x, y, trace=trace)
+
+    def emit_absolute(self, now_ns, force=False):
+        """Inject the newest tablet position, at most once per output tick"""
+        if self.absolute is None:
+            return
+        if not force and now_ns - self.last_absolute_ns < self.movement_buffer.interval_ns:
+            return
+        x, y, event = self.absolute
+        self.absolute = None
+        self.last_absolute_ns = now_ns
+        self.injector.submit('move_to', x, y, trace=actions.traced(event))
+
+    def time_until_due(self):
+        now = time.perf_counter_ns()
+        delays = [self.movement_buffer.time_until_due(), self.scroll_engine.time_until_due(now)]
+        if self.absolute is not None:
+            delays.append(max(0, self.last_absolute_ns + self.movement_buffer.interval_ns - now) / 1e9)
+        delays.extend(buffer.time_until_due(now) for buffer in self.jitter_buffers.values())
+        delays = [delay for delay in delays if delay is not None]
+        return min(delays) if delays else None
+
+    def submit(self, session, events, now_ns):
+        if not self.arbiter.accept(session, len(events), now_ns):
+            return
+        for event in events:
+            event['session'] = session
+        self.event_queue.extend(events)
+        self.wakeup.set()
+
+    def build_handlers(self, bindings):
+        """Handler for each event type, see actions.py"""
+        injector = self.injector
+        zoom_in = actions.hotkey(injector, bindings['zoomIn'])
+        zoom_out = actions.hotkey(injector, bindings['zoomOut'])
+        gesture_down = actions.hotkey(injector, bindings['gestureDown'])
+        gesture_up = actions.hotkey(injector, bindings['gestureUp'])
+        handlers = {
+            'move': self.handle_move,
+            'moveAbs': self.handle_move_abs,
+            'scroll': self.handle_scroll,
+            'click': self.handle_click,
+            'zoom': lambda event: (zoom_in if event['scale'] > 1 else zoom_out)(event),
+            'nextWindow': actions.hotkey(injector, bindings['nextWindow']),
+            'verticalGesture': lambda event: (gesture_down if event['direction'] == 'down' else gesture_up)(event),
+            'text': self.handle_text,
+            'keys': self.handle_keys,
         }
+        if self.jitter:
+            for name, handler in handlers.items():
+                if name != 'move':
+                    handlers[name] = partial(self.after_held_motion, handler)
+        return handlers
+
+    def after_held_motion(self, handler, event):
+        buffer = self.jitter_buffers.get(event['session'])
+        if buffer:
+            # Play out held motion first so clicks land where the finger stopped
+            self.add_motion(*buffer.flush())
+            self.emit_motion(*self.movement_buffer.get_smooth_movement(force=True))
+        handler(event)
+
+    def handle_move(self, event):
+        if self.scroll_engine.coasting:
+            self.scroll_engine.stop()  # Touching the trackpad catches a fling
+        if not self.jitter:
+            self.add_motion(event['x'], event['y'], event)
+            return
+        session = event['session']
+        buffer = self.jitter_buffers.get(session)
+        if buffer is None:
+            buffer = self.jitter_buffers[session] = JitterBuffer(self.movement_buffer.interval_ns / 1e9)
+        buffer.push(event, event['dq'])
+        session.stats.jitter_ms = buffer.jitter_ms
+        session.stats.playout_delay_ms = buffer.delay_ms
+
+    def handle_move_abs(self, event):
+        if self.scroll_engine.coasting:
+            self.scroll_engine.stop()
+        # Only the newest position matters, but trace against the oldest one waiting
+        first = event if self.absolute is None else self.absolute[2]
+        self.absolute = (event['x'], event['y'], first)
+
+    def handle_click(self, event):
+        self.scroll_engine.stop()
+        self.emit_absolute(time.perf_counter_ns(), force=True)  # Click where the finger is
+        self.injector.submit('click', event['button'], trace=actions.traced(event))
+
+    def handle_text(self, event):
+        text = event['text']
+        if not isinstance(text, str) or len(text) > protocol.MAX_TEXT:
+            raise ValueError(f"Text must be a string of at most {protocol.MAX_TEXT} characters")
+        # The whole string is one backend call, see InputBackend.type_text
+        self.injector.submit('type_text', text, trace=actions.traced(event))
+
+    def handle_keys(self, event):
+        keys = event['keys']
+        if not isinstance(keys, list) or not 0 < len(keys) <= protocol.MAX_CHORD or \
+                not all(isinstance(key, str) and key for key in keys):
+            raise ValueError(f"Keys must be a list of 1 to {protocol.MAX_CHORD} key names")
+        self.injector.submit('hotkey', *keys, trace=actions.traced(event))
+
+    def handle_scroll(self, event):
+        self.scroll_engine.add(event, event['x'] * -SCROLL_UNITS, event['y'] * -SCROLL_UNITS, event['dq'])
+
+    async def run(self):
+        event_queue = self.event_queue
+        movement_buffer = self.movement_buffer
+        wakeup = self.wakeup
+        while True:
+            try:
+                if not event_queue:
+                    # Sleep until events arrive, or until paced movement is due
+                    delay = self.time_until_due()
+                    if delay is None:
+                        await wakeup.wait()
+                    elif delay > 0:
+                        try:
+                            await asyncio.wait_for(wakeup.wait(), delay)
+                        except asyncio.TimeoutError:
+                            pass
+                wakeup.clear()
+
+                now = time.perf_counter_ns()
+                dispatch = self.actions.dispatch
+                for event in event_queue.drain():
+                    event['session'].stats.on_dequeued(event, now)
+                    dispatch(event)
+
+                for buffer in self.jitter_buffers.values():
+                    x, y, first = buffer.release(now)
+                    if x or y or first is not None:
+                        self.add_motion(x, y, first)
+
+                x, y = movement_buffer.get_smooth_movement()
+                if movement_buffer.time_until_due() is None:  # Everything accumulated went out
+                    self.emit_motion(x, y)
+                self.emit_absolute(now)
+
+                x, y, first = self.scroll_engine.take(now)
+                if x or y:
+                    self.injector.submit('scroll', x, y, trace=actions.traced(first) if first else None)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Error processing events: {e}")
+                await asyncio.sleep(0.1)
 
-        function handleZoombarTouch(e) {
-            const touch = e.touches[0];
-            const touchId = touch.identifier;
-            
-            if (!zoomStartX) {
-                zoomStartX = touch.clientX;
-                return;
-            }
-            
-            const now = Date.now();
-            const deltaX = touch.clientX - zoomStartX;
-            
-            if (Math.abs(deltaX) >= zoomThreshold && now - lastZoomEvent >= ZOOM_COOLDOWN) {
-                queueEvent({
-                    type: 'zoom',
-                    scale: deltaX > 0 ? 1.1 : 0.9
-                });
-                zoomStartX = touch.clientX;
-                lastZoomEvent = now;
-            }
-            
-            const indicator = document.getElementById('zoom-indicator');
-            indicator.style.left = `${touch.clientX - indicator.offsetWidth/2}px`;
-            indicator.style.opacity = '1';
-        }
+    def start(self):
+        self.injector.start()
+        self.task = asyncio.create_task(self.run())
 
-        const trackpad = document.getElementById('trackpad');
-        const scrollbar = document.getElementById('scrollbar');
-        const zoombar = document.getElementById('zoombar');
-
-        // Trackpad events
-        trackpad.addEventListener('touchstart', (e) => {
-            e.preventDefault();
-            touchStartTime = Date.now();
-            isTapping = true;
-            initialTouchPos = {
-                x: e.touches[0].clientX,
-                y: e.touches[0].clientY
-            };
-        });
-
-        trackpad.addEventListener('touchmove', (e) => {
-            e.preventDefault();
-            handleTrackpadTouch(e);
-        });
-
-        trackpad.addEventListener('touchend', (e) => {
-            e.preventDefault();
-            if (e.touches.length === 0) {
-                if (isTapping && (Date.now() - touchStartTime) < TAP_THRESHOLD) {
-                    queueEvent({type: 'click', button: 'left'});
-                }
-                threeFingerStartX = null;
-                threeFingerStartY = null;
-                lastTouches = {};
-                lastTwoFingerY = null;
-                lastTwoFingerX = null;
-            }
-            initialTouchPos = null;
-        });
-
-        // Scrollbar events
-        scrollbar.addEventListener('touchstart', (e) => {
-            e.preventDefault();
-            handleScrollbarTouch(e);
-        });
-
-        scrollbar.addEventListener('touchmove', (e) => {
-            e.preventDefault();
-            handleScrollbarTouch(e);
-        });
-
-        scrollbar.addEventListener('touchend', (e) => {
-            e.preventDefault();
-            lastTouches = {};
-            document.getElementById('scroll-indicator').style.opacity = '0';
-        });
-
-        // Zoombar events
-        zoombar.addEventListener('touchstart', (e) => {
-            e.preventDefault();
-            zoomStartX = e.touches[0].clientX;
-            handleZoombarTouch(e);
-        });
-
-        zoombar.addEventListener('touchmove', (e) => {
-            e.preventDefault();
-            handleZoombarTouch(e);
-        });
-
-        zoombar.addEventListener('touchend', (e) => {
-            e.preventDefault();
-            lastTouches = {};
-            zoomStartX = null;
-            document.getElementById('zoom-indicator').style.opacity = '0';
-        });
-
-        // Cleanup
-        window.addEventListener('beforeunload', () => {
-            if (animationFrameId) {
-                cancelAnimationFrame(animationFrameId);
-            }
-        });
-    </script>
-</body>
-</html>
-'''
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.get_running_loop().run_in_executor(None, self.injector.stop, 1)
+
+PIPELINE = web.AppKey('pipeline', InputPipeline)
+METRICS = web.AppKey('metrics', ServerMetrics)
+TRACE_DIR = web.AppKey('trace_dir', str)
+CLIENTS = web.AppKey('clients', set)  # Open WebSockets, for pushing config changes
+SESSIONS = web.AppKey('sessions', session_resume.SessionStore)  # Held for phones that dropped out
+CONFIG_LISTENER = web.AppKey('config_listener', object)
+UDP_INPUT = web.AppKey('udp_input', UdpInput)  # Listening once start_udp_input has run
+ADVERTISER = web.AppKey('advertiser', discovery.Advertiser)  # Running once start_discovery has run
+STATS = web.AppKey('stats', StatsRing)  # Sampled every STATS_INTERVAL while the app runs
+PREVIEW = web.AppKey('preview', preview.PreviewService)  # Workers start with the first /preview
+
+def config_message(config):
+    return json.dumps({'type': 'config', **config.to_client()})
+
+async def broadcast_config(app, config):
+    message = config_message(config)
+    for ws in list(app[CLIENTS]):
+        try:
+            await ws.send_str(message)
+        except ConnectionResetError:
+            pass
 
 async def websocket_handler(request):
-    ws = web.WebSocketResponse(timeout=1, heartbeat=0.5)  # Add heartbeat to keep connection alive
+    # No aiohttp heartbeat: send_pings paces pings and spots dead phones from the measured RTT
+    ws = web.WebSocketResponse(timeout=1, protocols=protocol.SUBPROTOCOLS)
     await ws.prepare(request)
     
-    movement_buffer = MovementBuffer()
-    event_queue = deque(maxlen=MAX_QUEUE_SIZE)
-    process_task = None
+    pipeline = request.app[PIPELINE]
+    sessions = request.app[SESSIONS]
+    stats = ConnectionStats(request.remote)
+    stats.protocol = ws.ws_protocol or 'json'
+    heartbeat = session_resume.Heartbeat()
+    resumable = sessions.resume(request.query.get('session'))
+    replaced = None
+    if resumable is not None:
+        previous, resumable.ws = resumable.ws, ws
+        if previous is not None and not previous.closed:
+            # The phone saw this one die before we did
+            replaced = asyncio.create_task(previous.close(code=SESSION_RESUMED, message=b'Resumed elsewhere'))
+        # Same arbiter session and jitter buffer, this socket's own stats
+        stats.carry_over(resumable.session.stats, resumable.last_seq)
+        resumable.session.stats = stats
+        if stats.rtt_ms is not None:
+            heartbeat.on_rtt(stats.rtt_ms / 1000)
+    else:
+        resumable = sessions.open(pipeline.open_session(stats), ws)
+    session = resumable.session
+    # Everything is registered before the first await, so the finally below
+    # undoes it even if the phone drops during the handshake
+    request.app[METRICS].open(stats)
+    request.app[CLIENTS].add(ws)
+    recorder = None
+    if request.app[TRACE_DIR]:
+        recorder = session_trace.open_session_trace(request.app[TRACE_DIR], request.remote)
+    udp_input = request.app[UDP_INPUT]
+    udp_channel = None
+    if udp_input.transport is not None:
+        udp_channel = udp_input.open(session, recorder)
+    last_heard = time.perf_counter()
+
+    async def send_pings():
+        # The client echoes these with its own clock, see ConnectionStats.on_pong
+        try:
+            while not ws.closed:
+                if time.perf_counter() - last_heard > heartbeat.timeout():
+                    # Gone quiet: drop the socket, the session waits for the phone to resume it
+                    await ws.close(code=HEARTBEAT_TIMEOUT, message=b'No response')
+                    break
+                # RTT and backlog let the client pace its sends to the link, seq lets
+                # it forget what has been applied, timeout is when it should give up on us
+                await ws.send_str(json.dumps({
+                    'type': 'ping', 't': time.perf_counter_ns() / 1e6, 'rtt': stats.rtt_ms,
+                    'backlog': len(pipeline.event_queue) + pipeline.injector.pending(),
+                    'seq': resumable.last_seq, 'timeout': round(heartbeat.timeout() * 1000)}))
+                await asyncio.sleep(heartbeat.interval())
+        except ConnectionResetError:
+            pass
 
-    async def process_events():
+    ping_task = None
+    goodbye = False
+    try:
+        # The phone resends whatever it sent after `seq`
+        await ws.send_str(json.dumps({'type': 'session', 'token': resumable.token,
+                                      'resumed': stats.resumed, 'seq': resumable.last_seq}))
+        # The page may be an old copy (a tab left open, the back/forward cache), so always send the current config
+        await ws.send_str(config_message(trackpad_config.get_config()))
+        if udp_channel is not None:
+            await ws.send_str(json.dumps(udp_input.offer(udp_channel)))
+        ping_task = asyncio.create_task(send_pings())
         while True:
+            msg = await ws.receive()
+            if msg.type == web.WSMsgType.CLOSE:
+                # The close code aiohttp keeps can't tell a phone hanging up from a
+                # dropped connection or our own close, so look at what the phone sent
+                goodbye = msg.data in (WSCloseCode.OK, WSCloseCode.GOING_AWAY)
+                break
+            if msg.type in (web.WSMsgType.CLOSING, web.WSMsgType.CLOSED):
+                break
+            last_heard = time.perf_counter()
+            if recorder is not None and msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+                recorder.record(session_trace.KIND_TEXT if msg.type == web.WSMsgType.TEXT
+                                else session_trace.KIND_BINARY, msg.data)
+            try:
+                if msg.type == web.WSMsgType.BINARY:
+                    events = protocol.decode_binary(msg.data)
+                elif msg.type == web.WSMsgType.TEXT:
+                    events = protocol.decode_json(msg.data)
+                    if events[0]['type'] == 'pong':
+                        stats.on_pong(events[0]['t'], events[0]['c'])
+                        heartbeat.on_rtt(stats.rtt_ms / 1000)
+                        continue
+                else:
+                    continue
+            except (ValueError, KeyError, TypeError):  # Malformed JSON or binary frame
+                stats.malformed += 1
+                continue
+            events = resumable.fresh(events)
+            if not events:
+                continue
+            now = time.perf_counter_ns()
+            for event in events:
+                stats.on_received(event, now)
+            if not trackpad_config.get_config().typing:
+                # Anyone on the network could type commands otherwise
+                allowed = [event for event in events if event['type'] not in TYPING_TYPES]
+                if len(allowed) != len(events):
+                    stats.rejected += len(events) - len(allowed)
+                    events = allowed
+                    if not events:
+                        continue
+            pipeline.submit(session, events, now)
+    except ConnectionResetError:
+        pass  # Dropped mid-send, the session is held like any other drop
+    finally:
+        request.app[CLIENTS].discard(ws)
+        if udp_channel is not None:
+            udp_input.close(udp_channel)
+        # A phone that said goodbye has no session to come back to. On shutdown
+        # SessionStore.close() has already forgotten the held ones.
+        sessions.detach(resumable, ws, partial(pipeline.close_session, session), hold=not goodbye)
+        request.app[METRICS].close(stats)
+        if recorder is not None:
+            recorder.close()
+        if ping_task is not None:
+            ping_task.cancel()
             try:
-                if event_queue:
-                    event = event_queue.popleft()
-                    
-                    if event['type'] == 'move':
-                        movement_buffer.add_movement(event['x'], event['y'])
-                        x, y = movement_buffer.get_smooth_movement()
-                        if x != 0 or y != 0:
-                            pyautogui.moveRel(x, y, duration=0)
-                    
-                    elif event['type'] == 'scroll':
-                        scroll_y = int(event['y'] * -60)
-                        scroll_x = int(event['x'] * -60)
-                        if scroll_y != 0:
-                            windll.user32.mouse_event(0x0800, 0, 0, scroll_y, 0)
-                        if scroll_x != 0:
-                            windll.user32.mouse_event(0x01000, 0, 0, scroll_x, 0)
-                    
-                    elif event['type'] == 'click':
-                        pyautogui.click(button=event['button'])
-                    
-                    elif event['type'] == 'zoom':
-                        if event['scale'] > 1:
-                            pyautogui.hotkey('ctrl', '+')
-                        else:
-                            pyautogui.hotkey('ctrl', '-')
-                    
-                    elif event['type'] == 'nextWindow':
-                        pyautogui.hotkey('alt', 'tab')
-
-                    elif data['type'] == 'verticalGesture':
-                        if data['direction'] == 'down':
-                            pyautogui.hotkey('win', 'm')  # Windows+M minimizes all windows
-                        else:  # direction is 'up'
-                            pyautogui.hotkey('win', 'shift', 'm')  # Windows+Shift+M restores all windows
-                
-                await asyncio.sleep(0.016)  # Cap at ~60fps
+                await ping_task
             except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logging.error(f"Error processing events: {e}")
-                await asyncio.sleep(0.1)
+                pass
+        if replaced is not None:
+            await replaced
 
-    
-    try:
-        # Start the event processing task
-        process_task = asyncio.create_task(process_events())
+    return ws
 
-        async for msg in ws:
-            if msg.type == web.WSMsgType.TEXT:
+async def metrics_handler(request):
+    pipeline = request.app[PIPELINE]
+    summary = request.app[METRICS].summary()
+    summary['policy'] = pipeline.arbiter.policy
+    summary['queue_depth'] = len(pipeline.event_queue)
+    summary['max_queue_depth'] = pipeline.event_queue.max_depth
+    summary['coalesced'] = pipeline.event_queue.coalesced
+    summary['inertial_scroll_units'] = pipeline.scroll_engine.inertial_units
+    summary['injector_pending'] = pipeline.injector.pending()
+    summary['actions'] = pipeline.actions.summary()
+    if request.app[UDP_INPUT].transport is not None:
+        summary['udp_unauthenticated'] = request.app[UDP_INPUT].unauthenticated
+    return web.json_response(summary)
+
+async def preview_handler(request):
+    """Stream the screen around the cursor while the preview setting is on, see preview.py.
+
+    ?format=jpeg (default) or webp picks the tile encoding. The phone answers
+    every frame with {"type": "ack", "frame": n} once it has drawn it.
+    """
+    if not trackpad_config.get_config().preview:
+        raise web.HTTPForbidden(text="Screen preview is turned off on the computer")
+    fmt = request.query.get('format', 'jpeg')
+    if fmt not in preview.FORMATS:
+        raise web.HTTPBadRequest(text=f"Unknown format {fmt!r}, expected one of {', '.join(preview.FORMATS)}")
+    ws = web.WebSocketResponse(heartbeat=session_resume.MAX_PING_INTERVAL)
+    await ws.prepare(request)
+
+    service = request.app[PREVIEW]
+    budget = preview.LinkBudget()
+    acked = asyncio.Event()
+
+    async def send_frames():
+        known = {}  # Tile digests the phone has, only for tiles in its current view
+        frame = 0
+        while not ws.closed and trackpad_config.get_config().preview:
+            started = time.perf_counter()
+            if not budget.ready(started):
+                acked.clear()
                 try:
-                    data = json.loads(msg.data)
-                    event_queue.append(data)
-                except json.JSONDecodeError:
-                    continue
+                    await asyncio.wait_for(acked.wait(), preview.ACK_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                # Capture, hashing and encoding all run in a worker process
+                view, cursor, known, tiles = await service.render(known, fmt, budget.quality)
+            except preview.PreviewUnavailable as e:
+                await ws.send_str(json.dumps({'type': 'error', 'message': f"Preview unavailable: {e}"}))
+                break
+            data = preview.encode_frame(frame, view, cursor, tiles)
+            await ws.send_bytes(data)
+            budget.on_sent(frame, len(data), time.perf_counter())
+            frame += 1
+            await asyncio.sleep(max(0, budget.delay(len(data)) - (time.perf_counter() - started)))
+        await ws.close()
+
+    service.clients.add(ws)
+    sender = asyncio.create_task(send_frames())
+    try:
+        async for msg in ws:
+            if msg.type != web.WSMsgType.TEXT:
+                continue
+            try:
+                ack = json.loads(msg.data)
+                if ack['type'] == 'ack':
+                    budget.on_ack(ack['frame'], time.perf_counter())
+                    acked.set()
+            except (ValueError, KeyError, TypeError):
+                continue
     finally:
-        process_task.cancel()
+        service.clients.discard(ws)
+        sender.cancel()
         try:
-            await process_task
-        except asyncio.CancelledError:
+            await sender
+        except (asyncio.CancelledError, ConnectionResetError):
             pass
-
     return ws
 
+async def qr_handler(request):
+    """QR code for this server's best address, or for ?ip= one of the others"""
+    addresses = discovery.local_addresses()
+    ip = request.query.get('ip', addresses[0])
+    if ip not in addresses:
+        raise web.HTTPNotFound(text=f"{ip} isn't an address of this computer, try one of {', '.join(addresses)}")
+    url = f"http://{ip}:{request.url.port or PORT}"
+    try:
+        # Cached per URL, only the first request for each one draws it
+        png = await asyncio.get_running_loop().run_in_executor(None, discovery.qr_png, url)
+    except ImportError:
+        raise web.HTTPNotImplemented(text="Install the qrcode package to get QR codes")
+    return web.Response(body=png, content_type='image/png', headers={'Cache-Control': 'no-cache'})
+
 async def index_handler(request):
-    html = MOBILE_HTML.replace(
-        '${MOUSE_SENSITIVITY}', str(MOUSE_SENSITIVITY)
-    ).replace(
-        '${SCROLL_SENSITIVITY}', str(SCROLL_SENSITIVITY)
-    )
-    return web.Response(text=html, content_type='text/html')
-
-async def main():
+    # Rendered and compressed once per configuration, see web_assets.py
+    return web_assets.get_store().page(page_config()).respond(request)
+
+async def start_pipeline(app):
+    app[PIPELINE].start()
+    # Config changes usually come from the Qt thread, hand them to this loop
+    loop = asyncio.get_running_loop()
+    app[CONFIG_LISTENER] = lambda config: asyncio.run_coroutine_threadsafe(broadcast_config(app, config), loop)
+    trackpad_config.add_listener(app[CONFIG_LISTENER])
+
+async def stop_pipeline(app):
+    trackpad_config.remove_listener(app[CONFIG_LISTENER])
+    app[UDP_INPUT].stop()
+    app[SESSIONS].close()
+    await app[ADVERTISER].stop()
+    app[PREVIEW].close()
+    await app[PIPELINE].stop()
+
+async def sample_stats(app):
+    """Write a server-wide sample to app[STATS] every STATS_INTERVAL.
+
+    Only reads counters the connections and the injector already keep, so
+    the input path does no extra work for it.
+    """
+    pipeline, metrics, ring = app[PIPELINE], app[METRICS], app[STATS]
+    history = deque(maxlen=round(STATS_WINDOW / STATS_INTERVAL) + 1)  # (time, totals...)
+    while True:
+        now = time.perf_counter()
+        received, injected, dropped, counts = metrics.totals()
+        history.append((now, received, injected, counts))
+        then, received_then, injected_then, counts_then = history[0]
+        elapsed = now - then
+        window = [count - count_then for count, count_then in zip(counts, counts_then)]
+        percentiles = [bucket_percentile(window, p) for p in (50, 95, 99)]
+        ring.write((now,
+                    (received - received_then) / elapsed if elapsed else None,
+                    (injected - injected_then) / elapsed if elapsed else None,
+                    *(None if ns is None else ns / 1e6 for ns in percentiles),
+                    len(pipeline.event_queue), pipeline.injector.pending(), len(metrics.connections),
+                    dropped, pipeline.event_queue.coalesced))
+        await asyncio.sleep(STATS_INTERVAL)
+
+async def stats_sampler(app):
+    task = asyncio.create_task(sample_stats(app))
+    yield
+    task.cancel()
+
+async def close_clients(app):
+    # Otherwise shutdown waits for every phone to hang up on its own
+    for ws in list(app[CLIENTS]) + list(app[PREVIEW].clients):
+        await ws.close(code=WSCloseCode.GOING_AWAY, message=b'Server shutdown')
+
+async def start_site(runner, host='0.0.0.0', port=PORT, attempts=BIND_ATTEMPTS):
+    """Listen on host:port, waiting briefly if a server that's shutting down still holds it"""
+    # SO_REUSEADDR lets us bind past connections left in TIME_WAIT. On Windows it would
+    # let another program bind the same port too, so it's left off there.
+    reuse = None if sys.platform == 'win32' else True
+    for attempt in range(attempts):
+        site = web.TCPSite(runner, host, port, reuse_address=reuse)
+        try:
+            await site.start()
+            return site
+        except OSError:
+            await site.stop()
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(BIND_RETRY_DELAY)
+
+async def start_udp_input(app, host='0.0.0.0', port=UDP_PORT, attempts=BIND_ATTEMPTS):
+    """Accept motion datagrams for `app`, next to its TCP site, waiting briefly
+    if a server that's shutting down still holds the port"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(attempts):
+        try:
+            await loop.create_datagram_endpoint(lambda: app[UDP_INPUT], local_addr=(host, port))
+            return app[UDP_INPUT]
+        except OSError:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(BIND_RETRY_DELAY)
+
+async def start_discovery(app, port, on_change=None):
+    """Announce `app` on `port` over mDNS and watch for network changes,
+    calling `on_change(addresses)` after each"""
+    await app[ADVERTISER].start(port, on_change)
+    return app[ADVERTISER]
+
+def make_app(backend=None, trace_dir=None, policy=None, jitter=None, injector_process=None):
+    """Build the aiohttp app; input goes to `backend` (platform default if None).
+
+    If `trace_dir` (or TRACKPAD_TRACE_DIR) is set, every connection's inbound
+    messages are recorded there for tools/replay_trace.py. `policy` picks how
+    several phones share control, see arbiter.py, and `jitter` turns the
+    jitter buffer on or off (JITTER_BUFFER if None). `injector_process`
+    (INJECTOR_PROCESS if None) injects from a worker process, on x86 only;
+    the backend is then created in the worker, so pass its name as `backend`.
+    """
     app = web.Application()
+    arbiter = SessionArbiter(policy or SESSION_POLICY, rate=CLIENT_RATE_LIMIT,
+                             burst=CLIENT_RATE_BURST, handoff=HANDOFF_IDLE)
+    if INJECTOR_PROCESS if injector_process is None else injector_process:
+        import process_injector  # Only costs its imports when used
+        if process_injector.SUPPORTED:
+            injector = process_injector.ProcessInjector(backend)
+        else:
+            logging.warning(f"Can't inject from a separate process on {platform.machine()}, using a thread")
+            injector = Injector(get_backend(backend))
+    else:
+        injector = Injector(backend or get_backend())
+    app[PIPELINE] = InputPipeline(injector, arbiter,
+                                  jitter=JITTER_BUFFER if jitter is None else jitter,
+                                  bindings=actions.load_bindings())
+    app[METRICS] = ServerMetrics()
+    app[TRACE_DIR] = trace_dir or os.environ.get('TRACKPAD_TRACE_DIR')
+    app[CLIENTS] = set()
+    app[SESSIONS] = session_resume.SessionStore()
+    app[UDP_INPUT] = UdpInput(app[PIPELINE])
+    app[ADVERTISER] = discovery.Advertiser()
+    app[STATS] = StatsRing()
+    app[PREVIEW] = preview.PreviewService()
     app.router.add_get('/', index_handler)
+    app.router.add_get('/static/{name}', web_assets.static_handler)
     app.router.add_get('/ws', websocket_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/qr', qr_handler)
+    app.router.add_get('/preview', preview_handler)
+    app.on_startup.append(start_pipeline)
+    app.cleanup_ctx.append(stats_sampler)
+    app.on_shutdown.append(close_clients)
+    app.on_cleanup.append(stop_pipeline)
+    return app
+
+async def serve(host='0.0.0.0', port=PORT, udp_port=UDP_PORT, **app_options):
+    """Run the server until cancelled; `app_options` go to make_app()"""
+    app = make_app(**app_options)
     
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', 5000)
     
-    ip_address = get_local_ip()
+    def network_changed(addresses):
+        print(f"Network changed, connect to: {discovery.urls(port, addresses)[0]}")
+
+    url, *others = discovery.urls(port)
     print(f"\nMobile Trackpad Server")
     print(f"====================")
-    print(f"Connect to: http://{ip_address}:5000")
+    print(f"Connect to: {url}")
+    if others:
+        print(f"        or: {', '.join(others)}")
+    print(f"QR code at: {url}/qr")
     print(f"Press Ctrl+C to stop the server\n")
     
     try:
-        await site.start()
+        await start_site(runner, host, port)
+        if udp_port is not None:
+            await start_udp_input(app, host, udp_port)
+        await start_discovery(app, port, network_changed)
         await asyncio.Event().wait()  # Keeps the server running
     finally:
         print("Shutting down server...")
         await runner.cleanup()
 
+def main(argv=None):
+    """Headless entry point, `python -m mobile_trackpad`. Never loads Qt."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Mobile Trackpad server without the GUI')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--udp-port', type=int, default=UDP_PORT)
+    parser.add_argument('--no-udp', action='store_true', help="don't open the UDP motion channel")
+    parser.add_argument('--backend', help='windows, uinput, xtest or recording (default: best available)')
+    parser.add_argument('--policy', choices=POLICIES, help=f'several phones (default: {SESSION_POLICY})')
+    parser.add_argument('--trace-dir', help='record every connection here, see tools/replay_trace.py')
+    parser.add_argument('--jitter', action='store_true', help='turn the jitter buffer on')
+    parser.add_argument('--preview', action='store_true', help='let phones view the screen around the cursor')
+    parser.add_argument('--typing', action='store_true', help='let phones type text and press key chords')
+    parser.add_argument('--injector-process', action='store_true', help='inject input from a separate process')
+    args = parser.parse_args(argv)
+    if args.preview:
+        trackpad_config.set_config(preview=True)
+    if args.typing:
+        trackpad_config.set_config(typing=True)
 
-if __name__ == '__main__':
     try:
-        asyncio.run(main())
+        asyncio.run(serve(args.host, args.port, None if args.no_udp else args.udp_port,
+                          backend=args.backend if args.injector_process else get_backend(args.backend),
+                          trace_dir=args.trace_dir, policy=args.policy, jitter=args.jitter or None,
+                          injector_process=args.injector_process or None))
     except KeyboardInterrupt:
         print("\nServer stopped")
-        sys.exit(0)
\ No newline at end of file
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""A small live view of the screen around the cursor, streamed to the phone.
+
+The desktop is cut into TILE x TILE tiles on a fixed grid. Each frame a
+worker process grabs the tiles under the view (REGION pixels centred on
+the cursor), hashes them, and encodes only those whose hash differs from
+what the phone already has, as JPEG or WebP. Capturing, hashing and
+encoding all happen in a process pool, so none of it competes with the
+input event loop for the GIL.
+
+LinkBudget paces the stream: the phone acknowledges every frame, and the
+measured throughput sets both the frame rate and the encoder quality.
+
+Frames come from a FrameSource. ScreenSource captures the real screen
+with the mss package; SyntheticSource draws a moving test pattern and is
+what tests and headless machines use. Encoding needs Pillow.
+
+A frame on the wire is little-endian:
+
+    u8 1 | u32 frame | i32 view left, top | u16 view width, height |
+    i32 cursor x, y | u16 tile size | u16 tile count |
+    tile count x (u16 column | u16 row | u32 length | image bytes)
+
+Coordinates are desktop pixels from the desktop's top-left corner.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import struct
+import sys
+import time
+from io import BytesIO
+
+TILE = 128  # Tile edge in desktop pixels
+REGION = (640, 400)  # Desktop pixels shown around the cursor
+FORMATS = {'jpeg': 'JPEG', 'webp': 'WEBP'}
+WORKERS = 2
+
+MIN_FPS = 2
+TARGET_FPS = 10  # Quality drops when the link can't keep this up
+MAX_FPS = 15
+MIN_QUALITY = 20
+MAX_QUALITY = 85
+START_QUALITY = 60
+LINK_SHARE = 0.5  # Part of the measured throughput the preview may use
+MAX_IN_FLIGHT = 2  # Frames sent but not yet acknowledged
+ACK_TIMEOUT = 2.0  # Seconds before an unacknowledged frame is written off
+
+FRAME_KIND = 1
+_FRAME_HEADER = struct.Struct('<BIiiHHiiHH')
+_TILE_HEADER = struct.Struct('<HHI')
+
+
+class FrameSource:
+    """Where preview pixels come from. Only used inside one worker process."""
+    name = 'base'
+
+    def size(self):
+        """(width, height) of the whole desktop"""
+        raise NotImplementedError
+
+    def cursor(self):
+        """(x, y) of the pointer on the desktop"""
+        raise NotImplementedError
+
+    def grab(self, left, top, width, height):
+        """RGB bytes, row by row, of that part of the desktop"""
+        raise NotImplementedError
+
+
+class SyntheticSource(FrameSource):
+    """A gradient with a box sliding across it and a cursor circling over it.
+
+    Everything is a function of the wall clock, so every worker process
+    draws the same picture at the same moment.
+    """
+    name = 'synthetic'
+    WIDTH = 1920
+    HEIGHT = 1080
+    BOX = (240, 160)
+
+    def __init__(self):
+        self.reds = bytes(x * 255 // (self.WIDTH - 1) for x in range(self.WIDTH))
+        self.box_row = b'\xff\xc0\x20' * self.BOX[0]
+
+    def size(self):
+        return self.WIDTH, self.HEIGHT
+
+    def cursor(self):
+        t = time.time()
+        return (int(self.WIDTH / 2 + self.WIDTH * 0.35 * math.sin(t * 0.5)),
+                int(self.HEIGHT / 2 + self.HEIGHT * 0.35 * math.sin(t * 0.7)))
+
+    def grab(self, left, top, width, height):
+        box_width, box_height = self.BOX
+        box_left = int((time.time() * 200) % (self.WIDTH - box_width))
+        box_top = self.HEIGHT // 3
+        out = bytearray(width * height * 3)
+        row = bytearray(width * 3)
+        row[0::3] = self.reds[left:left + width]
+        row[2::3] = b'\x80' * width
+        for y in range(height):
+            row[1::3] = bytes(((top + y) * 255 // (self.HEIGHT - 1),)) * width
+            start = y * width * 3
+            out[start:start + width * 3] = row
+            if box_top <= top + y < box_top + box_height:
+                lo = max(box_left, left)
+                hi = min(box_left + box_width, left + width)
+                if lo < hi:
+                    out[start + (lo - left) * 3:start + (hi - left) * 3] = self.box_row[:(hi - lo) * 3]
+        return bytes(out)
+
+
+class ScreenSource(FrameSource):
+    """The real desktop, through mss"""
+    name = 'screen'
+
+    def __init__(self):
+        import mss
+        self.mss = mss.mss()
+        desktop = self.mss.monitors[0]  # All monitors together
+        self.left = desktop['left']
+        self.top = desktop['top']
+        self.width = desktop['width']
+        self.height = desktop['height']
+        self._cursor = self._cursor_reader()
+
+    def _cursor_reader(self):
+        if sys.platform == 'win32':
+            import ctypes
+
+            class POINT(ctypes.Structure):
+                _fields_ = [('x', ctypes.c_long), ('y', ctypes.c_long)]
+            point = POINT()
+
+            def read():
+                ctypes.windll.user32.GetCursorPos(ctypes.byref(point))
+                return point.x, point.y
+            return read
+        try:
+            from Xlib import display
+            root = display.Display().screen().root
+
+            def read():
+                pointer = root.query_pointer()
+                return pointer.root_x, pointer.root_y
+            return read
+        except Exception:
+            # Nowhere to ask, keep showing the middle of the desktop
+            return lambda: (self.left + self.width // 2, self.top + self.height // 2)
+
+    def size(self):
+        return self.width, self.height
+
+    def cursor(self):
+        x, y = self._cursor()
+        return x - self.left, y - self.top
+
+    def grab(self, left, top, width, height):
+        shot = self.mss.grab({'left': self.left + left, 'top': self.top + top,
+                              'width': width, 'height': height})
+        return shot.rgb
+
+
+SOURCES = {
+    'screen': ScreenSource,
+    'synthetic': SyntheticSource,
+}
+
+
+def get_source(name=None):
+    """Create the named FrameSource; TRACKPAD_PREVIEW_SOURCE or the screen by default"""
+    name = name or os.environ.get('TRACKPAD_PREVIEW_SOURCE') or 'screen'
+    if name not in SOURCES:
+        raise ValueError(f"Unknown preview source {name!r}, expected one of {tuple(SOURCES)}")
+    return SOURCES[name]()
+
+
+def view_around(cursor, desktop, region=REGION):
+    """(left, top, width, height) of `region` centred on `cursor`, kept on the desktop"""
+    width = min(region[0], desktop[0])
+    height = min(region[1], desktop[1])
+    left = min(max(cursor[0] - width // 2, 0), desktop[0] - width)
+    top = min(max(cursor[1] - height // 2, 0), desktop[1] - height)
+    return left, top, width, height
+
+
+# Worker process side
+
+_source = None
+
+
+def init_worker(source_name):
+    global _source
+    _source = get_source(source_name)
+
+
+def render(known, fmt='jpeg', quality=START_QUALITY, region=REGION):
+    """Runs in the pool. Grabs the tiles under the view around the cursor.
+
+    `known` maps (column, row) to the digest the phone has for that tile.
+    Returns (view, cursor, digests of every tile in view, [(column, row,
+    encoded image)] for the tiles that changed).
+    """
+    from PIL import Image
+
+    desktop = _source.size()
+    cursor = _source.cursor()
+    view = view_around(cursor, desktop, region)
+    left, top, width, height = view
+    first_col, first_row = left // TILE, top // TILE
+    last_col, last_row = (left + width - 1) // TILE, (top + height - 1) // TILE
+    # One grab for the tile-aligned box around the view
+    box_left, box_top = first_col * TILE, first_row * TILE
+    box_width = min((last_col + 1) * TILE, desktop[0]) - box_left
+    box_height = min((last_row + 1) * TILE, desktop[1]) - box_top
+    pixels = _source.grab(box_left, box_top, box_width, box_height)
+    stride = box_width * 3
+
+    digests = {}
+    changed = []
+    for row in range(first_row, last_row + 1):
+        y0 = row * TILE - box_top
+        tile_height = min(TILE, box_height - y0)
+        for col in range(first_col, last_col + 1):
+            x0 = (col * TILE - box_left) * 3
+            tile_width = min(TILE, box_width - col * TILE + box_left)
+            span = tile_width * 3
+            tile = b''.join(pixels[(y0 + y) * stride + x0:(y0 + y) * stride + x0 + span]
+                            for y in range(tile_height))
+            digest = hashlib.blake2b(tile, digest_size=8).digest()
+            digests[col, row] = digest
+            if known.get((col, row)) == digest:
+                continue
+            out = BytesIO()
+            Image.frombytes('RGB', (tile_width, tile_height), tile).save(out, FORMATS[fmt], quality=quality)
+            changed.append((col, row, out.getvalue()))
+    return view, cursor, digests, changed
+
+
+# Server side
+
+def encode_frame(frame, view, cursor, tiles):
+    parts = [_FRAME_HEADER.pack(FRAME_KIND, frame & 0xFFFFFFFF, *view, *cursor, TILE, len(tiles))]
+    for col, row, data in tiles:
+        parts.append(_TILE_HEADER.pack(col, row, len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def decode_frame(data):
+    """(frame, view, cursor, [(column, row, image bytes)]), the inverse of encode_frame"""
+    kind, frame, left, top, width, height, x, y, tile, count = _FRAME_HEADER.unpack_from(data)
+    offset = _FRAME_HEADER.size
+    tiles = []
+    for _ in range(count):
+        col, row, size = _TILE_HEADER.unpack_from(data, offset)
+        offset += _TILE_HEADER.size
+        tiles.append((col, row, bytes(data[offset:offset + size])))
+        offset += size
+    return frame, (left, top, width, height), (x, y), tiles
+
+
+class LinkBudget:
+    """Paces one preview stream to what its link carries.
+
+    Throughput is measured from frame size over the time to its
+    acknowledgement. The next frame waits until the last one would have
+    gone through at LINK_SHARE of that rate, between MIN_FPS and MAX_FPS,
+    and the quality steps down while that keeps the stream under
+    TARGET_FPS and creeps back up while there's room.
+    """
+
+    def __init__(self):
+        self.quality = START_QUALITY
+        self.bandwidth = None  # Bytes/sec, smoothed
+        self.in_flight = {}  # Frame -> (sent at, bytes)
+
+    def ready(self, now):
+        for frame, (sent, _) in list(self.in_flight.items()):
+            if now - sent > ACK_TIMEOUT:
+                del self.in_flight[frame]
+        return len(self.in_flight) < MAX_IN_FLIGHT
+
+    def on_sent(self, frame, size, now):
+        self.in_flight[frame] = (now, size)
+
+    def on_ack(self, frame, now):
+        sent = self.in_flight.pop(frame, None)
+        if sent is None:
+            return
+        sent_at, size = sent
+        rate = size / max(now - sent_at, 1e-3)
+        self.bandwidth = rate if self.bandwidth is None else self.bandwidth * 0.8 + rate * 0.2
+
+    def delay(self, size):
+        """Seconds to wait after sending `size` bytes before the next frame"""
+        interval = 1 / MAX_FPS
+        if self.bandwidth:
+            interval = max(interval, size / (self.bandwidth * LINK_SHARE))
+        if interval > 1 / TARGET_FPS:
+            self.quality = max(MIN_QUALITY, self.quality - 5)
+        elif size and interval <= 1 / MAX_FPS:
+            self.quality = min(MAX_QUALITY, self.quality + 1)
+        return min(interval, 1 / MIN_FPS)
+
+
+class PreviewUnavailable(RuntimeError):
+    """Pillow or the capture package is missing, or the capture failed"""
+
+
+class PreviewService:
+    """The worker pool, started on the first preview connection.
+
+    Workers are spawned rather than forked, so they never inherit the
+    server's threads or the GUI, and create their FrameSource once.
+    """
+
+    def __init__(self, source=None, workers=WORKERS):
+        self.source = source  # Name for get_source()
+        self.workers = workers
+        self.pool = None
+        self.clients = set()  # Open preview WebSockets
+
+    def get_pool(self):
+        if self.pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'),
+                                            initializer=init_worker, initargs=(self.source,))
+        return self.pool
+
+    async def render(self, known, fmt, quality):
+        """render() in a worker; raises PreviewUnavailable if it can't run"""
+        from concurrent.futures.process import BrokenProcessPool
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.get_pool(), render, known, fmt, quality)
+        except ImportError as e:
+            raise PreviewUnavailable("install Pillow to stream the screen") from e
+        except BrokenProcessPool as e:
+            # The initializer failed: no mss, no display, or a worker crashed
+            self.close()
+            raise PreviewUnavailable("screen capture failed, is the mss package installed?") from e
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,418 @@
+"""Runs input injection in its own process, fed through shared memory.
+
+With the server inside the GUI (trackpad_gui.py) the injector thread
+shares the GIL with Qt repaints, QR drawing and everything else Python
+does there, and any of those can hold a cursor move back by milliseconds.
+ProcessInjector stands in for input_backends.Injector and makes the OS
+calls from a worker process that has nothing else to do.
+
+Requests cross over in one multiprocessing.shared_memory block holding
+two single-producer single-consumer rings of fixed-size slots: requests
+to the worker and, for traced requests, completion times back. Every
+index has exactly one writer and is only advanced after the slots it
+covers are written, so neither the processes nor the threads feeding the
+ring take a lock, and records are packed with struct instead of pickled.
+A request that doesn't fit in one slot (text, hotkeys) carries on in the
+slots after it.
+
+Python has no memory fences, so this relies on what x86 guarantees and
+weaker CPUs such as ARM don't: aligned 8-byte stores are atomic, and
+stores become visible to the other process in program order. SUPPORTED
+says whether this machine is one of those; elsewhere mobile_trackpad
+falls back to the threaded Injector.
+
+The worker only sleeps on a semaphore after flagging that it's about to,
+and the producer only posts it when it sees the flag, so a busy stream of
+moves never makes a system call to wake anything. Without a fence the
+two sides can rarely miss each other's flag; the request then waits for
+the worker's next IDLE_WAKE check. A monitor thread in the server
+process reports completions and restarts the worker if it exits or stops
+making progress on queued input.
+"""
+import asyncio
+import logging
+import multiprocessing
+import platform
+import struct
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+SLOTS = 4096  # Request slots, a full MAX_TEXT of emoji takes about 600
+SLOT_SIZE = 64
+DONE_SLOTS = 4096  # Completion slots
+IDLE_WAKE = 0.05  # Seconds an idle worker sleeps before checking the ring anyway
+WATCHDOG_INTERVAL = 0.1  # Seconds between the monitor's liveness checks
+HANG_TIMEOUT = 5.0  # Seconds without progress on queued input before the worker is restarted
+RESTART_DELAY = 1.0  # Minimum seconds between restarts, so a broken backend doesn't spin
+
+# CPUs whose memory ordering the rings rely on, see above
+SUPPORTED = platform.machine().lower() in ('x86_64', 'amd64', 'x86', 'i386', 'i686')
+
+# Control block: one u64 per field, each written by one side only
+_HEAD = 0  # Request slots written (producer)
+_TAIL = 8  # Request slots taken (worker)
+_TAKEN = 16  # Requests taken (worker)
+_HEARTBEAT = 24  # Bumped by the worker on every pass of its loop
+_WAITING = 32  # Worker is about to sleep (worker)
+_DONE_HEAD = 40  # Completions written (worker)
+_DONE_TAIL = 48  # Completions read (monitor)
+_LAST_SEQ = 56  # Sequence number of the last request taken (worker)
+_CONTROL_SIZE = 64
+_U64 = struct.Struct('<Q')
+
+_RECORD = struct.Struct('<IBBH')  # seq, op, flags, continuation slots
+_DONE = struct.Struct('<Iq')  # seq, perf_counter_ns when the call returned
+_DONE_SIZE = 16
+_FIRST_PAYLOAD = SLOT_SIZE - _RECORD.size
+_LENGTH = struct.Struct('<I')
+TRACED = 0x01
+
+OP_STOP = 0
+# Backend method -> (op code, struct format of its arguments). None means
+# string arguments: a u32 count, then a u32 length and UTF-8 for each.
+OPS = {
+    'move_rel': (1, '<ii'),
+    'scroll': (2, '<ii'),
+    'move_to': (3, '<dd'),
+    'move_abs': (4, '<dd'),
+    'click': (5, None),
+    'hotkey': (6, None),
+    'type_text': (7, None),
+}
+_BY_CODE = {code: (name, struct.Struct(fmt) if fmt else None) for name, (code, fmt) in OPS.items()}
+_FORMATS = {name: struct.Struct(fmt) for name, (code, fmt) in OPS.items() if fmt}
+
+
+def _block_size(slots=SLOTS, done_slots=DONE_SLOTS):
+    return _CONTROL_SIZE + slots * SLOT_SIZE + done_slots * _DONE_SIZE
+
+
+def encode_args(op, args):
+    """(op code, payload) for backend.op(*args)"""
+    try:
+        code, fmt = OPS[op]
+    except KeyError:
+        raise ValueError(f"{op} can't be sent to the injector process")
+    if fmt:
+        return code, _FORMATS[op].pack(*args)
+    parts = [_LENGTH.pack(len(args))]
+    for arg in args:
+        data = arg.encode('utf-8', 'surrogatepass')
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    return code, b''.join(parts)
+
+
+def decode_args(code, payload):
+    """(method name, args), the inverse of encode_args"""
+    name, fmt = _BY_CODE[code]
+    if fmt:
+        return name, fmt.unpack_from(payload)
+    # The payload runs on to the end of its last slot, so go by the count
+    count, = _LENGTH.unpack_from(payload)
+    args = []
+    offset = _LENGTH.size
+    for _ in range(count):
+        length, = _LENGTH.unpack_from(payload, offset)
+        offset += _LENGTH.size
+        args.append(bytes(payload[offset:offset + length]).decode('utf-8', 'surrogatepass'))
+        offset += length
+    return name, tuple(args)
+
+
+class SharedRings:
+    """The shared block, seen from either side.
+
+    Indices only ever grow; a slot is its index modulo the ring size.
+    """
+
+    def __init__(self, shm, slots=SLOTS, done_slots=DONE_SLOTS):
+        self.shm = shm
+        self.buf = shm.buf
+        self.slots = slots
+        self.done_slots = done_slots
+        self.done_at = _CONTROL_SIZE + slots * SLOT_SIZE
+
+    def get(self, field):
+        return _U64.unpack_from(self.buf, field)[0]
+
+    def set(self, field, value):
+        _U64.pack_into(self.buf, field, value)
+
+    def _slot(self, index):
+        start = _CONTROL_SIZE + index % self.slots * SLOT_SIZE
+        return start, start + SLOT_SIZE
+
+    # Producer side
+
+    def put(self, seq, code, flags, payload):
+        """Write one request, False if it doesn't fit right now"""
+        extra = max(0, -(-(len(payload) - _FIRST_PAYLOAD) // SLOT_SIZE))
+        head = self.get(_HEAD)
+        if head + 1 + extra - self.get(_TAIL) > self.slots:
+            return False
+        start, end = self._slot(head)
+        _RECORD.pack_into(self.buf, start, seq, code, flags, extra)
+        first = payload[:_FIRST_PAYLOAD]
+        self.buf[start + _RECORD.size:start + _RECORD.size + len(first)] = first
+        for n in range(extra):
+            chunk = payload[_FIRST_PAYLOAD + n * SLOT_SIZE:_FIRST_PAYLOAD + (n + 1) * SLOT_SIZE]
+            start, end = self._slot(head + 1 + n)
+            self.buf[start:start + len(chunk)] = chunk
+        self.set(_HEAD, head + 1 + extra)  # Publish
+        return True
+
+    def take_done(self):
+        """Completions the worker has written since the last call, as (seq, done_ns)"""
+        tail, head = self.get(_DONE_TAIL), self.get(_DONE_HEAD)
+        done = []
+        while tail < head:
+            done.append(_DONE.unpack_from(self.buf, self.done_at + tail % self.done_slots * _DONE_SIZE))
+            tail += 1
+        self.set(_DONE_TAIL, tail)
+        return done
+
+    # Worker side
+
+    def take(self):
+        """The oldest request as (seq, code, flags, payload), None if there isn't one.
+        Takes it off the ring before it runs, so a request that kills the worker
+        isn't tried again by the next one."""
+        tail = self.get(_TAIL)
+        if tail == self.get(_HEAD):
+            return None
+        start, end = self._slot(tail)
+        seq, code, flags, extra = _RECORD.unpack_from(self.buf, start)
+        payload = bytearray(self.buf[start + _RECORD.size:end])
+        for n in range(extra):
+            start, end = self._slot(tail + 1 + n)
+            payload += self.buf[start:end]
+        self.set(_TAIL, tail + 1 + extra)
+        self.set(_TAKEN, self.get(_TAKEN) + 1)
+        self.set(_LAST_SEQ, seq)
+        return seq, code, flags, payload
+
+    def put_done(self, seq, done_ns):
+        head = self.get(_DONE_HEAD)
+        if head - self.get(_DONE_TAIL) >= self.done_slots:
+            return  # The monitor is far behind, this event just goes untraced
+        _DONE.pack_into(self.buf, self.done_at + head % self.done_slots * _DONE_SIZE, seq, done_ns)
+        self.set(_DONE_HEAD, head + 1)
+
+
+def _not_after(seq, last):
+    """Whether u32 sequence number `seq` comes at or before `last`, across wraparound"""
+    return (last - seq) & 0xFFFFFFFF < 0x80000000
+
+
+def run_worker(backend_name, shm_name, wake, done, slots, done_slots):
+    """The worker process: make backend calls from the ring until told to stop"""
+    from input_backends import get_backend
+
+    shm = shared_memory.SharedMemory(shm_name)
+    rings = SharedRings(shm, slots, done_slots)
+    backend = get_backend(backend_name)
+    heartbeat = rings.get(_HEARTBEAT)
+    unreported = 0  # Completions the monitor hasn't been woken for
+    try:
+        while True:
+            heartbeat += 1
+            rings.set(_HEARTBEAT, heartbeat)
+            record = rings.take()
+            if record is None:
+                if unreported:
+                    done.release()
+                    unreported = 0
+                rings.set(_WAITING, 1)
+                # A request may have arrived before the flag was visible
+                if rings.get(_TAIL) == rings.get(_HEAD):
+                    wake.acquire(timeout=IDLE_WAKE)
+                rings.set(_WAITING, 0)
+                continue
+            seq, code, flags, payload = record
+            if code == OP_STOP:
+                break
+            name, args = decode_args(code, payload)
+            try:
+                getattr(backend, name)(*args)
+                if flags & TRACED:
+                    rings.put_done(seq, time.perf_counter_ns())
+                    unreported += 1
+                    # Under a long burst, wake the monitor before its ring fills up
+                    if unreported >= done_slots // 4:
+                        done.release()
+                        unreported = 0
+            except Exception as e:
+                logging.error(f"Error injecting {name}: {e}")
+    finally:
+        if unreported:
+            done.release()
+        backend.close()
+        del rings
+        shm.close()
+
+
+class ProcessInjector:
+    """Drop-in for input_backends.Injector that injects from a worker process.
+
+    Takes the backend's name rather than a backend, since the backend has
+    to be created inside the worker. trace callbacks run on the monitor
+    thread, as they ran on the injector thread before. perf_counter_ns is
+    system-wide on every supported OS, so the worker's timestamps compare
+    directly with the server's. Requests submitted while the worker is
+    still starting up wait on the ring until it's ready.
+
+    The thread that calls start() is the ring's only producer: submit()
+    must be called from it, and stop() only once submitting has ended.
+    Requests that find the ring full wait in a backlog; when start() ran
+    in an event loop, the monitor has the loop flush it.
+    """
+
+    def __init__(self, backend_name=None, slots=SLOTS, done_slots=DONE_SLOTS):
+        self.backend_name = backend_name
+        self.slots = slots
+        self.done_slots = done_slots
+        self.context = multiprocessing.get_context('spawn')
+        self.shm = None
+        self.rings = None
+        self.process = None
+        self.monitor = None
+        self.restarts = 0
+        self._wake = self.context.Semaphore(0)
+        self._done = self.context.Semaphore(0)
+        self._loop = None  # The producer's event loop, if it has one
+        self._seq = 0
+        self._written = 0  # Requests put on the ring
+        self._backlog = deque()  # Requests waiting for room on the ring
+        # (seq, trace callback) in seq order; appended by the producer, popped
+        # by the monitor, both of which deque does atomically
+        self._traces = deque()
+        self._stopping = False
+
+    def start(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=_block_size(self.slots, self.done_slots))
+        self.shm.buf[:_CONTROL_SIZE] = bytes(_CONTROL_SIZE)
+        self.rings = SharedRings(self.shm, self.slots, self.done_slots)
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        self._spawn()
+        self.monitor = threading.Thread(target=self._watch, name='injector-monitor', daemon=True)
+        self.monitor.start()
+
+    def _spawn(self):
+        self.process = self.context.Process(
+            target=run_worker, name='input-injector', daemon=True,
+            args=(self.backend_name, self.shm.name, self._wake, self._done, self.slots, self.done_slots))
+        self.process.start()
+        self._spawned_at = time.monotonic()
+
+    def submit(self, op, *args, trace=None):
+        """Queue backend.op(*args); trace(done_ns) is called once it has run"""
+        code, payload = encode_args(op, args)
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        flags = 0
+        if trace is not None:
+            self._traces.append((self._seq, trace))
+            flags = TRACED
+        self._backlog.append((self._seq, code, flags, payload))
+        self._flush()
+
+    def _flush(self):
+        # Producer side only
+        if self.rings is None:
+            return
+        wrote = False
+        while self._backlog:
+            if not self.rings.put(*self._backlog[0]):
+                break
+            self._backlog.popleft()
+            self._written += 1
+            wrote = True
+        if wrote and self.rings.get(_WAITING):
+            self._wake.release()
+
+    def pending(self):
+        if self.rings is None:
+            return len(self._backlog)
+        return self._written - self.rings.get(_TAKEN) + len(self._backlog)
+
+    def _report_done(self):
+        traces = self._traces
+        for seq, done_ns in self.rings.take_done():
+            # Completions come in order, so older traces ahead of this one will
+            # never complete: the call failed or the done ring was full
+            while traces and traces[0][0] != seq and _not_after(traces[0][0], seq):
+                traces.popleft()
+            if traces and traces[0][0] == seq:
+                trace = traces.popleft()[1]
+                try:
+                    trace(done_ns)
+                except Exception as e:
+                    logging.error(f"Error tracing injected event: {e}")
+
+    def _forget_taken(self):
+        """Drop the traces of requests a dead worker took and never finished"""
+        last = self.rings.get(_LAST_SEQ)
+        traces = self._traces
+        while traces and _not_after(traces[0][0], last):
+            traces.popleft()
+
+    def _watch(self):
+        heartbeat = self.rings.get(_HEARTBEAT)
+        progress_at = time.monotonic()
+        while not self._stopping:
+            self._done.acquire(timeout=WATCHDOG_INTERVAL)
+            if self._stopping:
+                break
+            self._report_done()
+            if self._backlog and self._loop is not None:
+                try:
+                    self._loop.call_soon_threadsafe(self._flush)
+                except RuntimeError:
+                    pass  # The loop has closed
+            now = time.monotonic()
+            beat = self.rings.get(_HEARTBEAT)
+            if beat != heartbeat or not self.pending():
+                heartbeat = beat
+                progress_at = now
+            hung = now - progress_at > HANG_TIMEOUT
+            if (hung or not self.process.is_alive()) and now - self._spawned_at >= RESTART_DELAY:
+                self._restart('stopped responding' if hung else f'exited with code {self.process.exitcode}')
+                progress_at = time.monotonic()
+
+    def _restart(self, reason):
+        logging.warning(f"Injector process {reason}, restarting it")
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        # Whatever it had taken is lost, queued requests carry on with the new one
+        self._report_done()
+        self._forget_taken()
+        self.rings.set(_WAITING, 0)
+        self.restarts += 1
+        self._spawn()
+
+    def stop(self, timeout=None):
+        if self.rings is None:
+            return
+        # The monitor goes first, or it would restart the worker as it exits
+        self._stopping = True
+        self._done.release()
+        self.monitor.join(timeout)
+        # Submitting has ended, so this thread can take over as the producer
+        self._backlog.append((0, OP_STOP, 0, b''))
+        self._flush()
+        self._wake.release()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self._report_done()
+        self._traces.clear()
+        self.rings = None
+        self.shm.close()
+        self.shm.unlink()
@@ -0,0 +1,274 @@
+"""Wire format for trackpad events.
+
+Clients that negotiate the `trackpad.bin.v1` WebSocket subprotocol send
+binary frames; everything else keeps sending one JSON object per text
+frame. Both decode to the same event dicts.
+
+A binary frame is a sequence of records:
+
+    u8 opcode | u8 count | payload
+
+MOVE and SCROLL carry `count` samples of two little-endian float16 deltas
+(x, y). MOVE_ABS carries `count` tablet-mode positions, two u16 giving
+where on the pad the finger is, 0-65535 across and down. CLICK, ZOOM and VERTICAL_GESTURE carry one u8 argument and
+NEXT_WINDOW carries nothing. TEXT carries a u16 byte length and that
+much UTF-8 (count is 0), KEYS carries `count` key names, each a u8 length
+and the name, to be pressed together as a chord. A STAMP record (u32 sequence number, f64
+client performance.now() in ms) applies to the events after it; each
+following event takes the next sequence number.
+
+Motion can also be sent as UDP datagrams (see udp_input.py), so a lost
+packet never holds up the ones behind it:
+
+    u8 version | 8-byte channel id | u32 sequence | records | 16-byte tag
+
+The records are as above but limited to MOVE, SCROLL, MOVE_ABS and STAMP, and the
+tag is HMAC-SHA256 over everything before it, truncated, keyed with the
+channel key the server hands out over the WebSocket.
+"""
+import hashlib
+import hmac
+import json
+import math
+import struct
+
+SUBPROTOCOL = 'trackpad.bin.v1'
+JSON_SUBPROTOCOL = 'trackpad.json'
+SUBPROTOCOLS = (SUBPROTOCOL, JSON_SUBPROTOCOL)
+
+OP_MOVE = 0x01
+OP_SCROLL = 0x02
+OP_CLICK = 0x03
+OP_ZOOM = 0x04
+OP_NEXT_WINDOW = 0x05
+OP_VERTICAL_GESTURE = 0x06
+OP_STAMP = 0x07
+OP_MOVE_ABS = 0x08
+OP_TEXT = 0x09
+OP_KEYS = 0x0A
+
+BUTTONS = ('left', 'right', 'middle')
+MAX_SAMPLES = 255
+MAX_TEXT = 8192  # Characters in one text event
+MAX_CHORD = 6  # Keys in one chord
+MAX_DELTA = 65504.0  # Largest float16, the most one binary sample can carry
+
+_HEADER = struct.Struct('<BB')
+_SAMPLE = struct.Struct('<ee')
+_POSITION = struct.Struct('<HH')
+POSITION_MAX = 0xFFFF
+_STAMP = struct.Struct('<Id')
+_LENGTH = struct.Struct('<H')
+
+DATAGRAM_VERSION = 1
+DATAGRAM_TAG_SIZE = 16
+DATAGRAM_TYPES = ('move', 'scroll', 'moveAbs')  # Anything else needs guaranteed delivery
+_DATAGRAM_HEADER = struct.Struct('<B8sI')
+DATAGRAM_HEADER_SIZE = _DATAGRAM_HEADER.size
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_delta(value):
+    return _is_number(value) and abs(value) <= MAX_DELTA
+
+
+def _is_chord(keys):
+    return isinstance(keys, list) and 0 < len(keys) <= MAX_CHORD and \
+        all(isinstance(key, str) and key for key in keys)
+
+
+# What each JSON event type must carry, as field -> check. Types not listed
+# only need a valid seq and t, the dispatcher counts them as unknown.
+_JSON_FIELDS = {
+    'move': {'x': _is_delta, 'y': _is_delta},
+    'scroll': {'x': _is_delta, 'y': _is_delta},
+    'moveAbs': {'x': _is_delta, 'y': _is_delta},
+    'click': {'button': lambda button: button in BUTTONS},
+    'zoom': {'scale': _is_delta},
+    'verticalGesture': {'direction': lambda direction: direction in ('up', 'down')},
+    'text': {'text': lambda text: isinstance(text, str) and len(text) <= MAX_TEXT},
+    'keys': {'keys': _is_chord},
+    'pong': {'t': _is_number, 'c': _is_number},
+}
+
+
+def decode_json(text):
+    """Decode a JSON text frame into a list of events"""
+    event = json.loads(text)
+    if not isinstance(event, dict) or not isinstance(event.get('type'), str):
+        raise ProtocolError('Event must be an object with a type')
+    for field, valid in _JSON_FIELDS.get(event['type'], {}).items():
+        if field not in event or not valid(event[field]):
+            raise ProtocolError(f"Bad or missing {field!r} in {event['type']} event")
+    if 'seq' in event and not (isinstance(event['seq'], int) and not isinstance(event['seq'], bool)
+                               and event['seq'] >= 0):
+        raise ProtocolError('seq must be a non-negative integer')
+    if 't' in event and not _is_number(event['t']):
+        raise ProtocolError('t must be a number')
+    return [event]
+
+
+def decode_binary(data):
+    """Decode a binary frame into a list of events"""
+    events = []
+    offset = 0
+    end = len(data)
+    stamped = 0
+    seq = t = None
+    try:
+        while offset < end:
+            op, count = _HEADER.unpack_from(data, offset)
+            offset += 2
+            if op == OP_STAMP:
+                if seq is not None:
+                    _apply_stamp(events, stamped, seq, t)
+                seq, t = _STAMP.unpack_from(data, offset)
+                if not math.isfinite(t):
+                    raise ProtocolError('Stamp time is not a number')
+                offset += _STAMP.size
+                stamped = len(events)
+            elif op == OP_MOVE or op == OP_SCROLL:
+                kind = 'move' if op == OP_MOVE else 'scroll'
+                size = count * 4
+                if offset + size > end:
+                    raise ProtocolError('Truncated sample payload')
+                for x, y in _SAMPLE.iter_unpack(data[offset:offset + size]):
+                    if not (math.isfinite(x) and math.isfinite(y)):
+                        raise ProtocolError('Sample is not a finite number')
+                    events.append({'type': kind, 'x': x, 'y': y})
+                offset += size
+            elif op == OP_MOVE_ABS:
+                size = count * 4
+                if offset + size > end:
+                    raise ProtocolError('Truncated position payload')
+                for x, y in _POSITION.iter_unpack(data[offset:offset + size]):
+                    events.append({'type': 'moveAbs', 'x': x / POSITION_MAX, 'y': y / POSITION_MAX})
+                offset += size
+            elif op == OP_NEXT_WINDOW:
+                events.append({'type': 'nextWindow'})
+            elif op == OP_TEXT:
+                size, = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                if offset + size > end:
+                    raise ProtocolError('Truncated text')
+                events.append({'type': 'text', 'text': bytes(data[offset:offset + size]).decode('utf-8')})
+                offset += size
+            elif op == OP_KEYS:
+                keys = []
+                for _ in range(count):
+                    size = data[offset]
+                    if offset + 1 + size > end:
+                        raise ProtocolError('Truncated key name')
+                    keys.append(bytes(data[offset + 1:offset + 1 + size]).decode('utf-8'))
+                    offset += 1 + size
+                events.append({'type': 'keys', 'keys': keys})
+            else:
+                arg = data[offset]
+                offset += 1
+                if op == OP_CLICK:
+                    events.append({'type': 'click', 'button': BUTTONS[arg]})
+                elif op == OP_ZOOM:
+                    events.append({'type': 'zoom', 'scale': 1.1 if arg else 0.9})
+                elif op == OP_VERTICAL_GESTURE:
+                    events.append({'type': 'verticalGesture', 'direction': 'down' if arg else 'up'})
+                else:
+                    raise ProtocolError(f'Unknown opcode {op:#x}')
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ProtocolError(f'Malformed frame: {e}') from None
+    if seq is not None:
+        _apply_stamp(events, stamped, seq, t)
+    return events
+
+
+def _apply_stamp(events, start, seq, t):
+    for event in events[start:]:
+        event['seq'] = seq
+        event['t'] = t
+        seq += 1
+
+
+def encode_stamp(seq, t):
+    return _HEADER.pack(OP_STAMP, 0) + _STAMP.pack(seq & 0xFFFFFFFF, t)
+
+
+def encode_samples(op, samples):
+    """Pack (x, y) samples into MOVE or SCROLL records"""
+    out = bytearray()
+    for start in range(0, len(samples), MAX_SAMPLES):
+        chunk = samples[start:start + MAX_SAMPLES]
+        out += _HEADER.pack(op, len(chunk))
+        for x, y in chunk:
+            out += _SAMPLE.pack(x, y)
+    return bytes(out)
+
+
+def encode_event(event):
+    """Encode one event dict the same way the browser client does"""
+    if 'seq' in event:
+        return encode_stamp(event['seq'], event['t']) + _encode_body(event)
+    return _encode_body(event)
+
+
+def _encode_body(event):
+    kind = event['type']
+    if kind == 'move':
+        return encode_samples(OP_MOVE, [(event['x'], event['y'])])
+    if kind == 'scroll':
+        return encode_samples(OP_SCROLL, [(event['x'], event['y'])])
+    if kind == 'moveAbs':
+        return _HEADER.pack(OP_MOVE_ABS, 1) + _POSITION.pack(round(min(max(event['x'], 0), 1) * POSITION_MAX),
+                                                            round(min(max(event['y'], 0), 1) * POSITION_MAX))
+    if kind == 'click':
+        return bytes((OP_CLICK, 1, BUTTONS.index(event['button'])))
+    if kind == 'zoom':
+        return bytes((OP_ZOOM, 1, 1 if event['scale'] > 1 else 0))
+    if kind == 'nextWindow':
+        return bytes((OP_NEXT_WINDOW, 0))
+    if kind == 'verticalGesture':
+        return bytes((OP_VERTICAL_GESTURE, 1, 1 if event['direction'] == 'down' else 0))
+    if kind == 'text':
+        text = event['text'].encode('utf-8')
+        return _HEADER.pack(OP_TEXT, 0) + _LENGTH.pack(len(text)) + text
+    if kind == 'keys':
+        names = [key.encode('utf-8') for key in event['keys']]
+        return _HEADER.pack(OP_KEYS, len(names)) + b''.join(bytes((len(name),)) + name for name in names)
+    raise ProtocolError(f'Unknown event type {kind!r}')
+
+
+def _datagram_tag(key, signed):
+    return hmac.new(key, signed, hashlib.sha256).digest()[:DATAGRAM_TAG_SIZE]
+
+
+def encode_datagram(channel_id, key, seq, body):
+    """Wrap MOVE/SCROLL records for the UDP channel `channel_id`"""
+    signed = _DATAGRAM_HEADER.pack(DATAGRAM_VERSION, channel_id, seq & 0xFFFFFFFF) + body
+    return signed + _datagram_tag(key, signed)
+
+
+def datagram_channel(data):
+    """The channel id a datagram claims to belong to"""
+    if len(data) < _DATAGRAM_HEADER.size + DATAGRAM_TAG_SIZE or data[0] != DATAGRAM_VERSION:
+        raise ProtocolError('Not a trackpad datagram')
+    return bytes(data[1:9])
+
+
+def decode_datagram(data, key):
+    """Authenticate a datagram and decode it into (sequence number, events)"""
+    signed = data[:-DATAGRAM_TAG_SIZE]
+    if not hmac.compare_digest(data[-DATAGRAM_TAG_SIZE:], _datagram_tag(key, signed)):
+        raise ProtocolError('Datagram failed authentication')
+    seq = _DATAGRAM_HEADER.unpack_from(signed)[2]
+    events = decode_binary(signed[_DATAGRAM_HEADER.size:])
+    for event in events:
+        if event['type'] not in DATAGRAM_TYPES:
+            raise ProtocolError(f"{event['type']} events can't be sent as datagrams")
+        # Datagrams are sequenced on their own, keep them out of the WebSocket's gap count
+        event.pop('seq', None)
+    return seq, events
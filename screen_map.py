@@ -0,0 +1,69 @@
+"""Maps the phone's trackpad surface onto the desktop, for tablet mode.
+
+In tablet mode the phone sends where the finger is on the pad, 0-1 across
+and down, instead of how far it moved. Backends report the desktop layout
+(see InputBackend.screens) and take positions as 0-1 across the whole
+virtual desktop (InputBackend.move_abs). ScreenMap sits in between: it
+picks the area the pad covers, the whole desktop or one monitor, and
+precomputes the affine transform from pad to desktop coordinates, so
+placing the pointer is two multiply-adds and one backend call.
+
+Asking the OS for the layout isn't free, so it's only asked again every
+CHECK_INTERVAL seconds, and the transform is only rebuilt when the
+answer differs, i.e. when a monitor was added, removed or rearranged.
+"""
+import time
+
+TABLET_SCREEN = None  # None covers the whole desktop, n covers monitor n (0 is the primary)
+CHECK_INTERVAL = 2.0  # Seconds between checks for a changed display layout
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+
+
+def affine(layout, screen=None):
+    """(a, b, c, d, e, f) taking pad (u, v) to desktop (a*u + b*v + c, d*u + e*v + f).
+
+    `layout` is (desktop, monitors) as returned by InputBackend.screens().
+    Pixel centres are what get mapped, so u = 1 lands on a monitor's last
+    column rather than on the first column of its neighbour.
+    """
+    desktop, monitors = layout
+    desk_left, desk_top, desk_width, desk_height = desktop
+    # A monitor that has been unplugged falls back to the whole desktop
+    if screen is None or screen >= len(monitors):
+        left, top, width, height = desktop
+    else:
+        left, top, width, height = monitors[screen]
+    scale_x = 1 / max(desk_width - 1, 1)
+    scale_y = 1 / max(desk_height - 1, 1)
+    return ((width - 1) * scale_x, 0.0, (left - desk_left) * scale_x,
+            0.0, (height - 1) * scale_y, (top - desk_top) * scale_y)
+
+
+class ScreenMap:
+    def __init__(self, backend, screen=TABLET_SCREEN, check_interval=CHECK_INTERVAL):
+        self.backend = backend
+        self.screen = screen
+        self.check_ns = int(check_interval * 1e9)
+        self.layout = None
+        self.checked_ns = None
+        self.transform = IDENTITY
+        self.rebuilds = 0
+
+    def refresh(self):
+        """Ask the backend for the layout now, rebuilding the transform if it changed"""
+        self.checked_ns = time.perf_counter_ns()
+        layout = self.backend.screens()
+        if layout != self.layout:
+            self.layout = layout
+            self.transform = affine(layout, self.screen)
+            self.rebuilds += 1
+
+    def to_desktop(self, u, v):
+        """Desktop position (0-1 each way) for pad position u, v"""
+        if self.checked_ns is None or time.perf_counter_ns() - self.checked_ns >= self.check_ns:
+            self.refresh()
+        u = min(max(u, 0.0), 1.0)
+        v = min(max(v, 0.0), 1.0)
+        a, b, c, d, e, f = self.transform
+        return a * u + b * v + c, d * u + e * v + f
@@ -0,0 +1,117 @@
+"""Smooth, high-resolution scrolling with momentum.
+
+Scroll deltas from the phone are converted to wheel units (WHEEL_DELTA is
+one notch) and summed as floats, so small two-finger movements add up
+instead of being truncated away. Whole units go out in one batch per tick,
+with both axes in a single backend call, and the fraction is carried over.
+
+When scrolling input stops while the fingers were still moving fast, the
+engine keeps scrolling on its own tick with exponentially decaying
+velocity, like a fling on a laptop touchpad. Any other input stops it.
+"""
+import math
+
+SCROLL_TICK = 1 / 120  # Seconds between wheel injections
+INERTIA_DELAY = 0.05  # Seconds without scroll input before momentum takes over
+INERTIA_TIME_CONSTANT = 0.325  # Seconds for momentum to fall to 1/e of its speed
+MIN_FLING_SPEED = 600.0  # Wheel units/sec needed to start momentum
+STOP_SPEED = 60.0  # Momentum ends below this
+VELOCITY_SMOOTHING = 0.4
+NEW_GESTURE_GAP = 0.1  # Seconds between deltas that start a new scroll gesture
+MAX_DELTA = 120 * 100  # Wheel units one delta may carry, a hundred notches
+
+
+class ScrollEngine:
+    def __init__(self, tick=SCROLL_TICK, inertia=True):
+        self.tick_ns = int(tick * 1e9)
+        self.inertia = inertia
+        self.pending_x = 0.0  # Wheel units not injected yet
+        self.pending_y = 0.0
+        self.velocity_x = 0.0  # Wheel units/sec
+        self.velocity_y = 0.0
+        self.coasting = False
+        self.last_input_ns = None
+        self.last_emit_ns = 0
+        self.last_coast_ns = None
+        self.first_event = None  # Oldest scroll event in pending, for tracing
+        self.inertial_units = 0  # Wheel units injected by momentum
+
+    def add(self, event, units_x, units_y, now_ns):
+        if not (math.isfinite(units_x) and math.isfinite(units_y)):
+            return  # Would poison pending for good
+        units_x = min(max(units_x, -MAX_DELTA), MAX_DELTA)
+        units_y = min(max(units_y, -MAX_DELTA), MAX_DELTA)
+        last = self.last_input_ns
+        if last is not None and 0 < now_ns - last <= NEW_GESTURE_GAP * 1e9:
+            dt = (now_ns - last) / 1e9
+            self.velocity_x += (units_x / dt - self.velocity_x) * VELOCITY_SMOOTHING
+            self.velocity_y += (units_y / dt - self.velocity_y) * VELOCITY_SMOOTHING
+        elif last is None or now_ns - last > NEW_GESTURE_GAP * 1e9:
+            self.velocity_x = self.velocity_y = 0.0
+        self.coasting = False
+        self.last_input_ns = now_ns
+        self.pending_x += units_x
+        self.pending_y += units_y
+        if self.first_event is None:
+            self.first_event = event
+
+    def stop(self):
+        """End any momentum, e.g. because the finger is back on the trackpad"""
+        self.coasting = False
+        self.velocity_x = self.velocity_y = 0.0
+
+    def _fling_ready(self):
+        return self.inertia and math.hypot(self.velocity_x, self.velocity_y) >= MIN_FLING_SPEED
+
+    def take(self, now_ns):
+        """Wheel units due by `now_ns` as (dx, dy, first scroll event in them or None)"""
+        if now_ns - self.last_emit_ns < self.tick_ns:
+            return 0, 0, None
+
+        if not self.coasting and self.last_input_ns is not None and \
+                now_ns - self.last_input_ns >= INERTIA_DELAY * 1e9:
+            if self._fling_ready():
+                self.coasting = True
+                self.last_coast_ns = self.last_input_ns + int(INERTIA_DELAY * 1e9)
+            else:
+                self.velocity_x = self.velocity_y = 0.0
+        if self.coasting:
+            # Distance covered by an exponentially decaying velocity since the last step
+            dt = (now_ns - self.last_coast_ns) / 1e9
+            decay = math.exp(-dt / INERTIA_TIME_CONSTANT)
+            self.pending_x += self.velocity_x * INERTIA_TIME_CONSTANT * (1 - decay)
+            self.pending_y += self.velocity_y * INERTIA_TIME_CONSTANT * (1 - decay)
+            self.velocity_x *= decay
+            self.velocity_y *= decay
+            self.last_coast_ns = now_ns
+            if math.hypot(self.velocity_x, self.velocity_y) < STOP_SPEED:
+                self.stop()
+
+        try:
+            dx = int(self.pending_x)
+            dy = int(self.pending_y)
+        except (ValueError, OverflowError):
+            # Not a number any more; start over rather than fail on every tick
+            self.pending_x = self.pending_y = 0.0
+            self.stop()
+            self.first_event = None
+            return 0, 0, None
+        if not dx and not dy:
+            return 0, 0, None
+        self.pending_x -= dx
+        self.pending_y -= dy
+        self.last_emit_ns = now_ns
+        first = self.first_event
+        self.first_event = None
+        if first is None:
+            self.inertial_units += abs(dx) + abs(dy)
+        return dx, dy, first
+
+    def time_until_due(self, now_ns):
+        """Seconds until take() may have something, None if it won't without new input"""
+        next_tick = max(0, self.last_emit_ns + self.tick_ns - now_ns)
+        if self.coasting or abs(self.pending_x) >= 1 or abs(self.pending_y) >= 1:
+            return next_tick / 1e9
+        if self.last_input_ns is not None and self._fling_ready():
+            return max(next_tick, self.last_input_ns + INERTIA_DELAY * 1e9 - now_ns) / 1e9
+        return None
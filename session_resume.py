@@ -0,0 +1,130 @@
+"""Keeps a phone's session alive across a dropped WebSocket.
+
+Wi-Fi hiccups, power saving and the phone locking its screen all break
+connections that would otherwise be fine. Each connection gets a token in
+a {type: 'session'} message; if the socket then closes without a clean
+close frame, its session (arbiter ownership, jitter buffer, sequence
+numbers) is held for RESUME_WINDOW seconds. A phone that reconnects with
+?session=<token> in time picks it back up, and learns the last sequence
+number the server applied so it can resend only what came after.
+Anything numbered at or below that is dropped as a duplicate, whichever
+socket it arrives on, so nothing in flight is lost or applied twice.
+
+Heartbeat replaces a fixed ping interval and pong timeout: pings are paced
+and dead peers declared from the connection's measured round trip time.
+"""
+import asyncio
+import secrets
+
+RESUME_WINDOW = 10.0  # Seconds a dropped session waits for its phone to come back
+
+MIN_PING_INTERVAL = 0.25
+MAX_PING_INTERVAL = 2.0
+PING_RTTS = 8  # Round trips between pings
+# Wi-Fi power saving can hold packets back for a second or more, don't
+# give up on a phone sooner than this
+MIN_DEAD_TIMEOUT = 2.0
+INITIAL_RTO = 1.0  # Seconds, until there's an RTT sample (as RFC 6298)
+
+
+class Heartbeat:
+    """Ping pacing and the dead-peer timeout for one connection.
+
+    RTT is smoothed as TCP does it (RFC 6298). Pings go out every
+    PING_RTTS round trips, between MIN_PING_INTERVAL and MAX_PING_INTERVAL,
+    and the peer counts as gone after two missed pings plus a
+    retransmission timeout, never sooner than MIN_DEAD_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.srtt = None  # Seconds
+        self.rttvar = None
+
+    def on_rtt(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def interval(self):
+        if self.srtt is None:
+            return MIN_PING_INTERVAL  # Get a first RTT sample soon
+        return min(max(self.srtt * PING_RTTS, MIN_PING_INTERVAL), MAX_PING_INTERVAL)
+
+    def timeout(self):
+        rto = INITIAL_RTO if self.srtt is None else self.srtt + 4 * self.rttvar
+        return max(MIN_DEAD_TIMEOUT, 2 * self.interval() + rto)
+
+
+class ResumableSession:
+    def __init__(self, session):
+        self.token = secrets.token_urlsafe(16)
+        self.session = session  # The arbiter's Session
+        self.last_seq = None  # Newest sequence number applied, from any socket
+        self.ws = None  # The socket currently carrying it, None while held
+        self.expiry = None  # TimerHandle while held
+
+    def fresh(self, events):
+        """`events` without the ones already applied, counting those as duplicates"""
+        last_seq = self.last_seq
+        if last_seq is None:
+            fresh = events
+        else:
+            fresh = [event for event in events if event.get('seq') is None or event['seq'] > last_seq]
+            if len(fresh) != len(events):
+                self.session.stats.duplicates += len(events) - len(fresh)
+        for event in fresh:
+            seq = event.get('seq')
+            if seq is not None and (self.last_seq is None or seq > self.last_seq):
+                self.last_seq = seq
+        return fresh
+
+
+class SessionStore:
+    def __init__(self, window=RESUME_WINDOW):
+        self.window = window
+        self.sessions = {}  # Token -> ResumableSession
+
+    def open(self, session, ws):
+        resumable = ResumableSession(session)
+        resumable.ws = ws
+        self.sessions[resumable.token] = resumable
+        return resumable
+
+    def resume(self, token):
+        """The session for `token`, None if it's unknown or has expired. The
+        caller sets its socket as `ws`; a socket that had it and hasn't been
+        noticed dead yet then leaves the session alone when it closes."""
+        resumable = self.sessions.get(token) if token else None
+        if resumable is not None and resumable.expiry is not None:
+            resumable.expiry.cancel()
+            resumable.expiry = None
+        return resumable
+
+    def detach(self, resumable, ws, on_expire, hold=True):
+        """`ws` is closing. Holds the session for a while, or ends it at once
+        if `hold` is False; either way on_expire() runs once it's over.
+        Does nothing if another socket has taken the session over."""
+        if resumable.ws is not ws:
+            return
+        resumable.ws = None
+        if not hold:
+            self.sessions.pop(resumable.token, None)
+            on_expire()
+            return
+
+        def expire():
+            resumable.expiry = None
+            if self.sessions.get(resumable.token) is resumable and resumable.ws is None:
+                del self.sessions[resumable.token]
+                on_expire()
+        resumable.expiry = asyncio.get_running_loop().call_later(self.window, expire)
+
+    def close(self):
+        """Forget every held session, for server shutdown"""
+        for resumable in self.sessions.values():
+            if resumable.expiry is not None:
+                resumable.expiry.cancel()
+        self.sessions.clear()
@@ -0,0 +1,66 @@
+"""Compact recordings of inbound WebSocket traffic.
+
+A trace file is the MAGIC header followed by one record per message:
+
+    u64 ns since the first message | u8 kind | u32 length | payload
+
+kind is KIND_TEXT (UTF-8 JSON) or KIND_BINARY (see protocol.py). Traces
+are written by the server when a trace directory is configured and read
+back by tools/replay_trace.py.
+"""
+import os
+import struct
+import time
+
+MAGIC = b'TPTRACE1'
+KIND_TEXT = 1
+KIND_BINARY = 2
+
+_RECORD = struct.Struct('<QBI')
+
+
+class TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._start = None
+        self.count = 0
+
+    def record(self, kind, data, now_ns=None):
+        if now_ns is None:
+            now_ns = time.perf_counter_ns()
+        if self._start is None:
+            self._start = now_ns
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._file.write(_RECORD.pack(now_ns - self._start, kind, len(data)))
+        self._file.write(data)
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+def open_session_trace(directory, peer):
+    """Start a new trace file in `directory` named after the time and peer"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"session-{time.strftime('%Y%m%d-%H%M%S')}-{peer or 'unknown'}.tptr"
+    return TraceWriter(os.path.join(directory, name.replace(':', '_')))
+
+
+def read_trace(path):
+    """Yield (ns since start, kind, payload) for every recorded message.
+
+    Text payloads are returned as str, binary ones as bytes.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a trace file')
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            t_ns, kind, length = _RECORD.unpack(header)
+            data = f.read(length)
+            yield t_ns, kind, data.decode('utf-8') if kind == KIND_TEXT else data
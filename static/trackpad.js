@@ -0,0 +1,809 @@
+let ws;
+let lastTouches = {};
+let touchStartTime = 0;
+let initialTouchPos = null;
+let isTapping = false;
+let threeFingerStartX = null;
+let zoomStartX = null;
+let lastZoomEvent = 0;
+let zoomThreshold = 100; // Minimum pixels to trigger zoom
+let twoFingerStartY = null;
+let lastTwoFingerY = null;
+let lastTwoFingerX = null;
+let threeFingerStartY = null;
+
+const twoFingerScrollSensitivity = 0.1;
+// Updated live by config messages from the server
+let mouseSensitivity = TRACKPAD_CONFIG.mouseSensitivity;
+let scrollSensitivity = TRACKPAD_CONFIG.scrollSensitivity;
+let touchFeedback = TRACKPAD_CONFIG.touchFeedback;
+// Motion is summed between sends, so pacing never loses any of it. The
+// interval backs off while the socket or the server is backed up and
+// creeps back down once they have caught up.
+const MIN_SEND_INTERVAL = 8;
+const MAX_SEND_INTERVAL = 50;
+const SERVER_BACKLOG_LIMIT = 8; // Events waiting on the server before we slow down
+let sendInterval = MIN_SEND_INTERVAL;
+let minSendInterval = MIN_SEND_INTERVAL; // Raised on slow links, from the server's RTT
+let lastSendTime = 0;
+let flushTimer = null;
+let pendingMove = null; // Accumulated {x, y, t} not sent yet
+let pendingScroll = null;
+let pendingPosition = null; // Newest tablet-mode position not sent yet
+let nextSeq = 0; // Every sent event is numbered
+// Session resumption, see session_resume.py: sent events are kept until the
+// server confirms it has applied them, and resent if the socket drops first
+const MAX_UNACKED = 200; // Below the server's per-phone burst, so a resend is never rate limited
+const RECONNECT_MIN = 4; // ms, doubling per failed attempt...
+const RECONNECT_MAX = 2000; // ...up to this
+let sessionToken = null;
+let unacked = []; // Sent events the server hasn't confirmed, oldest first
+let lostEvents = 0; // Clicks, keys and gestures dropped from a full unacked
+let reconnectDelay = RECONNECT_MIN;
+let lastHeard = 0; // performance.now() of the last message from the server
+let deadTimeout = 3000; // ms of silence before we give up on the socket, set by the server
+
+// Gesture settings
+const TAP_THRESHOLD = 150;
+const MOVE_THRESHOLD = 1;
+const THREE_FINGER_SWIPE_THRESHOLD = 50;
+const THREE_FINGER_VERTICAL_THRESHOLD = 50; // Minimum pixels for vertical three-finger gesture
+const ZOOM_COOLDOWN = 300; // Minimum ms between zoom events
+const TABLET_TAP_SLOP = 10; // Pixels a tablet-mode tap may wander and still click
+
+// Fullscreen handling
+const fullscreenBtn = document.getElementById('fullscreen-btn');
+fullscreenBtn.addEventListener('click', () => {
+    if (!document.fullscreenElement) {
+        document.documentElement.requestFullscreen();
+        fullscreenBtn.textContent = 'Exit Fullscreen';
+    } else {
+        document.exitFullscreen();
+        fullscreenBtn.textContent = 'Fullscreen';
+    }
+});
+
+document.addEventListener('fullscreenchange', () => {
+    fullscreenBtn.textContent = document.fullscreenElement ? 'Exit Fullscreen' : 'Fullscreen';
+});
+
+// Binary protocol, see protocol.py
+const OP_MOVE = 0x01;
+const OP_SCROLL = 0x02;
+const OP_CLICK = 0x03;
+const OP_ZOOM = 0x04;
+const OP_NEXT_WINDOW = 0x05;
+const OP_VERTICAL_GESTURE = 0x06;
+const OP_STAMP = 0x07;
+const OP_MOVE_ABS = 0x08;
+const OP_TEXT = 0x09;
+const OP_KEYS = 0x0A;
+const MAX_TEXT = 8192; // Characters per text event, as on the server
+const textEncoder = new TextEncoder();
+const POSITION_MAX = 0xffff;
+const STAMP_SIZE = 14;
+const BUTTONS = ['left', 'right', 'middle'];
+let binaryProtocol = false;
+
+const halfView = new DataView(new ArrayBuffer(4));
+function toHalf(value) {
+    // float32 -> IEEE float16 bits, rounded to nearest
+    halfView.setFloat32(0, Math.max(-65504, Math.min(65504, value)));
+    const bits = halfView.getUint32(0);
+    const sign = (bits >>> 16) & 0x8000;
+    const exp = ((bits >>> 23) & 0xff) - 112;
+    let mant = bits & 0x7fffff;
+    if (exp <= 0) {
+        if (exp < -10) return sign;
+        mant = (mant | 0x800000) >> (1 - exp);
+        return sign | ((mant + 0x1000) >> 13);
+    }
+    return sign | ((exp << 10) + ((mant + 0x1000) >> 13));
+}
+
+function encodeSamples(op, samples) {
+    const view = new DataView(new ArrayBuffer(2 + samples.length * 4));
+    view.setUint8(0, op);
+    view.setUint8(1, samples.length);
+    samples.forEach((sample, i) => {
+        view.setUint16(2 + i * 4, toHalf(sample[0]), true);
+        view.setUint16(4 + i * 4, toHalf(sample[1]), true);
+    });
+    return view.buffer;
+}
+
+function encodePosition(x, y) {
+    const view = new DataView(new ArrayBuffer(6));
+    view.setUint8(0, OP_MOVE_ABS);
+    view.setUint8(1, 1);
+    view.setUint16(2, Math.round(x * POSITION_MAX), true);
+    view.setUint16(4, Math.round(y * POSITION_MAX), true);
+    return view.buffer;
+}
+
+function encodeText(text) {
+    const bytes = textEncoder.encode(text);
+    const record = new Uint8Array(4 + bytes.length);
+    record[0] = OP_TEXT;
+    new DataView(record.buffer).setUint16(2, bytes.length, true);
+    record.set(bytes, 4);
+    return record.buffer;
+}
+
+function encodeKeys(keys) {
+    const names = keys.map(key => textEncoder.encode(key));
+    const record = new Uint8Array(2 + names.reduce((size, name) => size + 1 + name.length, 0));
+    record[0] = OP_KEYS;
+    record[1] = names.length;
+    let offset = 2;
+    for (const name of names) {
+        record[offset++] = name.length;
+        record.set(name, offset);
+        offset += name.length;
+    }
+    return record.buffer;
+}
+
+function encodeEvent(event) {
+    switch (event.type) {
+        case 'move': return encodeSamples(OP_MOVE, [[event.x, event.y]]);
+        case 'moveAbs': return encodePosition(event.x, event.y);
+        case 'scroll': return encodeSamples(OP_SCROLL, [[event.x, event.y]]);
+        case 'click': return new Uint8Array([OP_CLICK, 1, BUTTONS.indexOf(event.button)]).buffer;
+        case 'zoom': return new Uint8Array([OP_ZOOM, 1, event.scale > 1 ? 1 : 0]).buffer;
+        case 'nextWindow': return new Uint8Array([OP_NEXT_WINDOW, 0]).buffer;
+        case 'text': return encodeText(event.text);
+        case 'keys': return encodeKeys(event.keys);
+        case 'verticalGesture':
+            return new Uint8Array([OP_VERTICAL_GESTURE, 1, event.direction === 'down' ? 1 : 0]).buffer;
+    }
+}
+
+function sendEvents(events) {
+    for (const event of events) event.seq = nextSeq++;
+    unacked.push(...events);
+    if (unacked.length > MAX_UNACKED) trimUnacked();
+    // Without a socket they wait in unacked for the session to be resumed
+    if (ws?.readyState === WebSocket.OPEN) transmit(events);
+}
+
+function trimUnacked() {
+    // Motion goes first: losing some only shortens a movement, while a lost
+    // click or key press can't be made up for
+    let excess = unacked.length - MAX_UNACKED;
+    unacked = unacked.filter(event => {
+        if (excess > 0 && (event.type === 'move' || event.type === 'scroll' || event.type === 'moveAbs')) {
+            excess--;
+            return false;
+        }
+        return true;
+    });
+    if (excess > 0) {
+        // Every event is a whole click, key chord or gesture, so nothing is
+        // left pressed; the oldest are the least likely to still be wanted
+        unacked.splice(0, excess);
+        lostEvents += excess;
+        console.warn(`Offline too long, dropped ${excess} unconfirmed events (${lostEvents} so far)`);
+    }
+}
+
+function transmit(events) {
+    if (!binaryProtocol) {
+        for (const event of events) ws.send(JSON.stringify(event));
+        return;
+    }
+    // One frame: a STAMP record, which numbers the records after it, then the events
+    const bodies = events.map(event => new Uint8Array(encodeEvent(event)));
+    const frame = new Uint8Array(STAMP_SIZE + bodies.reduce((size, body) => size + body.length, 0));
+    const view = new DataView(frame.buffer);
+    view.setUint8(0, OP_STAMP);
+    view.setUint32(2, events[0].seq >>> 0, true);
+    view.setFloat64(6, events[0].t, true);
+    let offset = STAMP_SIZE;
+    for (const body of bodies) {
+        frame.set(body, offset);
+        offset += body.length;
+    }
+    ws.send(frame.buffer);
+}
+
+function acknowledge(seq) {
+    // Everything up to `seq` has been applied
+    if (seq == null) return;
+    let applied = 0;
+    while (applied < unacked.length && unacked[applied].seq <= seq) applied++;
+    unacked.splice(0, applied);
+}
+
+function handleMessage(msg) {
+    lastHeard = performance.now();
+    if (typeof msg.data !== 'string') return;
+    const data = JSON.parse(msg.data);
+    if (data.type === 'session') {
+        sessionToken = data.token;
+        if (data.resumed) {
+            // Whatever the server got before the drop has been applied, send the rest
+            acknowledge(data.seq);
+            if (unacked.length) transmit(unacked);
+        } else {
+            // A new session: what was queued for the old one is stale now
+            unacked = [];
+            takePendingMotion();
+        }
+        flushMotion(); // Motion from while we were away
+    } else if (data.type === 'ping') {
+        acknowledge(data.seq);
+        if (data.timeout) deadTimeout = data.timeout;
+        // Echo with our clock so the server can estimate the offset
+        ws.send(JSON.stringify({type: 'pong', t: data.t, c: performance.now()}));
+        // Slow links get fewer, larger frames
+        if (data.rtt != null) {
+            minSendInterval = Math.min(MAX_SEND_INTERVAL, Math.max(MIN_SEND_INTERVAL, data.rtt / 4));
+            sendInterval = Math.max(sendInterval, minSendInterval);
+        }
+        if (data.backlog > SERVER_BACKLOG_LIMIT) {
+            sendInterval = Math.min(MAX_SEND_INTERVAL, sendInterval * 2);
+        }
+    } else if (data.type === 'config') {
+        mouseSensitivity = data.mouseSensitivity;
+        scrollSensitivity = data.scrollSensitivity;
+        touchFeedback = data.touchFeedback;
+        if (!touchFeedback) hideTouchFeedback();
+        showViewButton(data.preview);
+        showKeyboardButton(data.typing);
+    }
+}
+
+function connectWebSocket() {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const resume = sessionToken ? `?session=${encodeURIComponent(sessionToken)}` : '';
+    const socket = ws = new WebSocket(`${protocol}//${window.location.host}/ws${resume}`,
+                                      ['trackpad.bin.v1', 'trackpad.json']);
+    ws.binaryType = 'arraybuffer';
+    ws.onopen = () => {
+        binaryProtocol = ws.protocol === 'trackpad.bin.v1';
+        reconnectDelay = RECONNECT_MIN;
+        lastHeard = performance.now();
+    };
+    ws.onmessage = handleMessage;
+    ws.onclose = () => {
+        if (ws !== socket) return;
+        // Quick retries get through a Wi-Fi blip, backing off spares a server that's gone.
+        // Random spread keeps several phones from retrying in lockstep.
+        setTimeout(connectWebSocket, reconnectDelay * (0.5 + Math.random() / 2));
+        reconnectDelay = Math.min(RECONNECT_MAX, reconnectDelay * 2);
+    };
+    if (ws.bufferedAmount === undefined) {
+        ws.bufferedAmount = 0;
+    }
+}
+
+// A socket whose peer vanished can take the browser minutes to notice.
+// The server pings well within deadTimeout, so silence that long means
+// the link is gone: abandon the socket and resume on a new one.
+setInterval(() => {
+    if (ws?.readyState !== WebSocket.OPEN || performance.now() - lastHeard < deadTimeout) return;
+    const dead = ws;
+    dead.onclose = dead.onmessage = null;
+    dead.close();
+    connectWebSocket();
+}, 250);
+
+connectWebSocket();
+
+function takePendingMotion() {
+    const events = [];
+    if (pendingPosition) events.push(pendingPosition);
+    if (pendingMove) events.push(pendingMove);
+    if (pendingScroll) events.push(pendingScroll);
+    pendingMove = pendingScroll = pendingPosition = null;
+    return events;
+}
+
+function flushMotion() {
+    flushTimer = null;
+    // Keep summing while disconnected, it goes out once the session is resumed
+    if (ws?.readyState !== WebSocket.OPEN) return;
+    if (ws.bufferedAmount > 0) {
+        // The last frame hasn't left yet: keep summing and try again later
+        sendInterval = Math.min(MAX_SEND_INTERVAL, sendInterval * 1.5);
+        flushTimer = setTimeout(flushMotion, sendInterval);
+        return;
+    }
+    const events = takePendingMotion();
+    if (events.length) {
+        sendEvents(events);
+        lastSendTime = performance.now();
+        sendInterval = Math.max(minSendInterval, sendInterval - 1);
+    }
+}
+
+function scheduleFlush() {
+    if (flushTimer === null) {
+        const wait = Math.max(0, lastSendTime + sendInterval - performance.now());
+        flushTimer = setTimeout(flushMotion, wait);
+    }
+}
+
+function accumulate(pending, event) {
+    if (!pending) return event;
+    pending.x += event.x;
+    pending.y += event.y;
+    pending.t = event.t; // Stamped with the newest touch it contains
+    return pending;
+}
+
+function queueEvent(event) {
+    event.t = performance.now();
+    if (event.type === 'move') {
+        pendingMove = accumulate(pendingMove, event);
+        scheduleFlush();
+        return;
+    }
+    if (event.type === 'scroll') {
+        pendingScroll = accumulate(pendingScroll, event);
+        scheduleFlush();
+        return;
+    }
+    if (event.type === 'moveAbs') {
+        pendingPosition = event; // Only where the finger is now matters
+        scheduleFlush();
+        return;
+    }
+    // Clicks and gestures go out at once, after the motion that came before them.
+    // While disconnected they wait in unacked for the session to be resumed.
+    if (flushTimer !== null) {
+        clearTimeout(flushTimer);
+        flushTimer = null;
+    }
+    sendEvents(takePendingMotion().concat([event]));
+    lastSendTime = event.t;
+}
+
+// Touch feedback comes from a fixed pool of dots that are only ever moved
+// with transform and faded with opacity, from one requestAnimationFrame
+// loop. Touch handlers just note the point, so they never touch the DOM.
+const FEEDBACK_POOL_SIZE = 12;
+const FEEDBACK_DURATION = 150; // ms to fade out
+const feedbackPool = [];
+const feedbackPoints = []; // x, y pairs noted since the last frame
+let nextFeedback = 0;
+let feedbackFrame = null;
+
+for (let i = 0; i < FEEDBACK_POOL_SIZE; i++) {
+    const element = document.createElement('div');
+    element.className = 'touch-feedback';
+    document.body.appendChild(element);
+    feedbackPool.push({element, shownAt: 0, visible: false});
+}
+
+function createTouchFeedback(x, y) {
+    if (!touchFeedback) return;
+    feedbackPoints.push(x, y);
+    if (feedbackFrame === null) {
+        feedbackFrame = requestAnimationFrame(drawTouchFeedback);
+    }
+}
+
+function drawTouchFeedback(now) {
+    feedbackFrame = null;
+    // Points older than the pool can show would be overwritten this frame anyway
+    const start = Math.max(0, feedbackPoints.length - FEEDBACK_POOL_SIZE * 2);
+    for (let i = start; i < feedbackPoints.length; i += 2) {
+        const dot = feedbackPool[nextFeedback];
+        nextFeedback = (nextFeedback + 1) % FEEDBACK_POOL_SIZE;
+        dot.element.style.transform = `translate3d(${feedbackPoints[i]}px, ${feedbackPoints[i + 1]}px, 0)`;
+        dot.shownAt = now;
+        dot.visible = true;
+    }
+    feedbackPoints.length = 0;
+
+    let fading = false;
+    for (const dot of feedbackPool) {
+        if (!dot.visible) continue;
+        const opacity = 1 - (now - dot.shownAt) / FEEDBACK_DURATION;
+        dot.visible = opacity > 0;
+        dot.element.style.opacity = dot.visible ? opacity : 0;
+        fading = fading || dot.visible;
+    }
+    if (fading) {
+        feedbackFrame = requestAnimationFrame(drawTouchFeedback);
+    }
+}
+
+function hideTouchFeedback() {
+    if (feedbackFrame !== null) {
+        cancelAnimationFrame(feedbackFrame);
+        feedbackFrame = null;
+    }
+    feedbackPoints.length = 0;
+    for (const dot of feedbackPool) {
+        dot.visible = false;
+        dot.element.style.opacity = 0;
+    }
+}
+
+// Tablet mode: the pad stands for the computer's screen, and a finger puts
+// the pointer at the matching spot instead of nudging it along
+let tabletMode = localStorage.getItem('tabletMode') === '1';
+let padRect = null; // Trackpad bounds, measured once per layout change
+
+function padPosition(touch) {
+    if (!padRect) padRect = trackpad.getBoundingClientRect();
+    return {
+        type: 'moveAbs',
+        x: Math.min(1, Math.max(0, (touch.clientX - padRect.left) / padRect.width)),
+        y: Math.min(1, Math.max(0, (touch.clientY - padRect.top) / padRect.height)),
+    };
+}
+
+const modeBtn = document.getElementById('mode-btn');
+function showMode() {
+    modeBtn.textContent = tabletMode ? 'Trackpad' : 'Tablet';
+}
+modeBtn.addEventListener('click', () => {
+    tabletMode = !tabletMode;
+    localStorage.setItem('tabletMode', tabletMode ? '1' : '0');
+    showMode();
+});
+showMode();
+window.addEventListener('resize', () => { padRect = null; });
+document.addEventListener('fullscreenchange', () => { padRect = null; });
+
+// Text and keys: a whole string goes out as one event and the computer
+// types it in bulk, so pasting a URL or password is instant
+const keyboardPanel = document.getElementById('keyboard');
+const keyboardBtn = document.getElementById('keyboard-btn');
+const textInput = document.getElementById('text-input');
+
+// The computer refuses text and keys unless typing is allowed there
+function showKeyboardButton(enabled) {
+    keyboardBtn.hidden = !enabled;
+    if (!enabled && !keyboardPanel.hidden) {
+        keyboardPanel.hidden = true;
+        padRect = null;
+    }
+}
+
+keyboardBtn.addEventListener('click', () => {
+    keyboardPanel.hidden = !keyboardPanel.hidden;
+    padRect = null; // The pad has changed size
+    if (!keyboardPanel.hidden) textInput.focus();
+});
+document.getElementById('text-form').addEventListener('submit', (e) => {
+    e.preventDefault();
+    // Split by code points, which is how the server counts
+    const chars = Array.from(textInput.value);
+    for (let i = 0; i < chars.length; i += MAX_TEXT) {
+        queueEvent({type: 'text', text: chars.slice(i, i + MAX_TEXT).join('')});
+    }
+    textInput.value = '';
+});
+for (const button of document.querySelectorAll('#key-row button')) {
+    button.addEventListener('click', () => queueEvent({type: 'keys', keys: button.dataset.keys.split('+')}));
+}
+showKeyboardButton(TRACKPAD_CONFIG.typing);
+
+// Screen preview: the computer streams the area around its pointer in
+// tiles and only sends the ones that changed, see preview.py. Each frame
+// is acknowledged once drawn, which is what paces the stream.
+const PREVIEW_HEADER_SIZE = 29;
+const PREVIEW_TILE_HEADER_SIZE = 8;
+const previewPanel = document.getElementById('preview');
+const previewCanvas = document.getElementById('preview-canvas');
+const previewContext = previewCanvas.getContext('2d');
+const viewBtn = document.getElementById('view-btn');
+// WebP is smaller; a browser that can encode it can decode it
+const previewFormat = previewCanvas.toDataURL('image/webp').startsWith('data:image/webp') ? 'webp' : 'jpeg';
+let previewWs = null;
+let previewTiles = new Map(); // (column << 16 | row) -> ImageBitmap, only tiles in view
+let previewDrawing = Promise.resolve(); // Frames are drawn one after another
+
+async function drawPreviewFrame(buffer) {
+    const view = new DataView(buffer);
+    const frame = view.getUint32(1, true);
+    const left = view.getInt32(5, true);
+    const top = view.getInt32(9, true);
+    const width = view.getUint16(13, true);
+    const height = view.getUint16(15, true);
+    const cursorX = view.getInt32(17, true) - left;
+    const cursorY = view.getInt32(21, true) - top;
+    const tile = view.getUint16(25, true);
+    const count = view.getUint16(27, true);
+    const decoding = [];
+    let offset = PREVIEW_HEADER_SIZE;
+    for (let i = 0; i < count; i++) {
+        const key = view.getUint16(offset, true) << 16 | view.getUint16(offset + 2, true);
+        const length = view.getUint32(offset + 4, true);
+        const image = new Blob([new Uint8Array(buffer, offset + PREVIEW_TILE_HEADER_SIZE, length)]);
+        decoding.push(createImageBitmap(image).then((bitmap) => [key, bitmap]));
+        offset += PREVIEW_TILE_HEADER_SIZE + length;
+    }
+    for (const [key, bitmap] of await Promise.all(decoding)) {
+        const old = previewTiles.get(key);
+        if (old) old.close();
+        previewTiles.set(key, bitmap);
+    }
+    // The server forgets tiles once they leave the view, so must we
+    const firstCol = Math.floor(left / tile), lastCol = Math.floor((left + width - 1) / tile);
+    const firstRow = Math.floor(top / tile), lastRow = Math.floor((top + height - 1) / tile);
+    if (previewCanvas.width !== width) previewCanvas.width = width;
+    if (previewCanvas.height !== height) previewCanvas.height = height;
+    for (const [key, bitmap] of previewTiles) {
+        const col = key >>> 16, row = key & 0xffff;
+        if (col < firstCol || col > lastCol || row < firstRow || row > lastRow) {
+            bitmap.close();
+            previewTiles.delete(key);
+        } else {
+            previewContext.drawImage(bitmap, col * tile - left, row * tile - top);
+        }
+    }
+    previewContext.beginPath();
+    previewContext.arc(cursorX, cursorY, 6, 0, 2 * Math.PI);
+    previewContext.fillStyle = 'rgba(255, 64, 64, 0.8)';
+    previewContext.fill();
+    return frame;
+}
+
+function showPreviewMessage(text) {
+    previewContext.fillStyle = 'black';
+    previewContext.fillRect(0, 0, previewCanvas.width, previewCanvas.height);
+    previewContext.fillStyle = 'white';
+    previewContext.font = '20px sans-serif';
+    previewContext.fillText(text, 10, 30);
+}
+
+function startPreview() {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = previewWs = new WebSocket(`${protocol}//${window.location.host}/preview?format=${previewFormat}`);
+    socket.binaryType = 'arraybuffer';
+    socket.onmessage = (msg) => {
+        if (typeof msg.data === 'string') {
+            const data = JSON.parse(msg.data);
+            if (data.type === 'error') showPreviewMessage(data.message);
+            return;
+        }
+        previewDrawing = previewDrawing
+            .then(() => drawPreviewFrame(msg.data))
+            .then((frame) => {
+                if (socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify({type: 'ack', frame}));
+            })
+            .catch(() => {}); // A tile that won't decode is sent again once it changes
+    };
+    socket.onclose = () => {
+        if (previewWs === socket) previewWs = null;
+        viewBtn.textContent = 'View';
+    };
+    showPreviewMessage('Connecting...');
+    previewPanel.hidden = false;
+    viewBtn.textContent = 'Hide';
+    padRect = null; // The pad has changed size
+}
+
+function stopPreview() {
+    if (previewWs) previewWs.close();
+    previewWs = null;
+    for (const bitmap of previewTiles.values()) bitmap.close();
+    previewTiles.clear();
+    previewPanel.hidden = true;
+    viewBtn.textContent = 'View';
+    padRect = null;
+}
+
+function showViewButton(enabled) {
+    viewBtn.hidden = !enabled;
+    if (!enabled) stopPreview();
+}
+
+viewBtn.addEventListener('click', () => {
+    if (previewWs) stopPreview();
+    else startPreview();
+});
+// No point streaming to a phone that's locked or showing another app
+document.addEventListener('visibilitychange', () => {
+    if (document.hidden && previewWs) stopPreview();
+});
+showViewButton(TRACKPAD_CONFIG.preview);
+
+function handleTrackpadTouch(e) {
+    const touches = Array.from(e.touches);
+    const numTouches = touches.length;
+
+    if (numTouches === 1 && tabletMode) {
+        const touch = touches[0];
+        if (initialTouchPos && Math.hypot(touch.clientX - initialTouchPos.x,
+                                          touch.clientY - initialTouchPos.y) > TABLET_TAP_SLOP) {
+            isTapping = false;
+        }
+        queueEvent(padPosition(touch));
+        createTouchFeedback(touch.clientX, touch.clientY);
+    }
+    else if (numTouches === 1) {
+        const touch = touches[0];
+        const touchId = touch.identifier;
+        const prevTouch = lastTouches[touchId];
+
+        if (prevTouch) {
+            const deltaX = (touch.clientX - prevTouch.clientX) * mouseSensitivity;
+            const deltaY = (touch.clientY - prevTouch.clientY) * mouseSensitivity;
+
+            if (Math.abs(deltaX) > 0 || Math.abs(deltaY) > 0) {
+                isTapping = false;
+                queueEvent({type: 'move', x: deltaX, y: deltaY});
+            }
+        }
+        lastTouches[touchId] = { clientX: touch.clientX, clientY: touch.clientY };
+        createTouchFeedback(touch.clientX, touch.clientY);
+    }
+    else if (numTouches === 2) {
+        // Handle two-finger scrolling
+        const touch1 = touches[0];
+        const touch2 = touches[1];
+        const currentY = (touch1.clientY + touch2.clientY) / 2;
+        const currentX = (touch1.clientX + touch2.clientX) / 2;
+
+        if (lastTwoFingerY !== null && lastTwoFingerX !== null) {
+            const deltaY = -1 * (currentY - lastTwoFingerY) * twoFingerScrollSensitivity;
+            const deltaX = (currentX - lastTwoFingerX) * twoFingerScrollSensitivity;
+            queueEvent({type: 'scroll', x: deltaX, y: deltaY});
+        }
+
+        lastTwoFingerY = currentY;
+        lastTwoFingerX = currentX;
+
+        // Create touch feedback for both fingers
+        createTouchFeedback(touch1.clientX, touch1.clientY);
+        createTouchFeedback(touch2.clientX, touch2.clientY);
+    }
+    else if (numTouches === 3) {
+        const touches = Array.from(e.touches);
+        if (!threeFingerStartX) {
+            threeFingerStartX = (touches[0].clientX + touches[1].clientX + touches[2].clientX) / 3;
+            threeFingerStartY = (touches[0].clientY + touches[1].clientY + touches[2].clientY) / 3;
+        } else {
+            const currentX = (touches[0].clientX + touches[1].clientX + touches[2].clientX) / 3;
+            const currentY = (touches[0].clientY + touches[1].clientY + touches[2].clientY) / 3;
+
+            // Calculate horizontal and vertical movement
+            const swipeDistanceX = currentX - threeFingerStartX;
+            const swipeDistanceY = currentY - threeFingerStartY;
+
+            // Check which direction had more movement
+            if (Math.abs(swipeDistanceX) > Math.abs(swipeDistanceY)) {
+                // Horizontal swipe
+                if (Math.abs(swipeDistanceX) > THREE_FINGER_SWIPE_THRESHOLD) {
+                    queueEvent({type: 'nextWindow'});
+                    threeFingerStartX = currentX;
+                    threeFingerStartY = currentY;
+                }
+            } else {
+                // Vertical swipe
+                if (Math.abs(swipeDistanceY) > THREE_FINGER_VERTICAL_THRESHOLD) {
+                    queueEvent({
+                        type: 'verticalGesture',
+                        direction: swipeDistanceY > 0 ? 'down' : 'up'
+                    });
+                    threeFingerStartX = currentX;
+                    threeFingerStartY = currentY;
+                }
+            }
+        }
+    }
+}
+
+function handleScrollbarTouch(e) {
+    const touch = e.touches[0];
+    const touchId = touch.identifier;
+    const prevTouch = lastTouches[touchId];
+
+    if (prevTouch) {
+        const deltaY = 10 * (touch.clientY - prevTouch.clientY) * scrollSensitivity;
+        queueEvent({type: 'scroll', x: 0, y: deltaY});
+    }
+    lastTouches[touchId] = { clientX: touch.clientX, clientY: touch.clientY };
+
+    const indicator = document.getElementById('scroll-indicator');
+    indicator.style.top = `${touch.clientY - indicator.offsetHeight/2}px`;
+    indicator.style.opacity = '1';
+}
+
+function handleZoombarTouch(e) {
+    const touch = e.touches[0];
+    const touchId = touch.identifier;
+
+    if (!zoomStartX) {
+        zoomStartX = touch.clientX;
+        return;
+    }
+
+    const now = Date.now();
+    const deltaX = touch.clientX - zoomStartX;
+
+    if (Math.abs(deltaX) >= zoomThreshold && now - lastZoomEvent >= ZOOM_COOLDOWN) {
+        queueEvent({
+            type: 'zoom',
+            scale: deltaX > 0 ? 1.1 : 0.9
+        });
+        zoomStartX = touch.clientX;
+        lastZoomEvent = now;
+    }
+
+    const indicator = document.getElementById('zoom-indicator');
+    indicator.style.left = `${touch.clientX - indicator.offsetWidth/2}px`;
+    indicator.style.opacity = '1';
+}
+
+const trackpad = document.getElementById('trackpad');
+const scrollbar = document.getElementById('scrollbar');
+const zoombar = document.getElementById('zoombar');
+
+// Trackpad events
+trackpad.addEventListener('touchstart', (e) => {
+    e.preventDefault();
+    touchStartTime = Date.now();
+    isTapping = true;
+    initialTouchPos = {
+        x: e.touches[0].clientX,
+        y: e.touches[0].clientY
+    };
+    if (tabletMode && e.touches.length === 1) {
+        queueEvent(padPosition(e.touches[0])); // A tap clicks where it lands
+    }
+});
+
+trackpad.addEventListener('touchmove', (e) => {
+    e.preventDefault();
+    handleTrackpadTouch(e);
+});
+
+trackpad.addEventListener('touchend', (e) => {
+    e.preventDefault();
+    if (e.touches.length === 0) {
+        if (isTapping && (Date.now() - touchStartTime) < TAP_THRESHOLD) {
+            queueEvent({type: 'click', button: 'left'});
+        }
+        threeFingerStartX = null;
+        threeFingerStartY = null;
+        lastTouches = {};
+        lastTwoFingerY = null;
+        lastTwoFingerX = null;
+    }
+    initialTouchPos = null;
+});
+
+// Scrollbar events
+scrollbar.addEventListener('touchstart', (e) => {
+    e.preventDefault();
+    handleScrollbarTouch(e);
+});
+
+scrollbar.addEventListener('touchmove', (e) => {
+    e.preventDefault();
+    handleScrollbarTouch(e);
+});
+
+scrollbar.addEventListener('touchend', (e) => {
+    e.preventDefault();
+    lastTouches = {};
+    document.getElementById('scroll-indicator').style.opacity = '0';
+});
+
+// Zoombar events
+zoombar.addEventListener('touchstart', (e) => {
+    e.preventDefault();
+    zoomStartX = e.touches[0].clientX;
+    handleZoombarTouch(e);
+});
+
+zoombar.addEventListener('touchmove', (e) => {
+    e.preventDefault();
+    handleZoombarTouch(e);
+});
+
+zoombar.addEventListener('touchend', (e) => {
+    e.preventDefault();
+    lastTouches = {};
+    zoomStartX = null;
+    document.getElementById('zoom-indicator').style.opacity = '0';
+});
+
@@ -0,0 +1,46 @@
+import pytest
+
+from arbiter import SessionArbiter
+from metrics import ConnectionStats
+
+S = 1_000_000_000
+
+
+def open_two(policy, **kwargs):
+    arbiter = SessionArbiter(policy, **kwargs)
+    return arbiter, arbiter.open(ConnectionStats('a')), arbiter.open(ConnectionStats('b'))
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        SessionArbiter('democracy')
+
+
+def test_exclusive_keeps_the_first_phone_until_it_leaves():
+    arbiter, a, b = open_two('exclusive')
+    assert arbiter.accept(a, 1, 0)
+    assert not arbiter.accept(b, 1, 10 * S)
+    assert b.stats.rejected == 1
+    arbiter.close(a)
+    assert arbiter.accept(b, 1, 11 * S)
+
+
+def test_last_touch_hands_over_on_a_new_touch():
+    arbiter, a, b = open_two('last-touch', handoff=0.25)
+    assert arbiter.accept(a, 1, 0)
+    assert arbiter.accept(b, 1, S // 10)  # b's first touch
+    assert not arbiter.accept(a, 1, S // 10 + 1)  # a is mid-stroke, b has it now
+    assert arbiter.accept(a, 1, S)  # a paused, then touched again
+
+
+def test_merge_accepts_everyone():
+    arbiter, a, b = open_two('merge')
+    assert arbiter.accept(a, 1, 0) and arbiter.accept(b, 1, 1) and arbiter.accept(a, 1, 2)
+
+
+def test_rate_limit():
+    arbiter, a, _ = open_two('merge', rate=10, burst=5)
+    assert arbiter.accept(a, 5, 0)
+    assert not arbiter.accept(a, 1, 0)
+    assert a.stats.rate_limited == 1
+    assert arbiter.accept(a, 1, S // 10)  # One token back after 100 ms
@@ -0,0 +1,40 @@
+from event_queue import CoalescingQueue
+
+
+def test_motion_behind_motion_is_summed():
+    queue = CoalescingQueue()
+    queue.extend([{'type': 'move', 'x': 1, 'y': 2}, {'type': 'move', 'x': 3, 'y': -1}])
+    assert queue.drain() == [{'type': 'move', 'x': 4, 'y': 1}]
+    assert queue.coalesced == 1
+
+
+def test_clicks_keep_their_place():
+    queue = CoalescingQueue()
+    queue.extend([
+        {'type': 'move', 'x': 1, 'y': 0},
+        {'type': 'click', 'button': 'left'},
+        {'type': 'move', 'x': 2, 'y': 0},
+        {'type': 'move', 'x': 3, 'y': 0},
+    ])
+    assert [event['type'] for event in queue.drain()] == ['move', 'click', 'move']
+
+
+def test_tablet_position_is_replaced():
+    queue = CoalescingQueue()
+    queue.extend([{'type': 'moveAbs', 'x': 0.1, 'y': 0.2}, {'type': 'moveAbs', 'x': 0.5, 'y': 0.6}])
+    assert queue.drain() == [{'type': 'moveAbs', 'x': 0.5, 'y': 0.6}]
+
+
+def test_pushed_events_are_not_modified():
+    first = {'type': 'scroll', 'x': 1, 'y': 1}
+    queue = CoalescingQueue()
+    queue.extend([first, {'type': 'scroll', 'x': 1, 'y': 1}])
+    assert first == {'type': 'scroll', 'x': 1, 'y': 1}
+
+
+def test_depth_is_tracked():
+    queue = CoalescingQueue()
+    queue.extend([{'type': 'click', 'button': 'left'}] * 3)
+    assert len(queue) == 3 and queue.max_depth == 3
+    queue.popleft()
+    assert len(queue) == 2 and queue.pushed == 3
@@ -0,0 +1,15 @@
+import pytest
+
+import import_budget
+
+
+@pytest.mark.parametrize('entry', sorted(import_budget.BUDGETS))
+def test_import_budget(entry):
+    times, error = import_budget.measure(entry, runs=3)
+    if times is None:
+        # Not a pass: the budget for this entry point hasn't been checked
+        pytest.xfail(f"{entry} can't be imported here: {error}")
+    total_ms, loaded, ok = import_budget.check(entry, times)
+    budget_ms = import_budget.BUDGETS[entry][0]
+    assert not loaded, f"{entry} loads {', '.join(loaded)}, which it must not need"
+    assert total_ms <= budget_ms, f"{entry} took {total_ms:.0f} ms to import, budget {budget_ms} ms"
@@ -0,0 +1,25 @@
+import pytest
+
+from input_backends import RecordingBackend, normalize_pixel
+
+
+@pytest.mark.parametrize('size', [1, 800, 1366, 1920, 5760, 65536])
+def test_normalized_pixels_map_back_exactly(size):
+    # Windows turns an absolute coordinate n back into pixel n * size // 65536
+    for pixel in range(size):
+        n = normalize_pixel(pixel, size)
+        assert 0 <= n <= 65535
+        assert n * size // 65536 == pixel
+
+
+def test_normalize_clamps_to_the_desktop():
+    assert normalize_pixel(-5, 1920) == normalize_pixel(0, 1920)
+    assert normalize_pixel(5000, 1920) == normalize_pixel(1919, 1920)
+
+
+def test_recording_backend_tracks_the_pointer():
+    backend = RecordingBackend()
+    backend.move_rel(3, -2)
+    backend.click('left')
+    assert (backend.x, backend.y) == (3, -2)
+    assert backend.events == [('move_rel', 3, -2), ('click', 'left')]
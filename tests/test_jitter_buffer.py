@@ -0,0 +1,54 @@
+import pytest
+
+from jitter_buffer import JitterBuffer
+
+MS = 1_000_000
+
+
+def move(x, sent_ms, arrival_ms):
+    return {'type': 'move', 'x': x, 'y': 0.0, 't': sent_ms, 'rx': int(arrival_ms * MS)}
+
+
+def test_steady_stream_plays_out_without_delay():
+    buffer = JitterBuffer()
+    for i in range(20):
+        buffer.push(move(1.0, i * 8, 100 + i * 8), (100 + i * 8) * MS)
+        assert buffer.release((100 + i * 8) * MS)[0] == 1.0
+    assert buffer.delay_ms == pytest.approx(0)
+
+
+def test_bursts_are_spread_out():
+    buffer = JitterBuffer()
+    for i in range(20):
+        buffer.push(move(1.0, i * 8, 100 + i * 8), (100 + i * 8) * MS)
+        buffer.release((100 + i * 8) * MS)
+    # Four samples bunched into one arrival
+    arrival = 100 + 20 * 8 + 24
+    for i in range(20, 24):
+        buffer.push(move(1.0, i * 8, arrival), arrival * MS)
+    assert buffer.jitter_ms > 0
+    assert buffer.release(arrival * MS)[0] < 4.0
+    assert buffer.time_until_due(arrival * MS) is not None
+
+
+def test_total_movement_is_unchanged_by_prediction():
+    buffer = JitterBuffer()
+    total = 0.0
+    now = 0
+    for i in range(10):
+        now = 100 + i * 8
+        buffer.push(move(2.0, i * 8, now), now * MS)
+        total += buffer.release(now * MS)[0]
+    # The stream stops: prediction runs on, then gives back what it overshot
+    for step in range(1, 20):
+        total += buffer.release((now + step * 8) * MS)[0]
+    total += buffer.flush()[0]
+    assert total == pytest.approx(20.0)
+
+
+def test_flush_releases_everything():
+    buffer = JitterBuffer()
+    buffer.push(move(3.0, 0, 50), 0)
+    dx, dy, first = buffer.flush()
+    assert dx == 3.0 and first['x'] == 3.0
+    assert not buffer
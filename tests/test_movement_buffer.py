@@ -0,0 +1,42 @@
+import pytest
+
+import mobile_trackpad
+from mobile_trackpad import MovementBuffer, build_accel_lut
+
+FLAT = ((0.0, 1.0), (10.0, 1.0))  # No acceleration
+
+
+def flush(buffer, x, y):
+    buffer.add_movement(x, y)
+    return buffer.get_smooth_movement(force=True)
+
+
+def test_fractions_add_up():
+    buffer = MovementBuffer(interval=0, curve=FLAT)
+    total = [0, 0]
+    for _ in range(8):
+        x, y = flush(buffer, 0.5, -0.375)
+        total[0] += x
+        total[1] += y
+    assert total == [4, -3]
+
+
+def test_movement_under_the_threshold_is_carried():
+    assert 0.05 < mobile_trackpad.MOVEMENT_THRESHOLD
+    buffer = MovementBuffer(interval=0, curve=FLAT)
+    total = sum(flush(buffer, 0.05, 0)[0] for _ in range(100))
+    assert total == 5
+
+
+def test_nothing_is_emitted_before_the_interval():
+    buffer = MovementBuffer(interval=60, curve=FLAT)
+    buffer.add_movement(5, 5)
+    assert buffer.get_smooth_movement() == (0, 0)
+    assert buffer.time_until_due() > 0
+    assert buffer.get_smooth_movement(force=True) == (5, 5)
+    assert buffer.time_until_due() is None
+
+
+def test_accel_lut_interpolates():
+    lut = build_accel_lut(((0.0, 1.0), (1.0, 2.0)), step=0.5, size=4)
+    assert lut == pytest.approx((1.0, 1.5, 2.0, 2.0))
@@ -0,0 +1,85 @@
+from multiprocessing import shared_memory
+
+import pytest
+
+import process_injector as pi
+
+
+@pytest.mark.parametrize('op, args', [
+    ('move_rel', (3, -4)),
+    ('move_abs', (0.25, 0.75)),
+    ('click', ('left',)),
+    ('hotkey', ('ctrl', 'shift', 'esc')),
+    ('type_text', ('héllo 😀' * 50,)),
+])
+def test_args_round_trip(op, args):
+    code, payload = pi.encode_args(op, args)
+    # Payloads arrive padded to the end of their last slot
+    assert pi.decode_args(code, payload + bytes(pi.SLOT_SIZE)) == (op, args)
+
+
+def test_unknown_op():
+    with pytest.raises(ValueError):
+        pi.encode_args('explode', ())
+
+
+def test_sequence_order_wraps_around():
+    assert pi._not_after(5, 5) and pi._not_after(4, 5) and not pi._not_after(6, 5)
+    assert pi._not_after(0xFFFFFFFF, 2) and not pi._not_after(2, 0xFFFFFFFF)
+
+
+@pytest.fixture
+def rings():
+    shm = shared_memory.SharedMemory(create=True, size=pi._block_size(8, 4))
+    shm.buf[:] = bytes(shm.size)
+    rings = pi.SharedRings(shm, 8, 4)
+    yield rings
+    del rings
+    shm.close()
+    shm.unlink()
+
+
+def test_ring_carries_long_requests_over_several_slots(rings):
+    code, payload = pi.encode_args('type_text', ('x' * 150,))
+    assert rings.put(1, code, pi.TRACED, payload)
+    assert rings.get(pi._HEAD) == 3  # 158 payload bytes: 56 in the first slot, then two more
+    code, payload = pi.encode_args('click', ('left',))
+    assert rings.put(2, code, 0, payload)
+    seq, got_code, flags, got = rings.take()
+    assert (seq, flags, pi.decode_args(got_code, got)) == (1, pi.TRACED, ('type_text', ('x' * 150,)))
+    assert rings.take()[0] == 2
+    assert rings.take() is None
+    assert rings.get(pi._LAST_SEQ) == 2
+
+
+def test_full_ring_refuses(rings):
+    code, payload = pi.encode_args('move_rel', (1, 1))
+    assert all(rings.put(seq, code, 0, payload) for seq in range(8))
+    assert not rings.put(9, code, 0, payload)
+    rings.take()
+    assert rings.put(9, code, 0, payload)
+
+
+def test_traces_without_a_completion_are_dropped(rings):
+    injector = pi.ProcessInjector()
+    injector.rings = rings
+    done = []
+    for seq in (1, 2, 3):
+        injector._traces.append((seq, done.append))
+    rings.put_done(3, 300)  # 1 and 2 failed, or their completions were lost
+    injector._report_done()
+    assert done == [300]
+    assert not injector._traces
+
+
+def test_restart_forgets_what_the_dead_worker_took(rings):
+    injector = pi.ProcessInjector()
+    injector.rings = rings
+    code, payload = pi.encode_args('move_rel', (1, 1))
+    for seq in (1, 2, 3):
+        injector._traces.append((seq, None))
+        rings.put(seq, code, pi.TRACED, payload)
+    rings.take()
+    rings.take()  # The worker dies running 2
+    injector._forget_taken()
+    assert [seq for seq, _ in injector._traces] == [3]
@@ -0,0 +1,103 @@
+import json
+import struct
+
+import pytest
+
+import protocol
+
+EVENTS = [
+    {'type': 'move', 'x': 1.5, 'y': -2.0},
+    {'type': 'scroll', 'x': 0.0, 'y': 3.25},
+    {'type': 'moveAbs', 'x': 0.0, 'y': 1.0},
+    {'type': 'click', 'button': 'right'},
+    {'type': 'zoom', 'scale': 1.1},
+    {'type': 'nextWindow'},
+    {'type': 'verticalGesture', 'direction': 'down'},
+    {'type': 'text', 'text': 'héllo 😀'},
+    {'type': 'keys', 'keys': ['ctrl', 'c']},
+]
+
+
+@pytest.mark.parametrize('event', EVENTS, ids=lambda event: event['type'])
+def test_binary_round_trip(event):
+    assert protocol.decode_binary(protocol.encode_event(event)) == [event]
+
+
+def test_stamp_numbers_the_events_after_it():
+    frame = (protocol.encode_stamp(7, 123.5) + protocol.encode_event({'type': 'click', 'button': 'left'})
+             + protocol.encode_samples(protocol.OP_MOVE, [(1, 1), (2, 2)]))
+    events = protocol.decode_binary(frame)
+    assert [event['seq'] for event in events] == [7, 8, 9]
+    assert all(event['t'] == 123.5 for event in events)
+
+
+def test_samples_split_into_records_of_max_samples():
+    samples = [(1, -1)] * (protocol.MAX_SAMPLES + 3)
+    events = protocol.decode_binary(protocol.encode_samples(protocol.OP_MOVE, samples))
+    assert len(events) == len(samples)
+
+
+@pytest.mark.parametrize('frame', [
+    bytes((protocol.OP_MOVE, 2)) + struct.pack('<ee', 1, 1),  # Truncated
+    bytes((0x7F, 1, 0)),  # Unknown opcode
+    bytes((protocol.OP_CLICK, 1, 9)),  # No such button
+    bytes((protocol.OP_TEXT, 0)) + struct.pack('<H', 2) + b'\xff\xfe',  # Not UTF-8
+    bytes((protocol.OP_MOVE, 1)) + struct.pack('<HH', 0x7E00, 0),  # NaN
+    bytes((protocol.OP_SCROLL, 1)) + struct.pack('<HH', 0, 0x7C00),  # Infinity
+    protocol.encode_stamp(1, float('nan')) + bytes((protocol.OP_NEXT_WINDOW, 0)),
+])
+def test_malformed_binary_is_a_protocol_error(frame):
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_binary(frame)
+
+
+def test_json_events_decode():
+    for event in EVENTS:
+        assert protocol.decode_json(json.dumps(event)) == [event]
+    stamped = {'type': 'move', 'x': 1, 'y': 2, 'seq': 3, 't': 4.5}
+    assert protocol.decode_json(json.dumps(stamped)) == [stamped]
+
+
+def test_unknown_json_types_are_left_to_the_dispatcher():
+    assert protocol.decode_json('{"type": "someday"}') == [{'type': 'someday'}]
+
+
+@pytest.mark.parametrize('text', [
+    '[]',
+    '{"x": 1}',
+    '{"type": 5}',
+    '{"type": "move", "x": "5", "y": 1}',
+    '{"type": "move", "x": 1}',
+    '{"type": "move", "x": true, "y": 0}',
+    '{"type": "move", "x": NaN, "y": 0}',
+    '{"type": "scroll", "x": 0, "y": 1e308}',
+    '{"type": "zoom", "scale": Infinity}',
+    '{"type": "click", "button": "back"}',
+    '{"type": "verticalGesture", "direction": "sideways"}',
+    '{"type": "text", "text": 5}',
+    '{"type": "keys", "keys": []}',
+    '{"type": "keys", "keys": ["ctrl", 1]}',
+    '{"type": "pong", "t": 1}',
+    '{"type": "click", "button": "left", "seq": "3"}',
+    '{"type": "click", "button": "left", "seq": -1}',
+    '{"type": "click", "button": "left", "t": "now"}',
+])
+def test_invalid_json_is_a_protocol_error(text):
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_json(text)
+
+
+def test_datagram_round_trip_and_authentication():
+    channel, key = b'\x01' * 8, b'k' * 32
+    body = protocol.encode_event({'type': 'move', 'x': 1.0, 'y': 2.0, 'seq': 5, 't': 1.0})
+    data = protocol.encode_datagram(channel, key, 42, body)
+    assert protocol.datagram_channel(data) == channel
+    seq, events = protocol.decode_datagram(data, key)
+    assert seq == 42
+    # Datagrams are sequenced by their header, not by the STAMP inside
+    assert events == [{'type': 'move', 'x': 1.0, 'y': 2.0, 't': 1.0}]
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_datagram(data, b'x' * 32)
+    click = protocol.encode_datagram(channel, key, 43, protocol.encode_event({'type': 'click', 'button': 'left'}))
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode_datagram(click, key)  # Clicks need guaranteed delivery
@@ -0,0 +1,59 @@
+import math
+
+from scroll_engine import MAX_DELTA, ScrollEngine
+
+MS = 1_000_000
+
+
+def test_fractions_are_carried_between_ticks():
+    engine = ScrollEngine(inertia=False)
+    engine.add('first', 0, 0.6, 0)
+    assert engine.take(20 * MS) == (0, 0, None)
+    engine.add('second', 0, 0.6, 200 * MS)
+    assert engine.take(220 * MS) == (0, 1, 'first')
+    assert math.isclose(engine.pending_y, 0.2)
+
+
+def test_output_is_paced_to_the_tick():
+    engine = ScrollEngine(inertia=False)
+    engine.add(None, 0, 240, 100 * MS)
+    assert engine.take(100 * MS)[1] == 240
+    engine.add(None, 0, 240, 101 * MS)
+    assert engine.take(102 * MS) == (0, 0, None)  # Less than a tick since the last one
+    assert engine.take(120 * MS)[1] == 240
+
+
+def test_fast_swipe_keeps_scrolling():
+    engine = ScrollEngine()
+    for i in range(5):
+        engine.add(None, 0, 120, i * 10 * MS)
+    now = 40 * MS
+    total = 0
+    while now < 2000 * MS:
+        now += 10 * MS
+        total += engine.take(now)[1]
+    assert total > 600  # Momentum past the 600 units that were scrolled
+    assert engine.inertial_units > 0
+    assert not engine.coasting
+
+
+def test_non_finite_deltas_are_dropped():
+    engine = ScrollEngine(inertia=False)
+    engine.add(None, float('nan'), 0, 0)
+    engine.add(None, 0, float('-inf'), 1 * MS)
+    assert engine.pending_x == 0 and engine.pending_y == 0
+    assert engine.time_until_due(2 * MS) is None
+
+
+def test_huge_deltas_are_clamped():
+    engine = ScrollEngine(inertia=False)
+    engine.add(None, 0, 1e308, 0)
+    assert engine.take(20 * MS)[1] == MAX_DELTA
+
+
+def test_a_poisoned_engine_recovers():
+    engine = ScrollEngine(inertia=False)
+    engine.pending_y = float('inf')
+    assert engine.take(20 * MS) == (0, 0, None)
+    engine.add(None, 0, 120, 100 * MS)
+    assert engine.take(200 * MS)[1] == 120
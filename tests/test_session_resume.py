@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+import session_resume
+from arbiter import SessionArbiter
+from metrics import ConnectionStats
+
+
+def test_heartbeat_paces_from_rtt():
+    heartbeat = session_resume.Heartbeat()
+    assert heartbeat.interval() == session_resume.MIN_PING_INTERVAL
+    for _ in range(20):
+        heartbeat.on_rtt(0.005)
+    assert heartbeat.interval() == session_resume.MIN_PING_INTERVAL
+    assert heartbeat.timeout() == session_resume.MIN_DEAD_TIMEOUT
+    for _ in range(50):
+        heartbeat.on_rtt(0.3)
+    assert heartbeat.interval() == session_resume.MAX_PING_INTERVAL
+    assert heartbeat.timeout() > 2 * session_resume.MAX_PING_INTERVAL
+
+
+def test_resent_events_are_dropped_as_duplicates():
+    resumable = session_resume.ResumableSession(SessionArbiter().open(ConnectionStats('a')))
+    events = [{'type': 'click', 'seq': seq} for seq in (1, 2, 3)]
+    assert resumable.fresh(events) == events
+    resent = [{'type': 'click', 'seq': seq} for seq in (2, 3, 4)]
+    assert resumable.fresh(resent) == [{'type': 'click', 'seq': 4}]
+    assert resumable.last_seq == 4
+    assert resumable.session.stats.duplicates == 2
+
+
+def test_held_session_can_be_resumed_then_expires():
+    async def run():
+        store = session_resume.SessionStore(window=0.05)
+        expired = []
+        resumable = store.open('session', 'ws1')
+        store.detach(resumable, 'ws1', lambda: expired.append(1))
+        assert store.resume(resumable.token) is resumable
+        resumable.ws = 'ws2'
+        await asyncio.sleep(0.1)
+        assert not expired  # Resumed, so its expiry was cancelled
+        store.detach(resumable, 'ws1', lambda: expired.append(1))  # The old socket, ignored
+        assert resumable.ws == 'ws2'
+        store.detach(resumable, 'ws2', lambda: expired.append(1))
+        await asyncio.sleep(0.1)
+        assert expired == [1]
+        assert store.resume(resumable.token) is None
+    asyncio.run(run())
+
+
+def test_goodbye_ends_the_session_at_once():
+    store = session_resume.SessionStore()
+    expired = []
+    resumable = store.open('session', 'ws')
+    store.detach(resumable, 'ws', lambda: expired.append(1), hold=False)
+    assert expired == [1]
+    assert store.resume(resumable.token) is None
+    assert store.resume(None) is None
@@ -0,0 +1,20 @@
+import pytest
+
+from web_assets import Asset, _accepted_encodings
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, br', {'gzip', 'br'}),
+    ('gzip;q=0, br', {'br'}),
+    ('GZIP ; Q=0.5', {'gzip'}),
+    ('br;x=1;q=0, gzip', {'gzip'}),
+    ('gzip;q=abc', {'gzip'}),  # Malformed quality counts as accepted
+    ('gzip;q=0;x=1', set()),
+])
+def test_accepted_encodings(header, expected):
+    assert _accepted_encodings(header) == expected
+
+
+def test_asset_keeps_only_smaller_encodings():
+    assert 'gzip' in Asset('x' * 1000, 'text/plain', 'no-cache').encodings
+    assert 'gzip' not in Asset('x', 'text/plain', 'no-cache').encodings
@@ -0,0 +1,58 @@
+"""Compare the JSON and binary decode paths of the /ws protocol.
+
+    python tools/bench_protocol.py [--events N]
+
+Reports wire bytes and server decode cost per event for JSON text frames,
+single-sample binary frames and multi-sample binary frames.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import protocol
+
+
+def make_moves(count):
+    rng = random.Random(1)
+    return [{'type': 'move', 'x': rng.uniform(-40, 40), 'y': rng.uniform(-40, 40)}
+            for _ in range(count)]
+
+
+def bench(name, frames, decode, events, repeat):
+    wire = sum(len(frame) for frame in frames)
+
+    def run():
+        for frame in frames:
+            decode(frame)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    print(f"{name:<22} {wire / events:8.1f} B/event {best / events * 1e9:10.0f} ns/event")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch', type=int, default=8, help='samples per multi-sample frame')
+    args = parser.parse_args()
+
+    moves = make_moves(args.events)
+    json_frames = [json.dumps(event) for event in moves]
+    binary_frames = [protocol.encode_event(event) for event in moves]
+    samples = [(event['x'], event['y']) for event in moves]
+    batched_frames = [protocol.encode_samples(protocol.OP_MOVE, samples[i:i + args.batch])
+                      for i in range(0, len(samples), args.batch)]
+
+    print(f"{args.events} move events, best of {args.repeat}")
+    bench('json', json_frames, protocol.decode_json, args.events, args.repeat)
+    bench('binary', binary_frames, protocol.decode_binary, args.events, args.repeat)
+    bench(f'binary x{args.batch}', batched_frames, protocol.decode_binary, args.events, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Measure how fast text sent from the phone gets typed.
+
+    python tools/bench_text.py [--chars N] [--backend recording]
+
+Reports characters per second for:
+
+- the server path: a binary text frame decoded, dispatched and typed by
+  the injector thread, as when the phone sends it
+- InputBackend.type_text() on the whole string, the bulk path
+- type_text() once per character, what typing key by key costs
+
+With the default recording backend only the server's own overhead is
+measured. With a real backend (windows, uinput or xtest) the text really
+is typed, into whatever window has focus, after a countdown.
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import protocol
+from arbiter import SessionArbiter
+from input_backends import Injector, get_backend
+from metrics import ConnectionStats
+import mobile_trackpad
+
+
+def make_text(count):
+    rng = random.Random(1)
+    alphabet = string.ascii_letters + string.digits + ' .,:/-_?=&@'
+    return ''.join(rng.choice(alphabet) for _ in range(count))
+
+
+def report(name, chars, seconds):
+    print(f"{name:<28} {chars / seconds:14,.0f} chars/s  ({seconds * 1000:.1f} ms)")
+
+
+async def through_server(backend, text):
+    """Seconds from receiving the frames to the injector having typed all of them"""
+    frames = [protocol.encode_event({'type': 'text', 'text': text[i:i + protocol.MAX_TEXT]})
+              for i in range(0, len(text), protocol.MAX_TEXT)]
+    pipeline = mobile_trackpad.InputPipeline(Injector(backend), SessionArbiter('merge'))
+    pipeline.start()
+    stats = ConnectionStats('bench')
+    session = pipeline.open_session(stats)
+    start = time.perf_counter()
+    for frame in frames:
+        now = time.perf_counter_ns()
+        events = protocol.decode_binary(frame)
+        for event in events:
+            stats.on_received(event, now)
+        pipeline.submit(session, events, now)
+    while stats.injected < len(frames):
+        await asyncio.sleep(0.0005)
+    elapsed = time.perf_counter() - start
+    await pipeline.stop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chars', type=int, default=20000)
+    parser.add_argument('--backend', default='recording', help='recording, windows, uinput or xtest')
+    args = parser.parse_args()
+
+    text = make_text(args.chars)
+    if args.backend != 'recording':
+        print(f"Typing {args.chars} characters three times into the focused window", end='', flush=True)
+        for _ in range(3):
+            time.sleep(1)
+            print('.', end='', flush=True)
+        print()
+
+    report('server path', len(text), asyncio.run(through_server(get_backend(args.backend), text)))
+
+    backend = get_backend(args.backend)
+    start = time.perf_counter()
+    backend.type_text(text)
+    report('type_text, whole string', len(text), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for char in text:
+        backend.type_text(char)
+    report('type_text, per character', len(text), time.perf_counter() - start)
+    backend.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Check how long the entry points take to import.
+
+    python tools/import_budget.py [--runs 3] [--top 10] [--allow-missing]
+
+Imports each entry point in a fresh interpreter with -X importtime and
+prints the slowest modules. Exits with status 1 if an entry point goes
+over its budget, loads a module it must not need, or can't be imported
+at all, so it can gate CI. --allow-missing lets entry points whose own
+dependencies aren't installed pass as skipped. tests/test_import_budget.py
+runs the same checks under pytest.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> (budget in ms for the whole import, modules it must not load)
+BUDGETS = {
+    # Headless server, python -m mobile_trackpad
+    'mobile_trackpad': (1000, ('PyQt6', 'PIL', 'qrcode')),
+    # The GUI has to show its window before the server or QR code are needed
+    'trackpad_gui': (1500, ('aiohttp', 'PIL', 'qrcode')),
+}
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| *(\S+)')
+
+
+def import_times(module):
+    """({module: (self us, cumulative us)}, None) for a fresh import of `module`,
+    or (None, the error) if it fails"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    times = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            times[match.group(3)] = (int(match.group(1)), int(match.group(2)))
+    return times, None
+
+
+def measure(entry, runs=3):
+    """(fastest import_times() of `runs`, None), or (None, the error)"""
+    best = None
+    for _ in range(runs):
+        times, error = import_times(entry)
+        if times is None:
+            return None, error
+        if best is None or times[entry][1] < best[entry][1]:
+            best = times
+    return best, None
+
+
+def check(entry, times):
+    """(total ms, forbidden modules it loaded, whether it's within budget)"""
+    budget_ms, forbidden = BUDGETS[entry]
+    total_ms = times[entry][1] / 1000
+    loaded = sorted({name.split('.')[0] for name in times} & set(forbidden))
+    return total_ms, loaded, total_ms <= budget_ms and not loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='imports per entry point, the fastest counts')
+    parser.add_argument('--top', type=int, default=10, help='slowest modules to list')
+    parser.add_argument('--allow-missing', action='store_true',
+                        help="pass entry points that can't be imported here instead of failing")
+    args = parser.parse_args()
+
+    failed = False
+    for entry, (budget_ms, forbidden) in BUDGETS.items():
+        best, error = measure(entry, args.runs)
+        if best is None:
+            failed = failed or not args.allow_missing
+            print(f"{entry}: {'skipped' if args.allow_missing else 'FAILED, not measured'} ({error})\n")
+            continue
+
+        total_ms, loaded, ok = check(entry, best)
+        failed = failed or not ok
+        print(f"{entry}: {total_ms:.0f} ms of {budget_ms} ms budget, {'ok' if ok else 'FAILED'}")
+        if loaded:
+            print(f"  loads {', '.join(loaded)}, which it must not need")
+        for name, (own, _) in sorted(best.items(), key=lambda item: -item[1][0])[:args.top]:
+            print(f"  {own / 1000:8.1f} ms  {name}")
+        print()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
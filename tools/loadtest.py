@@ -0,0 +1,119 @@
+"""Load test the shared input pipeline with many simulated phones.
+
+    python tools/loadtest.py [--clients 1,10,50,100] [--rate 60] [--duration 5]
+
+Starts the server in a child process with the recording backend, then for
+each client count opens that many WebSocket connections sending stamped
+binary move frames at --rate Hz. Server CPU comes from /metrics cpu_s and
+latency from each connection's receive -> injected histogram.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+
+import protocol
+
+
+def serve(port, policy):
+    from aiohttp import web
+
+    import mobile_trackpad
+    from input_backends import RecordingBackend
+
+    mobile_trackpad.CLIENT_RATE_LIMIT = None
+    app = mobile_trackpad.make_app(RecordingBackend(), policy=policy)
+    web.run_app(app, host='127.0.0.1', port=port, print=None)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def client(session, url, rate, stop):
+    async with session.ws_connect(url, protocols=(protocol.SUBPROTOCOL,)) as ws:
+        seq = 0
+        period = 1 / rate
+        next_send = time.perf_counter()
+        while not stop.is_set():
+            event = {'type': 'move', 'x': 2.5, 'y': -1.5, 'seq': seq, 't': time.perf_counter() * 1000}
+            await ws.send_bytes(protocol.encode_event(event))
+            seq += 1
+            next_send += period
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+
+
+async def run_level(base, count, rate, duration):
+    # The default connector caps a session at 100 connections
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(client(session, base + '/ws', rate, stop)) for _ in range(count)]
+        await asyncio.sleep(0.5)  # Let everyone connect
+        before = await (await session.get(base + '/metrics')).json()
+        start = time.perf_counter()
+        await asyncio.sleep(duration)
+        after = await (await session.get(base + '/metrics')).json()
+        wall = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = [c['latency_ms']['server'] for c in after['connections'] if c['latency_ms']['server']['count']]
+    received = sum(c['received'] for c in after['connections']) - sum(c['received'] for c in before['connections'])
+    return {
+        'cpu': (after['cpu_s'] - before['cpu_s']) / wall * 100,
+        'events_per_sec': received / wall,
+        'p50': statistics.median(l['p50'] for l in latencies) if latencies else None,
+        'p99': max(l['p99'] for l in latencies) if latencies else None,
+    }
+
+
+async def main_async(args, base):
+    # Wait for the server process to come up
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                await session.get(base + '/metrics')
+                break
+            except aiohttp.ClientConnectionError:
+                await asyncio.sleep(0.1)
+
+    print(f"policy {args.policy}, {args.rate} Hz per client, {args.duration} s per level")
+    print(f"{'clients':>8} {'events/s':>10} {'server cpu':>11} {'p50 ms':>8} {'p99 ms':>8}")
+    for count in args.clients:
+        result = await run_level(base, count, args.rate, args.duration)
+        p50 = '-' if result['p50'] is None else f"{result['p50']:.3f}"
+        p99 = '-' if result['p99'] is None else f"{result['p99']:.3f}"
+        print(f"{count:>8} {result['events_per_sec']:>10.0f} {result['cpu']:>10.1f}% {p50:>8} {p99:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', default='1,10,50,100',
+                        type=lambda value: [int(n) for n in value.split(',')])
+    parser.add_argument('--rate', type=float, default=60, help='frames per second per client')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per client count')
+    parser.add_argument('--policy', default='merge', help='exclusive, last-touch or merge')
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port, args.policy), daemon=True)
+    server.start()
+    try:
+        asyncio.run(main_async(args, f'http://127.0.0.1:{port}'))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == '__main__':
+    main()
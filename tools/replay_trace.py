@@ -0,0 +1,220 @@
+"""Replay a recorded session against the server with a fake input backend.
+
+    python tools/replay_trace.py session.tptr [--speed 1|10|max]
+    python tools/replay_trace.py --synthetic 5000 [--burst 4] [--save synthetic.tptr]
+
+Record traces by starting the server with TRACKPAD_TRACE_DIR set. The
+trace is sent over a real WebSocket to websocket_handler, and the run
+reports throughput, CPU cost per event, server latency percentiles, how
+far the injected pointer path strays from the ideal sum of deltas and how
+evenly the injected steps are spaced.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from bisect import bisect_right
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import mobile_trackpad
+import protocol
+import session_trace
+from input_backends import RecordingBackend
+
+
+class TimedRecordingBackend(RecordingBackend):
+    """Also remembers when each move landed, to compare against the ideal path"""
+
+    def __init__(self):
+        super().__init__()
+        self.path = []  # (ns, x, y) after each move
+
+    def move_rel(self, dx, dy):
+        super().move_rel(dx, dy)
+        self.path.append((time.perf_counter_ns(), self.x, self.y))
+
+
+def synthetic_trace(count, rate_hz=120, burst=1):
+    """Circular finger motion at `rate_hz`, as binary frames with stamps.
+    With `burst` > 1 frames arrive in groups of that many, like over busy Wi-Fi."""
+    messages = []
+    for i in range(count):
+        angle = i / 60 * math.pi
+        event = {'type': 'move', 'x': 6 * math.cos(angle), 'y': 6 * math.sin(angle),
+                 'seq': i, 't': i * 1000 / rate_hz}
+        if i and i % 500 == 0:
+            event = {'type': 'click', 'button': 'left', 'seq': i, 't': event['t']}
+        arrival = (i // burst + 1) * burst - 1
+        messages.append((int(arrival * 1e9 / rate_hz), session_trace.KIND_BINARY, protocol.encode_event(event)))
+    return messages
+
+
+def decode(kind, data):
+    if kind == session_trace.KIND_BINARY:
+        return protocol.decode_binary(data)
+    return protocol.decode_json(data)
+
+
+def path_error(sent, path):
+    """Distance between injected and ideal positions at every injection"""
+    times = [t for t, _, _ in sent]
+    errors = []
+    for t, x, y in path:
+        index = bisect_right(times, t) - 1
+        ideal_x, ideal_y = (sent[index][1], sent[index][2]) if index >= 0 else (0, 0)
+        errors.append(math.hypot(x - ideal_x, y - ideal_y))
+    return errors
+
+
+def step_unevenness(path, frame_ms=1000 / 60):
+    """How unevenly the pointer moves from one 60 Hz display frame to the
+    next while it is moving, as stdev / mean of the per-frame distance"""
+    if len(path) < 2:
+        return 0.0
+    steps = []
+    index = 0
+    frame_ns = int(frame_ms * 1e6)
+    x0, y0 = path[0][1], path[0][2]
+    for t in range(path[0][0] + frame_ns, path[-1][0] + 1, frame_ns):
+        while index + 1 < len(path) and path[index + 1][0] <= t:
+            index += 1
+        _, x, y = path[index]
+        steps.append(math.hypot(x - x0, y - y0))
+        x0, y0 = x, y
+    if len(steps) < 2 or not sum(steps):
+        return 0.0
+    mean = sum(steps) / len(steps)
+    return math.sqrt(sum((s - mean) ** 2 for s in steps) / len(steps)) / mean
+
+
+async def replay(messages, speed):
+    backend = TimedRecordingBackend()
+    app = mobile_trackpad.make_app(backend)
+    binary = any(kind == session_trace.KIND_BINARY for _, kind, _ in messages)
+    sent = []  # (ns, ideal x, ideal y) after each message
+    ideal_x = ideal_y = 0.0
+    events = 0
+
+    async with TestClient(TestServer(app)) as client:
+        ws = await client.ws_connect('/ws', protocols=(protocol.SUBPROTOCOL,) if binary else ())
+
+        async def answer_pings():
+            async for msg in ws:
+                data = json.loads(msg.data)
+                if data['type'] == 'ping':
+                    await ws.send_str(json.dumps({'type': 'pong', 't': data['t'],
+                                                  'c': time.perf_counter_ns() / 1e6}))
+
+        reader = asyncio.create_task(answer_pings())
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter_ns()
+        for t_ns, kind, data in messages:
+            decoded = decode(kind, data)
+            if decoded and decoded[0]['type'] == 'pong':
+                continue  # Pings are answered live instead
+            if speed:
+                delay = (wall_start + t_ns / speed - time.perf_counter_ns()) / 1e9
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if kind == session_trace.KIND_BINARY:
+                await ws.send_bytes(data)
+            else:
+                await ws.send_str(data)
+            for event in decoded:
+                if event['type'] == 'move':
+                    ideal_x += event['x']
+                    ideal_y += event['y']
+            events += len(decoded)
+            sent.append((time.perf_counter_ns(), ideal_x, ideal_y))
+            if not speed:
+                await asyncio.sleep(0)  # Let the server side run
+
+        # Wait for the pipeline to drain
+        while True:
+            await asyncio.sleep(0.05)
+            metrics = await (await client.get('/metrics')).json()
+            connection = metrics['connections'][0]
+            if metrics['queue_depth'] == 0 and metrics['injector_pending'] == 0:
+                break
+        wall = (time.perf_counter_ns() - wall_start) / 1e9
+        cpu = time.process_time() - cpu_start
+        reader.cancel()
+        await ws.close()
+
+    errors = path_error(sent, backend.path)
+    return {
+        'events': events,
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'injections': len(backend.events),
+        'metrics': connection,
+        'coalesced': metrics['coalesced'],
+        'final_error': math.hypot(backend.x - ideal_x, backend.y - ideal_y),
+        'path_error_mean': sum(errors) / len(errors) if errors else 0.0,
+        'path_error_max': max(errors) if errors else 0.0,
+        'unevenness': step_unevenness(backend.path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('trace', nargs='?', help='trace file recorded by the server')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='replay N generated events instead')
+    parser.add_argument('--burst', type=int, default=1, help='deliver synthetic frames in groups of N')
+    parser.add_argument('--save', help='write the synthetic trace to this file')
+    parser.add_argument('--speed', default='max', help='1, 10, ... or max (default)')
+    parser.add_argument('--accel', action='store_true',
+                        help='keep the acceleration curve (off by default so path error shows pipeline loss)')
+    parser.add_argument('--interval', type=float, help='override OUTPUT_INTERVAL in seconds')
+    parser.add_argument('--jitter', action='store_true', help='turn the jitter buffer on')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        messages = synthetic_trace(args.synthetic, burst=args.burst)
+        if args.save:
+            writer = session_trace.TraceWriter(args.save)
+            for t_ns, kind, data in messages:
+                writer.record(kind, data, t_ns)
+            writer.close()
+    elif args.trace:
+        messages = list(session_trace.read_trace(args.trace))
+    else:
+        parser.error('give a trace file or --synthetic N')
+
+    if not args.accel:
+        mobile_trackpad.ACCEL_CURVE = ((0.0, 1.0),)
+    # Max speed replays far faster than a phone could send
+    mobile_trackpad.CLIENT_RATE_LIMIT = None
+    if args.interval is not None:
+        mobile_trackpad.OUTPUT_INTERVAL = args.interval
+    mobile_trackpad.JITTER_BUFFER = args.jitter
+    speed = None if args.speed == 'max' else float(args.speed)
+
+    result = asyncio.run(replay(messages, speed))
+    latency = result['metrics']['latency_ms']
+    print(f"events          {result['events']} in {result['wall_s']:.2f} s "
+          f"({result['events'] / result['wall_s']:.0f} events/s)")
+    print(f"cpu per event   {result['cpu_s'] / max(result['events'], 1) * 1e6:.1f} us "
+          f"(client and server share this process)")
+    print(f"injections      {result['injections']}, coalesced {result['coalesced']}")
+    for leg in ('queue', 'inject', 'server'):
+        summary = latency[leg]
+        if summary['count']:
+            print(f"{leg + ' latency':<15} p50 {summary['p50']:.3f} ms  p95 {summary['p95']:.3f} ms  "
+                  f"p99 {summary['p99']:.3f} ms")
+    print(f"path error      mean {result['path_error_mean']:.2f} px  max {result['path_error_max']:.2f} px  "
+          f"final {result['final_error']:.2f} px")
+    print(f"unevenness      {result['unevenness']:.2f} (stdev / mean of movement per 60 Hz frame)")
+    if args.jitter:
+        print(f"jitter          {result['metrics']['jitter_ms']} ms, "
+              f"playout delay {result['metrics']['playout_delay_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
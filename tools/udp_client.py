@@ -0,0 +1,167 @@
+"""Drive the UDP motion channel over a deliberately bad network.
+
+    python tools/udp_client.py [--count 2000] [--loss 0.05] [--reorder 0.05] [--duplicate 0.02]
+    python tools/udp_client.py --url http://192.168.1.10:5000
+
+Opens a WebSocket to get a channel id and key, then sends stamped move
+datagrams at --rate Hz. Each one may be dropped, held back behind later
+ones, or sent twice. A few datagrams with a wrong key are mixed in, and a
+click goes over the WebSocket at the end. Without --url the server runs in
+this process with the recording backend, so the injected total can be
+checked against what was actually delivered.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+import mobile_trackpad
+import protocol
+from input_backends import RecordingBackend
+
+FORGED = 10  # Datagrams sent with a wrong key
+
+
+async def get_channel(ws):
+    async for msg in ws:
+        data = json.loads(msg.data)
+        if data['type'] == 'udp':
+            return data
+    raise RuntimeError('Server did not offer a UDP channel')
+
+
+async def answer_pings(ws):
+    async for msg in ws:
+        data = json.loads(msg.data)
+        if data['type'] == 'ping':
+            await ws.send_str(json.dumps({'type': 'pong', 't': data['t'], 'c': time.perf_counter_ns() / 1e6}))
+
+
+async def run(base, args):
+    rng = random.Random(args.seed)
+    sent = {'datagrams': 0, 'dropped': 0, 'reordered': 0, 'duplicated': 0}
+    samples = {}  # Datagram seq -> move as the server decodes it
+    order = []  # Datagram seqs in the order they went out
+
+    async with aiohttp.ClientSession() as session:
+        ws = await session.ws_connect(base + '/ws')
+        offer = await get_channel(ws)
+        reader = asyncio.create_task(answer_pings(ws))
+        channel_id = bytes.fromhex(offer['id'])
+        key = bytes.fromhex(offer['key'])
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(urlsplit(base).hostname, offer['port']))
+
+        held = []  # (release after seq, seq, datagram)
+        period = 1 / args.rate
+        next_send = time.perf_counter()
+        for seq in range(args.count):
+            angle = seq / 60 * math.pi
+            x, y = 4 * math.cos(angle), 4 * math.sin(angle)
+            body = protocol.encode_stamp(seq, time.perf_counter_ns() / 1e6) + \
+                protocol.encode_samples(protocol.OP_MOVE, [(x, y)])
+            datagram = protocol.encode_datagram(channel_id, key, seq, body)
+            # float16 on the wire, keep what the server will actually see
+            samples[seq] = protocol.decode_binary(body)[0]
+
+            roll = rng.random()
+            if roll < args.loss:
+                sent['dropped'] += 1
+            elif roll < args.loss + args.reorder:
+                sent['reordered'] += 1
+                held.append((seq + rng.randint(1, 3), seq, datagram))
+            else:
+                transport.sendto(datagram)
+                order.append(seq)
+                if rng.random() < args.duplicate:
+                    sent['duplicated'] += 1
+                    transport.sendto(datagram)
+                    order.append(seq)
+            for item in [item for item in held if item[0] <= seq]:
+                held.remove(item)
+                transport.sendto(item[2])
+                order.append(item[1])
+            if seq % (args.count // FORGED or 1) == 0:
+                transport.sendto(protocol.encode_datagram(channel_id, bytes(32), seq, body))
+            sent['datagrams'] += 1
+
+            next_send += period
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+        for _, late_seq, datagram in held:
+            transport.sendto(datagram)
+            order.append(late_seq)
+
+        await ws.send_bytes(protocol.encode_event({'type': 'click', 'button': 'left'}))
+        await asyncio.sleep(0.3)
+        metrics = await (await session.get(base + '/metrics')).json()
+        transport.close()
+        reader.cancel()
+        await ws.close()
+
+    # The server keeps only datagrams newer than any before them
+    expected_x = expected_y = 0.0
+    newest = -1
+    for seq in order:
+        if seq > newest:
+            newest = seq
+            expected_x += samples[seq]['x']
+            expected_y += samples[seq]['y']
+    return sent, (expected_x, expected_y), metrics
+
+
+async def run_local(args):
+    backend = RecordingBackend()
+    app = mobile_trackpad.make_app(backend)
+    server = TestServer(app, host='127.0.0.1')
+    await server.start_server()
+    try:
+        await mobile_trackpad.start_udp_input(app, '127.0.0.1', 0)
+        result = await run(str(server.make_url('')).rstrip('/'), args)
+    finally:
+        await server.close()
+    return result + (backend,)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='a running server; by default one is started in this process')
+    parser.add_argument('--count', type=int, default=2000, help='datagrams to send')
+    parser.add_argument('--rate', type=float, default=120, help='datagrams per second')
+    parser.add_argument('--loss', type=float, default=0.05)
+    parser.add_argument('--reorder', type=float, default=0.05)
+    parser.add_argument('--duplicate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    mobile_trackpad.ACCEL_CURVE = ((0.0, 1.0),)  # So injected totals compare directly
+    if args.url:
+        sent, expected, metrics = asyncio.run(run(args.url.rstrip('/'), args))
+        backend = None
+    else:
+        sent, expected, metrics, backend = asyncio.run(run_local(args))
+
+    udp = metrics['connections'][0]['udp']
+    print(f"sent            {sent['datagrams']} datagrams: {sent['dropped']} dropped, "
+          f"{sent['reordered']} reordered, {sent['duplicated']} duplicated")
+    print(f"server          {udp['received']} applied, {udp['late']} late or duplicate discarded, "
+          f"{udp['lost']} skipped, {metrics.get('udp_unauthenticated')} failed authentication")
+    if backend is not None:
+        clicks = sum(1 for event in backend.events if event[0] == 'click')
+        print(f"injected        x {backend.x}, y {backend.y} (expected {expected[0]:.1f}, {expected[1]:.1f}), "
+              f"{clicks} click over the WebSocket")
+        print(f"latency         server p50 {metrics['connections'][0]['latency_ms']['server']['p50']} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Live settings shared between the GUI and the server.
+
+The current settings are one immutable Config snapshot. Readers just take
+get_config(), which is a single attribute read and needs no lock even
+while the Qt thread publishes a new version. Listeners are told about
+every new snapshot; the server uses this to push it to connected phones.
+"""
+import threading
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class Config:
+    version: int = 0
+    mouse_sensitivity: float = 3.5
+    scroll_sensitivity: float = 10
+    touch_feedback: bool = True  # Dots under the fingers on the phone
+    preview: bool = False  # Stream the screen around the cursor to the phone, see preview.py
+    typing: bool = False  # Accept text and key chords from the phone
+
+    def to_client(self):
+        """The settings as the phone page sees them"""
+        return {
+            'version': self.version,
+            'mouseSensitivity': self.mouse_sensitivity,
+            'scrollSensitivity': self.scroll_sensitivity,
+            'touchFeedback': self.touch_feedback,
+            'preview': self.preview,
+            'typing': self.typing,
+        }
+
+
+_config = Config()
+_listeners = ()  # Replaced, never mutated, so it can be iterated without a lock
+_write_lock = threading.Lock()
+
+
+def get_config():
+    return _config
+
+
+def set_config(**changes):
+    """Publish a new snapshot with `changes` applied and notify listeners"""
+    global _config
+    with _write_lock:
+        if all(getattr(_config, name) == value for name, value in changes.items()):
+            return _config
+        config = _config = replace(_config, version=_config.version + 1, **changes)
+        listeners = _listeners
+    for listener in listeners:
+        listener(config)
+    return config
+
+
+def add_listener(listener):
+    """Call listener(config) on every new snapshot, from the thread that set it"""
+    global _listeners
+    with _write_lock:
+        _listeners = _listeners + (listener,)
+
+
+def remove_listener(listener):
+    global _listeners
+    with _write_lock:
+        _listeners = tuple(l for l in _listeners if l is not listener)
@@ -1,76 +1,144 @@
 import sys
 import os
 import asyncio
-import qrcode
 import json
+import threading
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, 
                            QVBoxLayout, QWidget, QLabel, QSystemTrayIcon, 
-                           QMenu, QMessageBox, QSlider, QHBoxLayout, QGroupBox)
+                           QMenu, QMessageBox, QSlider, QHBoxLayout, QGroupBox,
+                           QCheckBox, QSpinBox, QFormLayout)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QSettings
 from PyQt6.QtGui import QIcon, QPixmap, QAction
-from io import BytesIO
-from PIL.ImageQt import ImageQt
-import mobile_trackpad
+# mobile_trackpad (aiohttp) and qrcode (PIL) are imported when first needed,
+# so the window comes up without waiting for them
+import discovery
+import trackpad_config
+
+STATS_REFRESH_MS = 500
+STATS_ROWS = (('rate', 'Events/s:'), ('latency', 'Latency p50/95/99:'), ('queue', 'Queued:'),
+              ('clients', 'Phones:'), ('lost', 'Dropped/coalesced:'))
+
+
+def _fmt(value, digits=0):
+    return '-' if value != value else f'{value:.{digits}f}'  # NaN until known
+
 
 class ServerThread(QThread):
     server_started = pyqtSignal(str)
     server_stopped = pyqtSignal()
 
-    def __init__(self, mouse_sensitivity=3.5, scroll_sensitivity=0.1):
+    def __init__(self, port=None, previous=None, injector_process=False):
         super().__init__()
-        self._running = False
+        self.port = port
+        self.previous = previous  # A ServerThread still shutting down on our port
+        self.injector_process = injector_process  # Keeps the cursor clear of this process's GIL
         self.loop = None
         self.runner = None
-        self.mouse_sensitivity = mouse_sensitivity
-        self.scroll_sensitivity = scroll_sensitivity
-
-    async def cleanup_server(self):
-        if self.runner:
-            await self.runner.cleanup()
-            self.runner = None
+        self.site = None
+        self.listener_closed = threading.Event()  # Set once the port is free again
+        self._stop_requested = False
+        self._stopping = None  # asyncio.Event on self.loop
+        self.stats = None  # The server's StatsRing, read by the live panel
 
     def run(self):
-        self._running = True
+        import mobile_trackpad  # Off the UI thread
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
         
         async def start_server():
-            app = mobile_trackpad.web.Application()
-            app.router.add_get('/', mobile_trackpad.index_handler)
-            app.router.add_get('/ws', mobile_trackpad.websocket_handler)
+            self._stopping = asyncio.Event()
+            if self._stop_requested:
+                return
+            if self.previous is not None:
+                # Don't race the old server for the port
+                await self.loop.run_in_executor(None, self.previous.listener_closed.wait, 5)
+                self.previous = None
+            app = mobile_trackpad.make_app(injector_process=self.injector_process)
+            self.stats = app[mobile_trackpad.STATS]
             
             self.runner = mobile_trackpad.web.AppRunner(app)
             await self.runner.setup()
-            site = mobile_trackpad.web.TCPSite(self.runner, '0.0.0.0', 5000)
-            
-            await site.start()
-            ip_address = mobile_trackpad.get_local_ip()
-            self.server_started.emit(f"http://{ip_address}:5000")
-            
             try:
-                while self._running:
-                    await asyncio.sleep(1)
+                port = self.port or mobile_trackpad.PORT
+                self.site = await mobile_trackpad.start_site(self.runner, '0.0.0.0', port)
+                try:
+                    await mobile_trackpad.start_udp_input(app)
+                except OSError as e:
+                    # Only native clients use it, the phone page works without
+                    print(f"UDP motion channel off, can't listen on port {mobile_trackpad.UDP_PORT}: {e}")
+                self.port = port
+                await mobile_trackpad.start_discovery(app, port, self._network_changed)
+                self.server_started.emit(f"http://{mobile_trackpad.get_local_ip()}:{port}")
+                await self._stopping.wait()
             finally:
-                await self.cleanup_server()
-                self.server_stopped.emit()
+                # Sites and UDP first, so a new server can take the ports while phones disconnect
+                for site in list(self.runner.sites):
+                    await site.stop()
+                app[mobile_trackpad.UDP_INPUT].stop()
+                await asyncio.sleep(0)  # The datagram socket closes on the next loop pass
+                self.listener_closed.set()
+                await self.runner.cleanup()
+                self.runner = None
 
         try:
             self.loop.run_until_complete(start_server())
         except Exception as e:
             print(f"Server error: {e}")
         finally:
+            self.listener_closed.set()
             self.loop.close()
+            self.server_stopped.emit()
 
     def stop(self):
-        self._running = False
+        """Stop right away; safe to call from any thread"""
+        self._stop_requested = True
+        if self._stopping is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._stopping.set)
+            except RuntimeError:
+                pass  # The loop has already finished
+
+    def reconfigure(self, port):
+        """Move the listener to `port`; connected phones stay connected"""
+        self.port = port
+        if self._stopping is not None and self.runner is not None:
+            asyncio.run_coroutine_threadsafe(self._move_listener(port), self.loop)
+
+    async def _move_listener(self, port):
+        import mobile_trackpad
+        old_site = self.site
+        try:
+            self.site = await mobile_trackpad.start_site(self.runner, '0.0.0.0', port, attempts=1)
+        except OSError as e:
+            print(f"Can't listen on port {port}: {e}")
+            return
+        if old_site is not None:
+            await old_site.stop()  # Only the listening socket, open WebSockets are untouched
+        await self.runner.app[mobile_trackpad.ADVERTISER].update(port)
+        self.server_started.emit(f"http://{mobile_trackpad.get_local_ip()}:{port}")
+
+    def _network_changed(self, addresses):
+        self.server_started.emit(f"http://{addresses[0]}:{self.port}")
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.server_thread = None
+        self.stopping_threads = []  # Stopped ServerThreads, kept until they've finished
         self.settings = QSettings('MobileTrackpad', 'Settings')
         self.mouse_sensitivity = float(self.settings.value('mouse_sensitivity', 3.5))
         self.scroll_sensitivity = float(self.settings.value('scroll_sensitivity', 0.1))
+        self.touch_feedback = self.settings.value('touch_feedback', True, type=bool)
+        self.preview = self.settings.value('preview', False, type=bool)
+        self.typing = self.settings.value('typing', False, type=bool)
+        self.injector_process = self.settings.value('injector_process', False, type=bool)
+        self.port = self.settings.value('port', 5000, type=int)
+        trackpad_config.set_config(mouse_sensitivity=self.mouse_sensitivity,
+                                   scroll_sensitivity=self.scroll_sensitivity,
+                                   touch_feedback=self.touch_feedback,
+                                   preview=self.preview,
+                                   typing=self.typing)
         
         # Keep window in taskbar but make it minimizable to tray
         self.setWindowFlags(Qt.WindowType.Window)
@@ -80,7 +148,7 @@ class MainWindow(QMainWindow):
 
     def init_ui(self):
         self.setWindowTitle('Mobile Trackpad')
-        self.setFixedSize(300, 500)
+        self.setFixedSize(300, 715)
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -118,11 +186,44 @@ class MainWindow(QMainWindow):
         scroll_layout.addWidget(self.scroll_slider)
         scroll_layout.addWidget(self.scroll_value)
 
+        # Touch feedback on the phone, off saves work on slow phones
+        self.feedback_checkbox = QCheckBox('Show touches on phone')
+        self.feedback_checkbox.setChecked(self.touch_feedback)
+        self.feedback_checkbox.toggled.connect(self.update_touch_feedback)
+        # Off by default: anyone who can reach the server could watch the screen
+        self.preview_checkbox = QCheckBox('Stream screen preview to phone')
+        self.preview_checkbox.setChecked(self.preview)
+        self.preview_checkbox.toggled.connect(self.update_preview)
+        # Off by default too: anyone who can reach the server could type commands
+        self.typing_checkbox = QCheckBox('Allow typing from phone')
+        self.typing_checkbox.setChecked(self.typing)
+        self.typing_checkbox.toggled.connect(self.update_typing)
+
         sensitivity_layout.addWidget(mouse_container)
         sensitivity_layout.addWidget(scroll_container)
+        sensitivity_layout.addWidget(self.feedback_checkbox)
+        sensitivity_layout.addWidget(self.preview_checkbox)
+        sensitivity_layout.addWidget(self.typing_checkbox)
         sensitivity_group.setLayout(sensitivity_layout)
         layout.addWidget(sensitivity_group)
 
+        # Port, changing it while running moves the server without dropping phones
+        port_container = QWidget()
+        port_layout = QHBoxLayout(port_container)
+        self.port_spinbox = QSpinBox()
+        self.port_spinbox.setRange(1024, 65535)
+        self.port_spinbox.setValue(self.port)
+        self.port_spinbox.editingFinished.connect(self.update_port)
+        port_layout.addWidget(QLabel('Port:'))
+        port_layout.addWidget(self.port_spinbox)
+        layout.addWidget(port_container)
+
+        # Changing it restarts a running server, phones reconnect on their own
+        self.injector_checkbox = QCheckBox('Inject input from a separate process')
+        self.injector_checkbox.setChecked(self.injector_process)
+        self.injector_checkbox.toggled.connect(self.update_injector_process)
+        layout.addWidget(self.injector_checkbox)
+
         # Create Start/Stop button
         self.toggle_button = QPushButton('Start Server')
         self.toggle_button.clicked.connect(self.toggle_server)
@@ -138,6 +239,19 @@ class MainWindow(QMainWindow):
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.status_label)
 
+        # Live performance panel, sampled from the server's StatsRing
+        stats_group = QGroupBox("Performance")
+        stats_layout = QFormLayout()
+        self.stats_labels = {}
+        for key, title in STATS_ROWS:
+            self.stats_labels[key] = QLabel('-')
+            stats_layout.addRow(title, self.stats_labels[key])
+        stats_group.setLayout(stats_layout)
+        layout.addWidget(stats_group)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(STATS_REFRESH_MS)
+        self.stats_timer.timeout.connect(self.update_stats)
+
     def setup_system_tray(self):
         self.tray_icon = QSystemTrayIcon(self)
         self.tray_icon.setIcon(QIcon('icon.png'))
@@ -174,55 +288,117 @@ class MainWindow(QMainWindow):
         self.settings.setValue('scroll_sensitivity', self.scroll_sensitivity)
         self.update_server_sensitivity()
 
+    def update_touch_feedback(self, enabled):
+        self.touch_feedback = enabled
+        self.settings.setValue('touch_feedback', enabled)
+        trackpad_config.set_config(touch_feedback=enabled)
+
+    def update_preview(self, enabled):
+        # Turning it off also ends any preview streams already running
+        self.preview = enabled
+        self.settings.setValue('preview', enabled)
+        trackpad_config.set_config(preview=enabled)
+
+    def update_typing(self, enabled):
+        self.typing = enabled
+        self.settings.setValue('typing', enabled)
+        trackpad_config.set_config(typing=enabled)
+
     def update_server_sensitivity(self):
-        if self.server_thread and self.server_thread._running:
-            # Update the HTML with new sensitivity values
-            updated_html = mobile_trackpad.update_sensitivities(
-                self.mouse_sensitivity, 
-                self.scroll_sensitivity
-            )
-            # Store the updated values in the server thread
-            self.server_thread.mouse_sensitivity = self.mouse_sensitivity
-            self.server_thread.scroll_sensitivity = self.scroll_sensitivity    
+        # Published as a new config snapshot, the server pushes it to connected phones
+        trackpad_config.set_config(mouse_sensitivity=self.mouse_sensitivity,
+                                   scroll_sensitivity=self.scroll_sensitivity)
     
+    def update_port(self):
+        port = self.port_spinbox.value()
+        if port == self.port:
+            return
+        self.port = port
+        self.settings.setValue('port', port)
+        if self.server_thread:
+            self.server_thread.reconfigure(port)
+
+    def update_injector_process(self, enabled):
+        self.injector_process = enabled
+        self.settings.setValue('injector_process', enabled)
+        if self.server_thread:
+            self.toggle_server()
+            self.toggle_server()
+
     def toggle_server(self):
         if not self.server_thread:
-            self.server_thread = ServerThread(self.mouse_sensitivity, self.scroll_sensitivity)
+            # The previous server may still be closing connections, the new one
+            # waits for its port rather than for the whole shutdown
+            previous = self.stopping_threads[-1] if self.stopping_threads else None
+            self.server_thread = ServerThread(self.port, previous, self.injector_process)
             self.server_thread.server_started.connect(self.on_server_started)
             self.server_thread.server_stopped.connect(self.on_server_stopped)
             self.server_thread.start()
             self.toggle_button.setText('Stop Server')
         else:
+            # Returns at once, the thread finishes shutting down in the background
+            self.server_thread.server_started.disconnect(self.on_server_started)
+            self.server_thread.server_stopped.disconnect(self.on_server_stopped)
             self.server_thread.stop()
+            # Qt must not destroy a QThread that's still running
+            self.stopping_threads.append(self.server_thread)
+            self.server_thread.finished.connect(self.on_thread_finished)
             self.server_thread = None
             self.toggle_button.setText('Start Server')
             self.status_label.setText('Server: Stopped')
             self.qr_label.clear()
+            self.clear_stats()
         
     def quit_application(self):
-        if self.server_thread:
-            self.server_thread.stop()
+        for thread in [self.server_thread] + self.stopping_threads:
+            if thread:
+                thread.stop()
+                thread.wait(2000)
         QApplication.quit()
 
+    def update_stats(self):
+        stats = self.server_thread.stats if self.server_thread else None
+        sample = stats.latest() if stats is not None else None
+        if sample is None or not self.isVisible():
+            return
+        self.stats_labels['rate'].setText(
+            f"{_fmt(sample['events_per_sec'])} in, {_fmt(sample['injected_per_sec'])} injected")
+        self.stats_labels['latency'].setText(
+            f"{_fmt(sample['p50_ms'], 1)} / {_fmt(sample['p95_ms'], 1)} / {_fmt(sample['p99_ms'], 1)} ms")
+        self.stats_labels['queue'].setText(
+            f"{_fmt(sample['queue_depth'])} events, {_fmt(sample['injector_pending'])} injecting")
+        self.stats_labels['clients'].setText(_fmt(sample['clients']))
+        self.stats_labels['lost'].setText(f"{_fmt(sample['dropped'])} / {_fmt(sample['coalesced'])}")
+
+    def clear_stats(self):
+        self.stats_timer.stop()
+        for label in self.stats_labels.values():
+            label.setText('-')
+
     def on_server_started(self, url):
-        self.status_label.setText(f'Server: Running\n{url}')
+        self.stats_timer.start()
+        others = [ip for ip in discovery.local_addresses() if f"//{ip}:" not in url]
+        also = f"\nAlso on {', '.join(others)}" if others else ''
+        self.status_label.setText(f'Server: Running\n{url}{also}')
         self.generate_qr(url)
 
+    def on_thread_finished(self):
+        thread = self.sender()
+        if thread in self.stopping_threads:
+            self.stopping_threads.remove(thread)
+
     def on_server_stopped(self):
+        # Only reached when the server stopped by itself, e.g. the port was taken
+        self.server_thread = None
         self.toggle_button.setText('Start Server')
         self.status_label.setText('Server: Stopped')
         self.qr_label.clear()
+        self.clear_stats()
 
     def generate_qr(self, url):
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(url)
-        qr.make(fit=True)
-        qr_image = qr.make_image(fill_color="black", back_color="white")
-        
-        buffer = BytesIO()
-        qr_image.save(buffer, format='PNG')
+        # Drawn once per URL, restarting the server reuses it
         qr_pixmap = QPixmap()
-        qr_pixmap.loadFromData(buffer.getvalue())
+        qr_pixmap.loadFromData(discovery.qr_png(url))
         
         scaled_pixmap = qr_pixmap.scaled(200, 200, Qt.AspectRatioMode.KeepAspectRatio)
         self.qr_label.setPixmap(scaled_pixmap)
@@ -237,12 +413,10 @@ class MainWindow(QMainWindow):
             2000
         )
 
-    def quit_application(self):
-        if self.server_thread:
-            self.server_thread.stop()
-        QApplication.quit()
-
 if __name__ == '__main__':
+    # The injector and screen preview worker processes start from this file when frozen
+    import multiprocessing
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     
     try:
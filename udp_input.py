@@ -0,0 +1,88 @@
+"""UDP endpoint for motion and scroll.
+
+Over the WebSocket a single lost TCP segment holds back every event behind
+it until it is retransmitted, which shows up as a stall followed by a
+jump. Motion deltas don't need that guarantee, so a client can send them
+here instead. Each WebSocket connection gets its own channel id and HMAC
+key in a {type: 'udp'} message and keeps using the socket for clicks and
+gestures. Datagrams that fail authentication, arrive late or arrive twice
+are dropped. See protocol.py for the datagram layout.
+
+Browsers can't send UDP, so the phone page keeps using the WebSocket; this
+is for native clients and tools/udp_client.py.
+"""
+import asyncio
+import logging
+import secrets
+import time
+
+import protocol
+import session_trace
+
+
+class UdpChannel:
+    def __init__(self, session, recorder=None):
+        self.id = secrets.token_bytes(8)
+        self.key = secrets.token_bytes(32)
+        self.session = session
+        self.recorder = recorder
+        self.last_seq = None
+
+
+class UdpInput(asyncio.DatagramProtocol):
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.channels = {}  # Channel id -> UdpChannel
+        self.transport = None
+        self.port = None
+        self.unauthenticated = 0  # Datagrams for an unknown channel or with a bad tag
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.port = transport.get_extra_info('sockname')[1]
+
+    def open(self, session, recorder=None):
+        channel = UdpChannel(session, recorder)
+        self.channels[channel.id] = channel
+        return channel
+
+    def close(self, channel):
+        self.channels.pop(channel.id, None)
+
+    def offer(self, channel):
+        """The message telling a WebSocket client how to reach its channel"""
+        return {'type': 'udp', 'port': self.port, 'id': channel.id.hex(), 'key': channel.key.hex()}
+
+    def datagram_received(self, data, addr):
+        now = time.perf_counter_ns()
+        try:
+            channel = self.channels.get(protocol.datagram_channel(data))
+            if channel is None:
+                raise protocol.ProtocolError('Unknown channel')
+            seq, events = protocol.decode_datagram(data, channel.key)
+        except protocol.ProtocolError:
+            self.unauthenticated += 1
+            return
+
+        stats = channel.session.stats
+        if channel.last_seq is not None:
+            if seq <= channel.last_seq:
+                stats.udp_late += 1  # Newer motion was already applied
+                return
+            stats.udp_lost += seq - channel.last_seq - 1
+        channel.last_seq = seq
+        stats.udp_received += 1
+        if channel.recorder is not None:
+            body = data[protocol.DATAGRAM_HEADER_SIZE:-protocol.DATAGRAM_TAG_SIZE]
+            channel.recorder.record(session_trace.KIND_BINARY, body)
+        for event in events:
+            stats.on_received(event, now)
+        self.pipeline.submit(channel.session, events, now)
+
+    def error_received(self, exc):
+        logging.debug(f"UDP input error: {exc}")
+
+    def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
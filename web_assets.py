@@ -0,0 +1,132 @@
+"""Serves the phone page and its static assets.
+
+Everything is rendered and compressed once. trackpad.css and trackpad.js
+get content-hashed URLs and are cached by the phone for a year, while the
+page itself is rendered once per configuration and revalidated with an
+ETag. Brotli is used when the brotli package is installed.
+
+There is no service worker: browsers only register one in a secure
+context, and phones load the page over plain http from a LAN address.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from aiohttp import web
+
+# PyInstaller unpacks bundled data files under sys._MEIPASS
+STATIC_DIR = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), 'static')
+HASHED_ASSETS = ('trackpad.css', 'trackpad.js')
+CONTENT_TYPES = {'.css': 'text/css', '.js': 'application/javascript', '.html': 'text/html'}
+
+CACHE_FOREVER = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+MAX_PAGES = 16  # Rendered pages kept, one per configuration
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        name, *params = part.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass  # Malformed, count it as accepted
+        if quality == 0:
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class Asset:
+    """One response body, precompressed in every encoding we can serve"""
+
+    def __init__(self, body, content_type, cache_control):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.encodings = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.encodings[encoding] = data
+
+    def respond(self, request):
+        accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in self.encodings and candidate in accepted:
+                encoding = candidate
+                break
+
+        etag = f'"{self.digest}-{encoding}"'
+        headers = {'Cache-Control': self.cache_control, 'ETag': etag, 'Vary': 'Accept-Encoding'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return web.Response(status=304, headers=headers)
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return web.Response(body=self.encodings[encoding], content_type=self.content_type,
+                            charset='utf-8', headers=headers)
+
+
+class AssetStore:
+    def __init__(self, directory=STATIC_DIR):
+        self.assets = {}  # URL path -> Asset
+        self.urls = {}  # File name -> content-hashed URL path
+        for name in HASHED_ASSETS:
+            stem, ext = os.path.splitext(name)
+            with open(os.path.join(directory, name), 'rb') as f:
+                asset = Asset(f.read(), CONTENT_TYPES[ext], CACHE_FOREVER)
+            url = f'/static/{stem}.{asset.digest[:10]}{ext}'
+            self.assets[url] = asset
+            self.urls[name] = url
+
+        with open(os.path.join(directory, 'index.html'), encoding='utf-8') as f:
+            self.page_template = (f.read()
+                                  .replace('{{STYLESHEET}}', self.urls['trackpad.css'])
+                                  .replace('{{SCRIPT}}', self.urls['trackpad.js']))
+        self._pages = {}
+
+    def page(self, config):
+        """The page with `config` exposed to the script as TRACKPAD_CONFIG"""
+        key = json.dumps(config, sort_keys=True)
+        page = self._pages.get(key)
+        if page is None:
+            if len(self._pages) >= MAX_PAGES:
+                self._pages.clear()
+            page = Asset(self.page_template.replace('{{CONFIG}}', key), CONTENT_TYPES['.html'], REVALIDATE)
+            self._pages[key] = page
+        return page
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = AssetStore()
+    return _store
+
+
+async def static_handler(request):
+    asset = get_store().assets.get(request.path)
+    if asset is None:
+        raise web.HTTPNotFound()
+    return asset.respond(request)
+